@@ -0,0 +1,334 @@
+# app/api/export.py
+"""
+Exports the normalized tables to Parquet (or Arrow/CSV) files partitioned by form and month.
+
+Usage:
+    python app/api/export.py [--format parquet] [--output exports] [--chunk-size 50000]
+
+Every run only exports the submissions inserted or updated since the previous
+run into the same directory, so refreshing an analysis reads the new files
+instead of a new dump.
+"""
+
+import os
+import sys
+import json
+import datetime
+import argparse
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Add current directory
+sys.path.append(os.getcwd())
+
+from sqlalchemy import JSON, BigInteger, Boolean, Date, DateTime, Float, Integer, Uuid, and_, or_, select
+from sqlalchemy.orm import Session
+
+from app.database.db_connection import SessionLocal
+from app.database.models import KoboSubmission, Client, BusinessInfo, SurveyMetadata
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional; only needed for the parquet and arrow formats
+    pyarrow = None
+
+# Directory the exports are written to
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+# 'parquet', 'arrow' (Arrow IPC files, for Feather/pyarrow readers) or 'csv'
+EXPORT_FORMAT = os.getenv("EXPORT_FORMAT", "parquet")
+# Rows read from the database and held in memory at a time
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 50000))
+# Changes younger than this are left to the next run; must exceed the longest write transaction
+EXPORT_SETTLE_SECONDS = float(os.getenv("EXPORT_SETTLE_SECONDS", 60))
+
+EXPORT_TABLES = (KoboSubmission, Client, BusinessInfo, SurveyMetadata)
+FILE_SUFFIXES = {'parquet': '.parquet', 'arrow': '.arrow', 'csv': '.csv'}
+
+# Labels of the partition keys in the export queries
+FORM_KEY = 'export_form_uuid'
+TIME_KEY = 'export_submission_time'
+
+# Position of an export in the submissions' change order: (updated_at, id)
+Cursor = Tuple[Optional[datetime.datetime], int]
+
+
+def arrow_type(column_type):
+    """
+    Returns the Arrow type a column is exported as; UUIDs and JSON are exported as strings.
+    """
+    if isinstance(column_type, Boolean):
+        return pyarrow.bool_()
+    if isinstance(column_type, (Integer, BigInteger)):
+        return pyarrow.int64()
+    if isinstance(column_type, Float):
+        return pyarrow.float64()
+    if isinstance(column_type, DateTime):
+        return pyarrow.timestamp('us')
+    if isinstance(column_type, Date):
+        return pyarrow.date32()
+    return pyarrow.string()
+
+
+def value_converter(column_type) -> Optional[Callable[[Any], Any]]:
+    """
+    Returns the function turning a column's values into exportable ones, or None to keep them.
+    """
+    if isinstance(column_type, Uuid):
+        return lambda value: None if value is None else str(value)
+    if isinstance(column_type, JSON):
+        return lambda value: None if value is None else json.dumps(value)
+    return None
+
+
+class ParquetWriter:
+    """
+    Writes one partition file; every ``write`` call adds a row group.
+    """
+
+    def __init__(self, path: str, columns):
+        self.schema = pyarrow.schema([(column.name, arrow_type(column.type)) for column in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, values: List[List[Any]]) -> None:
+        arrays = [pyarrow.array(column, type=field.type) for column, field in zip(values, self.schema)]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class ArrowWriter(ParquetWriter):
+    """
+    Writes one partition as an Arrow IPC file; every ``write`` call adds a record batch.
+    """
+
+    def __init__(self, path: str, columns):
+        self.schema = pyarrow.schema([(column.name, arrow_type(column.type)) for column in columns])
+        self.writer = pyarrow.ipc.new_file(path, self.schema)
+
+
+class CsvWriter:
+    """
+    Writes one partition as CSV with a header row.
+    """
+
+    def __init__(self, path: str, columns):
+        import csv
+
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([column.name for column in columns])
+
+    def write(self, values: List[List[Any]]) -> None:
+        self.writer.writerows(
+            ['' if value is None else value.isoformat() if isinstance(value, datetime.date) else value for value in row]
+            for row in zip(*values)
+        )
+
+    def close(self) -> None:
+        self.file.close()
+
+
+WRITERS = {'parquet': ParquetWriter, 'arrow': ArrowWriter, 'csv': CsvWriter}
+
+
+def state_path(output_dir: str, format: str) -> str:
+    return os.path.join(output_dir, f"_export_state.{format}.json")
+
+
+def read_state(output_dir: str, format: str) -> Dict[str, Any]:
+    try:
+        with open(state_path(output_dir, format)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'run': 0, 'last_updated_at': None, 'last_submission_id': 0}
+
+
+def state_cursor(state: Dict[str, Any]) -> Cursor:
+    updated_at = state.get('last_updated_at')
+    return (datetime.datetime.fromisoformat(updated_at) if updated_at else None), state.get('last_submission_id', 0)
+
+
+def cursor_time(cursor: Cursor) -> Optional[str]:
+    return cursor[0].isoformat() if cursor[0] else None
+
+
+def write_state(output_dir: str, format: str, state: Dict[str, Any]) -> None:
+    path = state_path(output_dir, format)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def partition_dir(output_dir: str, table: str, form_uuid: Any, submission_time: datetime.datetime) -> str:
+    """
+    Returns a partition's directory, in the ``key=value`` layout pandas, pyarrow, DuckDB and Spark read as columns.
+    """
+    return os.path.join(output_dir, table, f"form={form_uuid}", f"month={submission_time:%Y-%m}")
+
+
+def after(cursor: Cursor):
+    """
+    Filters the submissions changed after ``cursor`` (all of them for a cursor without time).
+    """
+    updated_at, submission_id = cursor
+    if updated_at is None:
+        return KoboSubmission.updated_at.is_not(None)
+    return or_(KoboSubmission.updated_at > updated_at,
+               and_(KoboSubmission.updated_at == updated_at, KoboSubmission.id > submission_id))
+
+
+def up_to(cursor: Cursor):
+    """
+    Filters the submissions changed at or before ``cursor``.
+    """
+    updated_at, submission_id = cursor
+    return or_(KoboSubmission.updated_at < updated_at,
+               and_(KoboSubmission.updated_at == updated_at, KoboSubmission.id <= submission_id))
+
+
+def export_statement(model, after_cursor: Cursor, last_cursor: Cursor):
+    """
+    Selects a table's rows of the submissions changed in ``(after_cursor, last_cursor]`` with their partition keys.
+    """
+    columns = model.__table__.columns
+    stmt = select(*columns, KoboSubmission.form_uuid.label(FORM_KEY), KoboSubmission.submission_time.label(TIME_KEY))
+    if model is not KoboSubmission:
+        stmt = stmt.join(KoboSubmission, model.submission_id == KoboSubmission.id)
+    return (stmt.where(after(after_cursor), up_to(last_cursor))
+            .order_by(KoboSubmission.updated_at, KoboSubmission.id, model.id))
+
+
+def export_table(db: Session, model, output_dir: str, format: str, after_cursor: Cursor, last_cursor: Cursor,
+                 chunk_size: int, run: int) -> Tuple[int, List[str]]:
+    """
+    Streams one table's new rows into one new file per form and month.
+
+    Rows are read ``chunk_size`` at a time through a server-side cursor, so
+    memory is bounded by the chunk size whatever the size of the table. Files
+    are written under a temporary name and renamed once complete, and are named
+    after the run number, so a failed run is simply repeated (under the same
+    number) and never leaves a half-written file behind.
+
+    Returns:
+        tuple: The number of rows exported and the paths of the files written.
+    """
+    columns = list(model.__table__.columns)
+    converters = [value_converter(column.type) for column in columns]
+    file_name = f"part-{run:06d}{FILE_SUFFIXES[format]}"
+    writers: Dict[str, Any] = {}
+    row_count = 0
+    try:
+        result = db.execute(export_statement(model, after_cursor, last_cursor).execution_options(yield_per=chunk_size))
+        for rows in result.partitions():
+            partitions: Dict[str, List[Any]] = {}
+            for row in rows:
+                directory = partition_dir(output_dir, model.__tablename__, row[-2], row[-1])
+                partitions.setdefault(directory, []).append(row)
+            for directory, partition_rows in partitions.items():
+                writer = writers.get(directory)
+                if writer is None:
+                    os.makedirs(directory, exist_ok=True)
+                    writer = writers[directory] = WRITERS[format](os.path.join(directory, file_name + '.tmp'), columns)
+                values = list(zip(*partition_rows))[:len(columns)]
+                writer.write([list(column) if convert is None else [convert(value) for value in column]
+                              for column, convert in zip(values, converters)])
+                row_count += len(partition_rows)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    paths = []
+    for directory in writers:
+        path = os.path.join(directory, file_name)
+        os.replace(path + '.tmp', path)
+        paths.append(path)
+    return row_count, paths
+
+
+def export_tables(db: Session, output_dir: str = EXPORT_DIR, format: str = EXPORT_FORMAT,
+                  chunk_size: int = EXPORT_CHUNK_SIZE, settle_seconds: float = EXPORT_SETTLE_SECONDS) -> Dict[str, Any]:
+    """
+    Exports the submissions inserted or updated since the last export into ``output_dir``.
+
+    Each table gets a ``<table>/form=<form_uuid>/month=<YYYY-MM>/`` directory
+    tree with one file per run and partition. Runs follow the submissions in
+    the order of their last change, ``(updated_at, id)``, and keep the last
+    exported position in ``_export_state.<format>.json``. Every table is cut
+    at the same position, so the tables of one run are consistent with each
+    other.
+
+    A submission updated after its export is exported again, with its child
+    rows, by the next run; readers keep the rows with the latest
+    ``updated_at`` per ``_id``. Changes younger than ``settle_seconds`` wait
+    for the next run, so a write that commits after a newer one is not skipped
+    as long as it commits within that time.
+
+    Args:
+        db (Session): SQLAlchemy session.
+        output_dir (str): Directory of the export (default is set by EXPORT_DIR).
+        format (str): ``'parquet'``, ``'arrow'`` or ``'csv'`` (default is set by EXPORT_FORMAT).
+        chunk_size (int): Rows held in memory at a time (default is set by EXPORT_CHUNK_SIZE).
+        settle_seconds (float): Age below which changes are left to the next run (default is set by EXPORT_SETTLE_SECONDS).
+
+    Returns:
+        dict: The run number, the change range exported, the rows exported per table and the files written.
+
+    Raises:
+        ValueError: If the format is unknown.
+        ImportError: If the format needs pyarrow and it is not installed.
+    """
+    if format not in WRITERS:
+        raise ValueError(f"format must be one of {tuple(WRITERS)}, got {format!r}")
+    if format != 'csv' and pyarrow is None:
+        raise ImportError(f"Exporting to {format} needs pyarrow: pip install pyarrow")
+
+    os.makedirs(output_dir, exist_ok=True)
+    state = read_state(output_dir, format)
+    after_cursor = state_cursor(state)
+    settled = datetime.datetime.utcnow() - datetime.timedelta(seconds=settle_seconds)
+    last = db.execute(
+        select(KoboSubmission.updated_at, KoboSubmission.id)
+        .where(after(after_cursor), KoboSubmission.updated_at <= settled)
+        .order_by(KoboSubmission.updated_at.desc(), KoboSubmission.id.desc())
+        .limit(1)
+    ).first()
+    last_cursor = tuple(last) if last else after_cursor
+    run = state.get('run', 0) + 1
+
+    summary = {'format': format, 'run': run,
+               'after_updated_at': cursor_time(after_cursor), 'after_submission_id': after_cursor[1],
+               'last_updated_at': cursor_time(last_cursor), 'last_submission_id': last_cursor[1],
+               'rows': {}, 'files': []}
+    if last is None:
+        print(f"Nothing to export: no submissions changed after {summary['after_updated_at']} "
+              f"and more than {settle_seconds:g}s ago")
+        return summary
+
+    for model in EXPORT_TABLES:
+        row_count, paths = export_table(db, model, output_dir, format, after_cursor, last_cursor, chunk_size, run)
+        summary['rows'][model.__tablename__] = row_count
+        summary['files'] += [os.path.relpath(path, output_dir) for path in paths]
+        print(f"Exported {row_count} rows of {model.__tablename__} into {len(paths)} files")
+
+    write_state(output_dir, format, {'run': run, 'last_updated_at': summary['last_updated_at'],
+                                     'last_submission_id': last_cursor[1],
+                                     'exported_at': datetime.datetime.utcnow().isoformat()})
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the normalized tables to files partitioned by form and month.")
+    parser.add_argument("--format", choices=tuple(WRITERS), default=EXPORT_FORMAT)
+    parser.add_argument("--output", default=EXPORT_DIR, help="export directory")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="rows held in memory at a time")
+    parser.add_argument("--settle-seconds", type=float, default=EXPORT_SETTLE_SECONDS,
+                        help="leave changes younger than this to the next run")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        export_tables(db, args.output, args.format, args.chunk_size, args.settle_seconds)
+    finally:
+        db.close()
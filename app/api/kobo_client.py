@@ -1,7 +1,16 @@
 import os
+import re
 import sys
-import uuid
-from typing import List, Dict, Any
+import time
+import json
+import random
+import email.utils
+import argparse
+import datetime
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from typing import Generator, Any
 
 # Add current directory
@@ -11,11 +20,24 @@ sys.path.append(os.getcwd())
 sys.path.append(os.path.dirname(os.getcwd()))
 
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from app.database.db_connection import SessionLocal, engine, Base
+from app.database.db_connection import SessionLocal, engine, Base, pool_stats
 from app.database.models import KoboSubmission, Client, BusinessInfo, SurveyMetadata
+from app.database.writer import write_batch, ON_CONFLICT_MODES, WRITE_BATCH_SIZE, COMMIT_SECONDS, INSERT_SECONDS
+from app.database.bulk_loader import copy_batch
+from app.database import stats
+from app.database.form_tables import FormSchema, describe_asset, load_form_schema, set_latest_version
+from app.database.raw_archive import archive_records
+from app.utils.field_mapping import transform_record
+from app.api.sync_state import (
+    form_uid_from_url, get_sync_state, build_query, advance_sync_state, resume_offset, clear_checkpoint
+)
+from app.api.pipeline import Pipeline
+from app.api.rate_limit import HostRateLimiter, RateLimitedSession
+from app.utils import metrics
 
 # Load environment variables from .env file
 load_dotenv()
@@ -28,64 +50,358 @@ KOBO_API_URL = os.getenv("KOBO_API_URL")
 AUTH_TOKEN = os.getenv("AUTH_TOKEN")
 DJANGO_LANGUAGE = os.getenv("DJANGO_LANGUAGE", "en")
 PAGE_SIZE = int(os.getenv("PAGE_SIZE", 100))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", 60))
+# Retries of a failed page request, with exponential backoff (seconds) and full jitter
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", 5))
+RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", 1.0))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 60.0))
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 500))
+# Records per COPY batch in backfill mode
+COPY_BATCH_SIZE = int(os.getenv("COPY_BATCH_SIZE", 10000))
+# 'skip' leaves already stored submissions alone, 'update' re-syncs them in place
+INGEST_MODE = os.getenv("INGEST_MODE", "skip")
+# Pages fetched concurrently once the total count is known; 1 keeps the serial fetcher
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", 4))
+# Run download, transform and DB writes as concurrent stages joined by bounded queues
+PIPELINE = os.getenv("PIPELINE", "false").lower() in ("1", "true", "yes")
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 2000))
+# Store submissions in tables generated from the form definition instead of the fixed models
+DYNAMIC_SCHEMA = os.getenv("DYNAMIC_SCHEMA", "false").lower() in ("1", "true", "yes")
+# Local asset JSON used instead of fetching the form definition from Kobo
+FORM_ASSET_FILE = os.getenv("FORM_ASSET_FILE")
+# Form version whose cached table layout is used without fetching the asset
+FORM_VERSION = os.getenv("FORM_VERSION")
 
 HEADERS = {
     'Authorization': f'Token {AUTH_TOKEN}',
     'Cookie': f'django_language={DJANGO_LANGUAGE}'
 }
 
-def fetch_data_from_kobo(page_size: int = PAGE_SIZE) -> Generator[Dict[str, Any], None, None]:
+# Responses worth retrying: rate limiting and transient server/proxy errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+FETCH_SECONDS = metrics.histogram('kobo_fetch_seconds', 'Latency of the Kobo API requests, per attempt', ('status',))
+FETCH_RETRY_COUNT = metrics.counter('kobo_fetch_retries_total', 'Kobo API requests retried, by cause', ('reason',))
+RECORDS_PROCESSED = metrics.counter('kobo_sync_records_total', 'Records fetched and handed to the writer')
+RECORDS_SKIPPED = metrics.counter('kobo_sync_records_skipped_total', 'Records that could not be transformed')
+RECORDS_STORED = metrics.counter('kobo_sync_submissions_stored_total', 'Submissions stored by the pull job')
+SYNC_RATE = metrics.gauge('kobo_sync_records_per_second', 'Records per second of the current (or last) sync run')
+
+# Stable order, so offsets address the same records however pages are fetched
+SORT = json.dumps({'_submission_time': 1, '_id': 1})
+
+def create_session(pool_size: int = FETCH_WORKERS, limiter: Optional[HostRateLimiter] = None) -> requests.Session:
+    """
+    Creates an HTTP session that keeps connections to Kobo alive between pages.
+
+    Args:
+        pool_size (int): The number of pooled connections per host.
+        limiter (HostRateLimiter): Rate limit every request of the session waits for.
+
+    Returns:
+        requests.Session: A session carrying the Kobo auth headers.
+    """
+    session = RateLimitedSession(limiter) if limiter else requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def retry_delay(attempt: int, response: Optional[requests.Response] = None) -> float:
+    """
+    Returns how long to wait before retry number ``attempt`` (0-based).
+
+    A ``Retry-After`` header (seconds or HTTP date) on the response wins;
+    otherwise the delay backs off exponentially with full jitter.
+    """
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        if retry_after.strip().isdigit():
+            return float(retry_after)
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+            return max((retry_at - datetime.datetime.now(retry_at.tzinfo)).total_seconds(), 0.0)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BACKOFF * 2 ** attempt))
+
+def get_with_retry(session: requests.Session, url: str, params: Optional[Dict[str, Any]] = None,
+                   retries: int = FETCH_RETRIES) -> requests.Response:
+    """
+    GETs ``url``, retrying connection errors, timeouts and 429/5xx responses.
+
+    Args:
+        session (requests.Session): Session used for the request.
+        url (str): The URL to fetch.
+        params (dict): Query parameters.
+        retries (int): The number of retries after the first attempt (default is set by FETCH_RETRIES).
+
+    Returns:
+        requests.Response: The successful response.
+
+    Raises:
+        requests.exceptions.RequestException: If the last attempt fails.
+    """
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        try:
+            response = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+            FETCH_SECONDS.observe(time.perf_counter() - started, status=response.status_code)
+            if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+                FETCH_RETRY_COUNT.inc(reason=response.status_code)
+                delay = retry_delay(attempt, response)
+                print(f"Kobo returned {response.status_code}, retrying in {delay:.1f}s ({attempt + 1}/{retries})")
+                time.sleep(delay)
+                continue
+            response.raise_for_status()  # Raise an exception for HTTP errors
+            return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            reason = 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'connection'
+            FETCH_SECONDS.observe(time.perf_counter() - started, status=reason)
+            if attempt >= retries:
+                raise
+            FETCH_RETRY_COUNT.inc(reason=reason)
+            delay = retry_delay(attempt)
+            print(f"Request failed ({e}), retrying in {delay:.1f}s ({attempt + 1}/{retries})")
+            time.sleep(delay)
+
+def fetch_data_from_kobo(page_size: int = PAGE_SIZE, query: Optional[str] = None,
+                         session: Optional[requests.Session] = None, start: int = 0,
+                         url: Optional[str] = None) -> Generator[Dict[str, Any], None, None]:
     """
     Fetches data from KoboToolbox API and handles large datasets using pagination.
 
+    Transient failures are retried (see ``get_with_retry``); if a page still
+    cannot be fetched the error is raised rather than ending the stream early.
+
     Args:
         page_size (int): The number of records to fetch per page (default is set by PAGE_SIZE).
+        query (str): Optional Kobo ``query`` filter (JSON) restricting which submissions are fetched.
+        session (requests.Session): Session to reuse; a new one is created if omitted.
+        start (int): Offset of the first record, to resume an interrupted run.
+        url (str): Data URL of the form (default is set by KOBO_API_URL).
 
     Yields:
         dict: Each record fetched from the KoboToolbox API.
+
+    Raises:
+        requests.exceptions.RequestException: If a page cannot be fetched.
     """
-    next_url = KOBO_API_URL  # Start with the initial URL
+    session = session or create_session(1)
+    next_url = url or KOBO_API_URL  # Start with the initial URL
     params = {
-        'page_size': page_size
+        'page_size': page_size,
+        'limit': page_size,
+        'start': start,
+        'sort': SORT
     }
+    if query:
+        params['query'] = query
 
     while next_url:
         try:
-            response = requests.get(next_url, headers=HEADERS, params=params)
-            response.raise_for_status()  # Raise an exception for HTTP errors
+            data = get_with_retry(session, next_url, params).json()
 
-            data = response.json()
-            
             for record in data['results']:
                 yield record  # Yield each record individually to handle data in a streaming manner
 
-            # Check if there is a next page
+            # Check if there is a next page; its URL already carries the parameters
             next_url = data.get('next')
-            if next_url:
-                print(f"Fetching next page: {next_url}")
+            params = None
         except requests.exceptions.RequestException as e:
-            print(f"An error occurred: {e}")
-            break
+            print(f"An error occurred while fetching {next_url}: {e}")
+            raise
 
-def clean_uuid(uuid_string: str) -> uuid.UUID:
+def fetch_page(session: requests.Session, start: int, limit: int, query: Optional[str] = None,
+               url: Optional[str] = None) -> Dict[str, Any]:
     """
-    Cleans and validates a UUID string.
+    Fetches one page of submissions by offset.
 
     Args:
-        uuid_string (str): The UUID string to clean and validate.
+        session (requests.Session): Session used for the request.
+        start (int): Offset of the first submission.
+        limit (int): The number of submissions to fetch.
+        query (str): Optional Kobo ``query`` filter (JSON).
+        url (str): Data URL of the form (default is set by KOBO_API_URL).
 
     Returns:
-        uuid.UUID: A valid UUID object.
+        dict: The decoded API response (``count``, ``results``, ...).
+
+    Raises:
+        requests.exceptions.RequestException: If the request still fails after retries.
+    """
+    params = {'start': start, 'limit': limit, 'sort': SORT}
+    if query:
+        params['query'] = query
+    return get_with_retry(session, url or KOBO_API_URL, params).json()
+
+def fetch_data_from_kobo_parallel(page_size: int = PAGE_SIZE, query: Optional[str] = None,
+                                  max_workers: int = FETCH_WORKERS,
+                                  session: Optional[requests.Session] = None,
+                                  start: int = 0, url: Optional[str] = None) -> Generator[Dict[str, Any], None, None]:
+    """
+    Fetches data from KoboToolbox API with several pages in flight at once.
+
+    The first page reports the total ``count``, which gives every remaining
+    ``start`` offset. Those pages are fetched by a thread pool over one pooled
+    session, at most ``2 * max_workers`` ahead of the consumer, and their records
+    are yielded in the same order as ``fetch_data_from_kobo``.
+
+    Args:
+        page_size (int): The number of records to fetch per page (default is set by PAGE_SIZE).
+        query (str): Optional Kobo ``query`` filter (JSON) restricting which submissions are fetched.
+        max_workers (int): The number of concurrent page requests (default is set by FETCH_WORKERS).
+        session (requests.Session): Session to reuse; a new one is created if omitted.
+        start (int): Offset of the first record, to resume an interrupted run.
+        url (str): Data URL of the form (default is set by KOBO_API_URL).
+
+    Yields:
+        dict: Each record fetched from the KoboToolbox API.
+
+    Raises:
+        requests.exceptions.RequestException: If a page cannot be fetched.
+    """
+    session = session or create_session(max_workers)
+
+    try:
+        first_page = fetch_page(session, start, page_size, query, url)
+    except requests.exceptions.RequestException as e:
+        print(f"An error occurred while fetching records from offset {start}: {e}")
+        raise
+
+    yield from first_page['results']
+
+    offsets = iter(range(start + page_size, first_page.get('count', 0), page_size))
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while True:
+                # Keep a bounded window of pages in flight
+                while len(pending) < 2 * max_workers:
+                    offset = next(offsets, None)
+                    if offset is None:
+                        break
+                    pending.append((offset, executor.submit(fetch_page, session, offset, page_size, query, url)))
+
+                if not pending:
+                    break
+
+                offset, future = pending.popleft()
+                try:
+                    page = future.result()
+                except requests.exceptions.RequestException as e:
+                    print(f"An error occurred while fetching records from offset {offset}: {e}")
+                    raise
+
+                yield from page['results']
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+def batched(records: Iterable[Dict[str, Any]], batch_size: int) -> Generator[List[Dict[str, Any]], None, None]:
+    """
+    Groups a stream of records into lists of at most ``batch_size`` records.
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def fetch_asset(session: Optional[requests.Session] = None, url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Fetches the asset (form definition) of the form whose data URL is ``url`` (default is set by KOBO_API_URL).
 
     Raises:
-        ValueError: If the UUID is invalid after cleaning.
+        requests.exceptions.RequestException: If the request still fails after retries.
+    """
+    session = session or create_session(1)
+    return get_with_retry(session, re.sub(r'data/?(\?.*)?$', '', url or KOBO_API_URL), {'format': 'json'}).json()
+
+def load_form(form_uid: str, asset_file: Optional[str] = FORM_ASSET_FILE, version: Optional[str] = FORM_VERSION,
+              url: Optional[str] = None, session: Optional[requests.Session] = None) -> FormSchema:
+    """
+    Returns the generated tables of a form, from a local asset file or the (cached) Kobo asset.
+
+    Args:
+        form_uid (str): Asset UID of the form.
+        asset_file (str): Local asset JSON to use instead of the API (default is set by FORM_ASSET_FILE).
+        version (str): Cached form version to use without fetching the asset (default is set by FORM_VERSION);
+            None uses the latest cached version and fetches the asset only if there is none.
+        url (str): Data URL of the form (default is set by KOBO_API_URL).
+        session (requests.Session): Session to fetch the asset with.
+    """
+    if asset_file:
+        with open(asset_file) as f:
+            return FormSchema(describe_asset(json.load(f), form_uid))
+    return load_form_schema(form_uid, version, fetch=partial(fetch_asset, session, url))
+
+def transform_or_skip(record: Dict[str, Any], transform=transform_record) -> Optional[Dict[str, Any]]:
+    """
+    Transforms a record, reporting and returning None if it is invalid.
     """
-    if uuid_string.startswith('uuid:'):
-        uuid_string = uuid_string[5:]
     try:
-        return uuid.UUID(uuid_string)
-    except ValueError:
-        raise ValueError(f"Invalid UUID: {uuid_string}")
+        return transform(record)
+    except (KeyError, TypeError, ValueError) as e:
+        RECORDS_SKIPPED.inc()
+        print(f"Skipping invalid record {record.get('_id')}: {e}")
+        return None
+
+def write_items(db: Session, items: List[Dict[str, Optional[Dict[str, Any]]]], on_conflict: str = INGEST_MODE,
+                bulk_write=write_batch, single_write=write_batch, failed: Optional[List[int]] = None) -> int:
+    """
+    Writes transformed records in a single transaction.
+
+    If the batch write fails, the batch is retried record by record so one bad
+    record does not cost the whole batch.
+
+    Args:
+        db (Session): SQLAlchemy session object.
+        items (list): Records transformed by ``transform_record``.
+        on_conflict (str): 'skip' or 'update' for submissions that are already stored (default is set by INGEST_MODE).
+        bulk_write: Writer for the whole batch, ``write_batch`` or ``copy_batch``.
+        single_write: Writer for the per-record retries.
+        failed (list): If given, the ``_id`` of every record that could not be stored is appended to it.
+
+    Returns:
+        int: The number of submissions inserted (or updated).
+    """
+    try:
+        return bulk_write(db, items, on_conflict)
+    except Exception as e:
+        print(f"Batch insert failed, falling back to per-record inserts: {e}")
+
+    stored = 0
+    for item in items:
+        try:
+            stored += single_write(db, [item], on_conflict)
+        except Exception as e:
+            print(f"An error occurred while inserting record {item['submission']['_id']}: {e}")
+            if failed is not None:
+                failed.append(item['submission']['_id'])
+    return stored
+
+def store_batch_to_db(db: Session, records: List[Dict[str, Any]], on_conflict: str = INGEST_MODE) -> int:
+    """
+    Stores a batch of records into the database in a single transaction.
+
+    Records that cannot be transformed are reported and skipped.
+
+    Args:
+        db (Session): SQLAlchemy session object.
+        records (list): Records from KoboToolbox API.
+        on_conflict (str): 'skip' or 'update' for submissions that are already stored (default is set by INGEST_MODE).
+
+    Returns:
+        int: The number of submissions inserted (or updated).
+    """
+    items = [item for item in map(transform_or_skip, records) if item is not None]
+    return write_items(db, items, on_conflict)
 
 def store_data_to_db(db: Session, record: Dict[str, Any]) -> None:
     """
@@ -101,77 +417,28 @@ def store_data_to_db(db: Session, record: Dict[str, Any]) -> None:
             print(f"Skipping duplicate submission with _id: {record['_id']}")
             return
 
-        # Clean and validate UUIDs
-        form_uuid = clean_uuid(record.get('formhub/uuid', ''))
-        instance_id = clean_uuid(record.get('meta/instanceID', ''))
+        rows = transform_record(record)
 
         # Insert into KoboSubmission
-        submission = KoboSubmission(
-            _id=record['_id'],
-            form_uuid=form_uuid,
-            instance_id=instance_id,
-            submission_time=record.get('_submission_time'),
-            start_time=record.get('starttime'),
-            end_time=record.get('endtime'),
-            survey_date=record.get('cd_survey_date'),
-            _geolocation=record.get('_geolocation'),
-            _status=record.get('_status'),
-            _tags=record.get('_tags'),
-            _notes=record.get('_notes'),
-            _validation_status=record.get('_validation_status'),
-            _submitted_by=record.get('_submitted_by'),
-            version=record.get('__version__')
-        )
+        submission = KoboSubmission(**rows['submission'])
         db.add(submission)
         db.commit()
         db.refresh(submission)
 
         # Insert into Client
-        if 'sec_a/unique_id' in record:
-            client = Client(
-                unique_id=record.get('sec_a/unique_id'),
-                client_name=record.get('sec_c/cd_client_name'),
-                client_id_manifest=record.get('sec_c/cd_client_id_manifest'),
-                location=record.get('sec_c/cd_location'),
-                client_phone=record.get('sec_c/cd_clients_phone'),
-                alt_phone=record.get('sec_c/cd_phoneno_alt_number'),
-                phone_type=record.get('sec_c/cd_clients_phone_smart_feature'),
-                gender=record.get('sec_c/cd_gender'),
-                age=record.get('sec_c/cd_age'),
-                nationality=record.get('sec_c/cd_nationality'),
-                strata=record.get('sec_c/cd_strata'),
-                disability=record.get('sec_c/cd_disability') == 'Yes',
-                education=record.get('sec_c/cd_education'),
-                client_status=record.get('sec_c/cd_client_status'),
-                sole_income_earner=record.get('sec_c/cd_sole_income_earner') == 'Yes',
-                responsible_people=record.get('sec_c/cd_howrespble_pple'),
-                submission_id=submission.id
-            )
+        if rows['client'] is not None:
+            client = Client(**rows['client'], submission_id=submission.id, submission_time=submission.submission_time)
             db.add(client)
             db.commit()
 
         # Insert into BusinessInfo
-        if 'sec_a/cd_biz_country_name' in record:
-            business_info = BusinessInfo(
-                country_name=record.get('sec_a/cd_biz_country_name'),
-                region_name=record.get('sec_a/cd_biz_region_name'),
-                bda_name=record.get('sec_b/bda_name'),
-                cohort=record.get('sec_b/cd_cohort'),
-                program=record.get('sec_b/cd_program'),
-                biz_status=record.get('group_mx5fl16/cd_biz_status'),
-                biz_operating=record.get('group_mx5fl16/bd_biz_operating') == 'yes',
-                submission_id=submission.id
-            )
+        if rows['business_info'] is not None:
+            business_info = BusinessInfo(**rows['business_info'], submission_id=submission.id, submission_time=submission.submission_time)
             db.add(business_info)
             db.commit()
 
         # Insert into SurveyMetadata
-        metadata = SurveyMetadata(
-            form_uuid=form_uuid,
-            instance_id=instance_id,
-            form_version=record.get('__version__'),
-            submission_id=submission.id
-        )
+        metadata = SurveyMetadata(**rows['survey_metadata'], submission_id=submission.id, submission_time=submission.submission_time)
         db.add(metadata)
         db.commit()
 
@@ -183,31 +450,181 @@ def store_data_to_db(db: Session, record: Dict[str, Any]) -> None:
         print(f"An error occurred while inserting record {record['_id']}: {e}")
 
 
-def process_and_store_data():
+def process_and_store_data(batch_size: int = BATCH_SIZE, on_conflict: str = INGEST_MODE, full_resync: bool = False,
+                           max_workers: int = FETCH_WORKERS, pipelined: bool = PIPELINE, backfill: bool = False,
+                           dynamic_schema: bool = DYNAMIC_SCHEMA, asset_file: Optional[str] = FORM_ASSET_FILE,
+                           url: Optional[str] = None, session: Optional[requests.Session] = None) -> Tuple[int, int]:
     """
-    Process data in a streaming fashion and store it into the database.
+    Process data in a streaming fashion and store it into the database in batches.
+
+    Only submissions newer than the form's stored cursor are fetched. After
+    every committed batch the cursor is advanced and the run's offset is
+    checkpointed, so a run that crashes resumes where it stopped. The cursor
+    only moves over stored records: once a record fails to be written, the
+    cursor and the checkpoint stay just before that record for the rest of the
+    run, so the next run (or the resumed one after a crash) fetches it again.
+
+    Args:
+        batch_size (int): The number of records written per transaction (default is set by BATCH_SIZE).
+        on_conflict (str): 'skip' or 'update' for submissions that are already stored (default is set by INGEST_MODE).
+        full_resync (bool): Ignore the cursor and fetch every submission of the form.
+        max_workers (int): The number of concurrent page requests; 1 fetches pages one after another.
+        pipelined (bool): Download, transform and write on separate threads (default is set by PIPELINE).
+        backfill (bool): Load batches of COPY_BATCH_SIZE records with PostgreSQL ``COPY`` (initial loads).
+        dynamic_schema (bool): Store into tables generated from the form definition (default is set by DYNAMIC_SCHEMA).
+        asset_file (str): Local form definition for ``dynamic_schema`` (default is set by FORM_ASSET_FILE).
+        url (str): Data URL of the form to sync (default is set by KOBO_API_URL).
+        session (requests.Session): Session for the Kobo requests; a new one is created if omitted.
+
+    Returns:
+        tuple: The number of records processed and of submissions stored.
     """
-    record_count = 0
+    if on_conflict not in ON_CONFLICT_MODES:
+        raise ValueError(f"INGEST_MODE must be one of {ON_CONFLICT_MODES}, got {on_conflict!r}")
 
-    print("Fetching data from KoboToolbox...\n")
+    record_count = 0
+    inserted_count = 0
+    url = url or KOBO_API_URL
+    form_uid = form_uid_from_url(url)
+    transform, bulk_write, single_write = transform_record, write_batch, write_batch
+    if dynamic_schema:
+        form = load_form(form_uid, asset_file, url=url, session=session)
+        for column in form.create_tables(engine):
+            print(f"Added column {column} for form version {form.version}")
+        transform, bulk_write, single_write = form.transform, form.write_batch, form.write_batch
+        if backfill:
+            print("COPY backfill is not available for generated tables; using batched inserts")
+    elif backfill:
+        bulk_write = copy_batch
+        batch_size = max(batch_size, COPY_BATCH_SIZE)
+    to_item = partial(transform_or_skip, transform=transform)
 
     # Start a database session
     db = SessionLocal()
+    state = get_sync_state(db, form_uid)
+    query = None if full_resync else build_query(state)
+    start = resume_offset(state, query)
+
+    started = time.perf_counter()
+    # Run offset of the first record that failed to be stored; the cursor and checkpoint stay before it
+    held_offset = None
+    # Form version of the newest record written
+    data_version = None
+
+    def write(batch: List[Dict[str, Any]], items: List[Dict[str, Optional[Dict[str, Any]]]]) -> None:
+        nonlocal record_count, inserted_count, held_offset, data_version
+        try:
+            archive_records(db, batch, form_uid)
+        except Exception as e:
+            print(f"An error occurred while archiving records up to _id {batch[-1]['_id']}: {e}")
+        failed = []
+        stored = write_items(db, items, on_conflict, bulk_write, single_write, failed)
+        inserted_count += stored
+        record_count += len(batch)
+        RECORDS_PROCESSED.inc(len(batch))
+        RECORDS_STORED.inc(stored)
+        SYNC_RATE.set(record_count / (time.perf_counter() - started))
+        data_version = batch[-1].get('__version__') or data_version
+        if held_offset is None:
+            stored_records, offset = batch, start + record_count
+            if failed:
+                failed = set(failed)
+                position = next(index for index, record in enumerate(batch) if record['_id'] in failed)
+                held_offset = offset = start + record_count - len(batch) + position
+                stored_records = batch[:position]
+                print(f"Record {batch[position]['_id']} was not stored; the cursor stays before it until a run stores it")
+            advance_sync_state(db, form_uid, stored_records, query=query, offset=offset)
+        if not pipelined:
+            print(f"Processed {record_count} records (last _id: {batch[-1]['_id']})")
 
     try:
-        for record in fetch_data_from_kobo():
-            store_data_to_db(db, record)
-            record_count += 1
-            print(f"Processed record {record_count}: {record['_id']}")
-
-            # Uncomment the following lines if you want to limit the number of records processed
-            # if record_count >= 5:  # Adjust this limit as needed
-            #     break
+        if query:
+            print(f"Fetching submissions of {form_uid} newer than the last sync...\n")
+        else:
+            print(f"Fetching all submissions of {form_uid} from KoboToolbox...\n")
+        if start:
+            print(f"Resuming interrupted sync at record {start}\n")
+
+        if max_workers > 1:
+            records = fetch_data_from_kobo_parallel(query=query, max_workers=max_workers, session=session,
+                                                    start=start, url=url)
+        else:
+            records = fetch_data_from_kobo(query=query, session=session, start=start, url=url)
+
+        if pipelined:
+            # The pipeline's writer thread is the only user of the session
+            pipeline = Pipeline(to_item, write, batch_size, PIPELINE_QUEUE_SIZE)
+            pipeline_stats = pipeline.run(records)
+            print(pipeline_stats.report())
+        else:
+            for batch in batched(records, batch_size):
+                items = [item for item in map(to_item, batch) if item is not None]
+                write(batch, items)
+
+        # Everything was fetched; the next run starts from the cursor
+        clear_checkpoint(db, form_uid)
+
+        if dynamic_schema and not asset_file and FORM_VERSION is None and data_version not in (None, form.version):
+            # New submissions use another form version: load it (fetching the asset once) for the next runs
+            try:
+                form = load_form(form_uid, asset_file, data_version, url=url, session=session)
+                for column in form.create_tables(engine):
+                    print(f"Added column {column} for form version {form.version}")
+                set_latest_version(form_uid, form.version)
+            except Exception as e:
+                print(f"An error occurred while loading version {data_version} of form {form_uid}: {e}")
+
+        if stats.STATS_INCREMENTAL:
+            try:
+                stats.refresh_pending(db)
+            except Exception as e:
+                print(f"An error occurred while refreshing the daily rollups: {e}")
 
     finally:
         db.close()
 
-    print(f"\nTotal records processed: {record_count}")
+    print(f"\nTotal records processed: {record_count} ({inserted_count} stored)")
+    return record_count, inserted_count
+
+def metrics_summary() -> str:
+    """
+    Returns a one-line summary of the pull job's metrics, for the periodic log line.
+    """
+    pages, fetch_seconds = FETCH_SECONDS.totals()
+    batches, batch_items = WRITE_BATCH_SIZE.totals()
+    _, insert_seconds = INSERT_SECONDS.totals()
+    _, commit_seconds = COMMIT_SECONDS.totals()
+    retries = sum(value for _, _, _, value in FETCH_RETRY_COUNT.samples())
+    pool = pool_stats(engine)
+    line = (
+        f"[metrics] records {RECORDS_PROCESSED.value():.0f} ({SYNC_RATE.value():.0f}/s), "
+        f"stored {RECORDS_STORED.value():.0f}, skipped {RECORDS_SKIPPED.value():.0f} | "
+        f"requests {pages} (avg {fetch_seconds / pages if pages else 0:.2f}s), retries {retries:.0f} | "
+        f"batches {batches} (avg {batch_items / batches if batches else 0:.0f} records, "
+        f"insert {insert_seconds / batches if batches else 0:.3f}s, commit {commit_seconds / batches if batches else 0:.3f}s)"
+    )
+    if 'size' in pool:
+        line += f" | pool {pool['checked_out']} of {pool['size']} checked out"
+    return line
 
 if __name__ == "__main__":
-    process_and_store_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sync submissions from KoboToolbox into the database.")
+    parser.add_argument("--full-resync", action="store_true", help="ignore the stored cursor and fetch every submission")
+    parser.add_argument("--pipeline", action="store_true", default=PIPELINE, help="run download, transform and writes concurrently")
+    parser.add_argument("--backfill", action="store_true", help="load through PostgreSQL COPY in large batches (first loads)")
+    parser.add_argument("--dynamic-schema", action="store_true", default=DYNAMIC_SCHEMA,
+                        help="store into tables generated from the form definition")
+    parser.add_argument("--asset-file", help="form definition (asset JSON) to use instead of fetching it from Kobo")
+    parser.add_argument("--metrics-interval", type=float, default=metrics.METRICS_LOG_INTERVAL,
+                        help="print a metrics summary line every N seconds (0 disables it)")
+    args = parser.parse_args()
+    reporter = metrics.MetricsReporter(args.metrics_interval, metrics_summary) if args.metrics_interval > 0 else None
+    if reporter is not None:
+        reporter.start()
+    try:
+        process_and_store_data(full_resync=args.full_resync, pipelined=args.pipeline, backfill=args.backfill,
+                               dynamic_schema=args.dynamic_schema, asset_file=args.asset_file or FORM_ASSET_FILE)
+    finally:
+        if reporter is not None:
+            reporter.stop()
+            print(metrics_summary())
\ No newline at end of file
@@ -0,0 +1,229 @@
+# app/api/pipeline.py
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from app.utils import metrics
+
+# Marks the end of the stream on a queue
+_DONE = object()
+
+QUEUE_DEPTH = metrics.gauge('kobo_queue_depth', 'Items waiting in an in-process queue', ('queue',))
+
+
+class StageStats:
+    """
+    Throughput counters for one pipeline stage.
+
+    ``busy`` is the time the stage spent doing its own work (downloading,
+    transforming, writing), as opposed to waiting on its neighbours.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, count: int, seconds: float) -> None:
+        with self._lock:
+            self.count += count
+            self.busy += seconds
+
+    @property
+    def rate(self) -> float:
+        """Records per second of busy time: what the stage could sustain on its own."""
+        return self.count / self.busy if self.busy else 0.0
+
+    def __str__(self):
+        return f"{self.name}: {self.count} records, busy {self.busy:.1f}s ({self.rate:.0f}/s)"
+
+
+class PipelineStats:
+    """
+    Per-stage throughput and queue depths of a running pipeline.
+    """
+
+    def __init__(self, record_queue: queue.Queue, batch_queue: queue.Queue):
+        self.fetch = StageStats('fetch')
+        self.transform = StageStats('transform')
+        self.write = StageStats('write')
+        self.record_queue = record_queue
+        self.batch_queue = batch_queue
+        self.started = time.perf_counter()
+
+    @property
+    def bottleneck(self) -> str:
+        """The stage with the most busy time, i.e. the one holding the others back."""
+        return max((self.fetch, self.transform, self.write), key=lambda stage: stage.busy).name
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (
+            f"[{elapsed:.0f}s] {self.fetch} | records queued {self.record_queue.qsize()}/{self.record_queue.maxsize} | "
+            f"{self.transform} | batches queued {self.batch_queue.qsize()}/{self.batch_queue.maxsize} | "
+            f"{self.write} | bottleneck: {self.bottleneck}"
+        )
+
+
+class Pipeline:
+    """
+    Runs fetch, transform and write stages on separate threads joined by bounded queues.
+
+    The fetch stage iterates ``records`` (typically a network generator), the
+    transform stage maps each record with ``transform`` (returning None skips it)
+    and groups the results into batches, and the write stage hands each batch to
+    ``write(records, items)``. Full queues block the stage in front of them, so a
+    slow writer throttles the download instead of buffering it in memory. The
+    first exception in any stage stops all of them and is re-raised by ``run``.
+
+    Args:
+        transform (callable): Maps a raw record to an item, or None to skip it.
+        write (callable): Stores a batch; receives the raw records and their items.
+        batch_size (int): The number of items per write.
+        queue_size (int): Capacity of the record queue; the batch queue holds two batches.
+        report_interval (float): Seconds between progress reports; 0 disables them.
+    """
+
+    def __init__(self, transform: Callable[[Dict[str, Any]], Any],
+                 write: Callable[[List[Dict[str, Any]], List[Any]], Any],
+                 batch_size: int, queue_size: int, report_interval: float = 10.0):
+        self.transform = transform
+        self.write = write
+        self.batch_size = batch_size
+        self.report_interval = report_interval
+        self.record_queue = queue.Queue(maxsize=queue_size)
+        self.batch_queue = queue.Queue(maxsize=2)
+        self.stats = PipelineStats(self.record_queue, self.batch_queue)
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        # Block while the queue is full, but give up as soon as another stage fails
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error: BaseException) -> None:
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _fetch_stage(self, records: Iterable[Dict[str, Any]]) -> None:
+        iterator = iter(records)
+        try:
+            while True:
+                started = time.perf_counter()
+                record = next(iterator, _DONE)
+                if record is _DONE:
+                    break
+                self.stats.fetch.add(1, time.perf_counter() - started)
+                if not self._put(self.record_queue, record):
+                    return
+            self._put(self.record_queue, _DONE)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            # Release the fetcher's connections and threads if we stopped early
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    def _transform_stage(self) -> None:
+        try:
+            records, items = [], []
+            while True:
+                record = self._get(self.record_queue)
+                if record is _DONE:
+                    break
+                started = time.perf_counter()
+                item = self.transform(record)
+                self.stats.transform.add(1, time.perf_counter() - started)
+                if item is None:
+                    continue
+                records.append(record)
+                items.append(item)
+                if len(items) >= self.batch_size:
+                    if not self._put(self.batch_queue, (records, items)):
+                        return
+                    records, items = [], []
+
+            if self._stop.is_set():
+                return
+            if items and not self._put(self.batch_queue, (records, items)):
+                return
+            self._put(self.batch_queue, _DONE)
+        except BaseException as e:
+            self._fail(e)
+
+    def _write_stage(self) -> None:
+        try:
+            while True:
+                batch = self._get(self.batch_queue)
+                if batch is _DONE:
+                    break
+                records, items = batch
+                started = time.perf_counter()
+                self.write(records, items)
+                self.stats.write.add(len(items), time.perf_counter() - started)
+        except BaseException as e:
+            self._fail(e)
+
+    def collect_queue_depths(self) -> None:
+        QUEUE_DEPTH.set(self.record_queue.qsize(), queue='pipeline_records')
+        QUEUE_DEPTH.set(self.batch_queue.qsize(), queue='pipeline_batches')
+
+    def run(self, records: Iterable[Dict[str, Any]]) -> PipelineStats:
+        """
+        Streams ``records`` through the stages and waits for the last batch to be written.
+
+        Returns:
+            PipelineStats: Final per-stage counters.
+
+        Raises:
+            Exception: The first error raised by any stage.
+        """
+        threads = [
+            threading.Thread(target=self._fetch_stage, args=(records,), name='pipeline-fetch', daemon=True),
+            threading.Thread(target=self._transform_stage, name='pipeline-transform', daemon=True),
+            threading.Thread(target=self._write_stage, name='pipeline-write', daemon=True),
+        ]
+        metrics.REGISTRY.add_collector(self.collect_queue_depths)
+        for thread in threads:
+            thread.start()
+
+        try:
+            last_report = time.perf_counter()
+            while any(thread.is_alive() for thread in threads):
+                threads[-1].join(timeout=0.5)
+                if self.report_interval and time.perf_counter() - last_report >= self.report_interval:
+                    print(self.stats.report())
+                    last_report = time.perf_counter()
+        except BaseException as e:
+            # e.g. KeyboardInterrupt: stop the stages before leaving
+            self._fail(e)
+            raise
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            metrics.REGISTRY.remove_collector(self.collect_queue_depths)
+            self.collect_queue_depths()
+
+        if self._error is not None:
+            raise self._error
+        return self.stats
@@ -0,0 +1,81 @@
+# app/api/rate_limit.py
+
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlparse
+
+import requests
+
+
+class TokenBucket:
+    """
+    Allows ``rate`` calls per second on average, with bursts of up to ``burst`` calls.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Blocks until a call is allowed.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class HostRateLimiter:
+    """
+    One token bucket per host, shared by every form synced against that host.
+
+    Args:
+        rate (float): Requests per second per host; 0 disables the limit.
+        burst (int): Requests a host may receive back to back.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str) -> float:
+        if self.rate <= 0:
+            return 0.0
+        host = urlparse(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return bucket.acquire()
+
+
+class RateLimitedSession(requests.Session):
+    """
+    A ``requests.Session`` that waits for its host's rate limit before every request.
+    """
+
+    def __init__(self, limiter: HostRateLimiter):
+        super().__init__()
+        self.limiter = limiter
+
+    def request(self, method, url, *args, **kwargs):
+        self.limiter.acquire(url)
+        return super().request(method, url, *args, **kwargs)
@@ -0,0 +1,160 @@
+# app/api/replay.py
+"""
+Rebuilds the normalized tables from the raw_submissions archive, without contacting Kobo.
+
+Usage:
+    python app/api/replay.py [--workers 4] [--batch-size 1000] [--form-uid UID] [--mode update]
+"""
+
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Optional, Tuple
+
+# Add current directory
+sys.path.append(os.getcwd())
+
+from sqlalchemy.orm import sessionmaker
+
+from app.database.db_connection import DATABASE_URL, Base, build_engine, engine_options
+from app.database.form_tables import FormSchema, load_form_schema
+from app.database.raw_archive import raw_id_ranges, load_raw_range
+from app.database.writer import write_batch, ON_CONFLICT_MODES
+from app.api.kobo_client import load_form, transform_or_skip, write_items
+from app.utils.field_mapping import transform_record
+
+# Archived records per transaction and worker processes replaying them
+REPLAY_BATCH_SIZE = int(os.getenv("REPLAY_BATCH_SIZE", 1000))
+REPLAY_WORKERS = int(os.getenv("REPLAY_WORKERS", os.cpu_count() or 1))
+
+# Session factory, transform and writer of this worker process (set by init_worker)
+_worker: Dict[str, Any] = {}
+
+
+def init_worker(database_url: str, description: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Prepares a worker process: its own engine, and the fixed or the generated mapping.
+
+    Args:
+        database_url (str): Database to replay into.
+        description (dict): Generated table layout (``FormSchema.description``); None for the fixed models.
+    """
+    engine = build_engine(database_url, **engine_options(database_url))
+    _worker['session'] = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    if description is None:
+        _worker['transform'], _worker['write'] = transform_record, write_batch
+    else:
+        form = FormSchema(description)
+        _worker['transform'], _worker['write'] = form.transform, form.write_batch
+
+
+def replay_range(first_id: int, last_id: int, form_uid: Optional[str], on_conflict: str) -> Tuple[int, int]:
+    """
+    Transforms and writes the archived records of one ``_id`` range.
+
+    Returns:
+        tuple: The number of records read and of submissions stored.
+    """
+    db = _worker['session']()
+    try:
+        records = load_raw_range(db, first_id, last_id, form_uid)
+        items = [item for item in (transform_or_skip(record, _worker['transform']) for record in records)
+                 if item is not None]
+        stored = write_items(db, items, on_conflict, _worker['write'], _worker['write'])
+    finally:
+        db.close()
+    return len(records), stored
+
+
+def replay(database_url: str = DATABASE_URL, batch_size: int = REPLAY_BATCH_SIZE, workers: int = REPLAY_WORKERS,
+           form_uid: Optional[str] = None, on_conflict: str = 'update', after_id: Optional[int] = None,
+           dynamic_schema: bool = False, asset_file: Optional[str] = None,
+           form_version: Optional[str] = None) -> Tuple[int, int]:
+    """
+    Rebuilds the normalized tables from the archived payloads in parallel batches.
+
+    The archive is cut into ``_id`` ranges of ``batch_size`` records. Each
+    range is loaded, transformed and written by one of ``workers`` processes, in
+    its own transaction, so the replay uses several cores and connections.
+    Ranges do not overlap, so workers never write the same submission.
+
+    Args:
+        database_url (str): Database holding the archive and the tables.
+        batch_size (int): Records per range (default is set by REPLAY_BATCH_SIZE).
+        workers (int): Worker processes; 1 replays in this process (default is set by REPLAY_WORKERS).
+        form_uid (str): Only replay this form's submissions.
+        on_conflict (str): ``'update'`` rewrites stored submissions with the current mapping; ``'skip'`` only fills gaps.
+        after_id (int): Only replay submissions with a larger ``_id`` (to continue a replay).
+        dynamic_schema (bool): Replay into the tables generated from the form definition (needs ``form_uid``).
+        asset_file (str): Local form definition for ``dynamic_schema``.
+        form_version (str): Cached form version for ``dynamic_schema``.
+
+    Returns:
+        tuple: The number of records replayed and of submissions stored.
+
+    Raises:
+        ValueError: If ``on_conflict`` is invalid or ``dynamic_schema`` has no ``form_uid``.
+        LookupError: If ``dynamic_schema`` has neither an asset file nor a cached version.
+    """
+    if on_conflict not in ON_CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {ON_CONFLICT_MODES}, got {on_conflict!r}")
+
+    engine = build_engine(database_url, **engine_options(database_url))
+    description = None
+    if dynamic_schema:
+        if not form_uid:
+            raise ValueError("Replaying into generated tables needs the form's uid")
+        # Never fetch: the definition comes from a local file or the per-version cache
+        form = load_form(form_uid, asset_file, form_version) if asset_file else load_form_schema(form_uid, form_version)
+        form.create_tables(engine)
+        description = form.description
+    else:
+        Base.metadata.create_all(bind=engine)
+
+    with sessionmaker(bind=engine)() as db:
+        ranges = list(raw_id_ranges(db, batch_size, form_uid, after_id))
+    engine.dispose()
+    print(f"Replaying {len(ranges)} batches of up to {batch_size} archived records with {workers} worker(s)")
+
+    record_count = stored_count = 0
+
+    def report(first_id: int, last_id: int, records: int, stored: int) -> None:
+        nonlocal record_count, stored_count
+        record_count += records
+        stored_count += stored
+        print(f"Replayed _id {first_id}..{last_id}: {records} records ({record_count} in total)")
+
+    if workers <= 1:
+        init_worker(database_url, description)
+        for first_id, last_id in ranges:
+            report(first_id, last_id, *replay_range(first_id, last_id, form_uid, on_conflict))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(database_url, description)) as executor:
+            futures = {
+                executor.submit(replay_range, first_id, last_id, form_uid, on_conflict): (first_id, last_id)
+                for first_id, last_id in ranges
+            }
+            for future in as_completed(futures):
+                report(*futures[future], *future.result())
+
+    print(f"\nTotal records replayed: {record_count} ({stored_count} stored)")
+    return record_count, stored_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the normalized tables from the raw_submissions archive.")
+    parser.add_argument("--workers", type=int, default=REPLAY_WORKERS, help="worker processes")
+    parser.add_argument("--batch-size", type=int, default=REPLAY_BATCH_SIZE, help="records per transaction")
+    parser.add_argument("--form-uid", help="only replay this form's submissions")
+    parser.add_argument("--mode", choices=ON_CONFLICT_MODES, default="update",
+                        help="'update' rewrites stored submissions, 'skip' only adds missing ones")
+    parser.add_argument("--after-id", type=int, help="only replay submissions with a larger _id")
+    parser.add_argument("--dynamic-schema", action="store_true", help="replay into the tables generated from the form definition")
+    parser.add_argument("--asset-file", help="form definition (asset JSON) for --dynamic-schema")
+    parser.add_argument("--form-version", help="cached form version for --dynamic-schema")
+    args = parser.parse_args()
+    replay(batch_size=args.batch_size, workers=args.workers, form_uid=args.form_uid, on_conflict=args.mode,
+           after_id=args.after_id, dynamic_schema=args.dynamic_schema, asset_file=args.asset_file,
+           form_version=args.form_version)
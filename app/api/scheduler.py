@@ -0,0 +1,254 @@
+# app/api/scheduler.py
+"""
+Syncs many Kobo forms from one long-running process.
+
+Usage:
+    python app/api/scheduler.py --forms aUid1,aUid2 [--interval 300] [--once]
+"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+# Add current directory
+sys.path.append(os.getcwd())
+
+from app.api.kobo_client import KOBO_API_URL, PIPELINE, create_session, process_and_store_data, metrics_summary
+from app.api.rate_limit import HostRateLimiter
+from app.api.sync_state import form_uid_from_url
+from app.utils import metrics
+
+# Forms to sync: asset UIDs or data URLs, comma-separated
+KOBO_FORMS = os.getenv("KOBO_FORMS", "")
+# Server of forms given by asset UID; taken from KOBO_API_URL if unset
+KOBO_SERVER_URL = os.getenv("KOBO_SERVER_URL")
+# Seconds between the start of a form's syncs
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", 300))
+# Forms synced at the same time, and page requests in flight per form
+SCHEDULER_MAX_FORMS = int(os.getenv("SCHEDULER_MAX_FORMS", 4))
+SCHEDULER_FORM_WORKERS = int(os.getenv("SCHEDULER_FORM_WORKERS", 2))
+# Requests per second per Kobo host, over all forms, and the burst allowed; 0 disables the limit
+KOBO_RATE_LIMIT = float(os.getenv("KOBO_RATE_LIMIT", 5))
+KOBO_RATE_BURST = int(os.getenv("KOBO_RATE_BURST", 10))
+# A failing form waits up to this many intervals before its next attempt
+MAX_BACKOFF_INTERVALS = 8
+
+
+def data_url(form: str, server_url: Optional[str] = None) -> str:
+    """
+    Returns the data URL of a form given by asset UID or by URL.
+
+    Raises:
+        ValueError: If the form is a UID and no server is configured.
+    """
+    if '://' in form:
+        return form
+    server = server_url or KOBO_SERVER_URL
+    if not server and KOBO_API_URL:
+        parsed = urlparse(KOBO_API_URL)
+        server = f"{parsed.scheme}://{parsed.netloc}"
+    if not server:
+        raise ValueError(f"Set KOBO_SERVER_URL or KOBO_API_URL to sync form {form} by its UID")
+    return f"{server.rstrip('/')}/api/v2/assets/{form}/data/"
+
+
+class FormMetrics:
+    """
+    Outcome of the syncs of one form.
+    """
+
+    def __init__(self, form_uid: str):
+        self.form_uid = form_uid
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.records = 0
+        self.stored = 0
+        self.last_started: Optional[datetime.datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        # time.monotonic() at which the form is due again
+        self.next_run = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'form_uid': self.form_uid,
+            'runs': self.runs,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'records': self.records,
+            'stored': self.stored,
+            'last_started': self.last_started.isoformat() if self.last_started else None,
+            'last_duration': self.last_duration,
+            'last_error': self.last_error,
+        }
+
+    def __str__(self):
+        status = f"failing ({self.last_error})" if self.consecutive_failures else "ok"
+        return (f"{self.form_uid}: {self.runs} runs, {self.failures} failed, {self.records} records, "
+                f"{self.stored} stored, last run {self.last_duration or 0:.1f}s, {status}")
+
+
+class Scheduler:
+    """
+    Syncs a list of forms concurrently, every ``interval`` seconds each.
+
+    At most ``max_forms`` forms sync at once, each with ``form_workers`` page
+    requests in flight, and a form never overlaps with its own previous run.
+    All forms share one connection pool and a per-host rate limit, so adding
+    forms does not multiply the load on a Kobo server. Each form keeps its own
+    cursor (``sync_state``) and metrics. A failing form backs off, doubling its
+    wait up to MAX_BACKOFF_INTERVALS intervals, without holding up the others.
+
+    Args:
+        forms (list): Asset UIDs or data URLs.
+        interval (float): Seconds between the start of a form's syncs (default is set by SYNC_INTERVAL).
+        max_forms (int): Forms synced at the same time (default is set by SCHEDULER_MAX_FORMS).
+        form_workers (int): Page requests in flight per form (default is set by SCHEDULER_FORM_WORKERS).
+        rate_limit (float): Requests per second per host (default is set by KOBO_RATE_LIMIT).
+        burst (int): Requests a host may receive back to back (default is set by KOBO_RATE_BURST).
+        sync (callable): Syncs one form; called with ``url``, ``session``, ``max_workers`` and ``sync_options``.
+        **sync_options: Further arguments of ``process_and_store_data`` (``on_conflict``, ``pipelined``, ...).
+    """
+
+    def __init__(self, forms: List[str], interval: float = SYNC_INTERVAL, max_forms: int = SCHEDULER_MAX_FORMS,
+                 form_workers: int = SCHEDULER_FORM_WORKERS, rate_limit: float = KOBO_RATE_LIMIT,
+                 burst: int = KOBO_RATE_BURST, sync: Callable[..., Any] = process_and_store_data, **sync_options):
+        self.urls = {form_uid_from_url(url): url for url in map(data_url, forms)}
+        self.metrics = {form_uid: FormMetrics(form_uid) for form_uid in self.urls}
+        self.interval = interval
+        self.max_forms = max(max_forms, 1)
+        self.form_workers = max(form_workers, 1)
+        self.limiter = HostRateLimiter(rate_limit, burst)
+        self.session = create_session(self.max_forms * self.form_workers, self.limiter)
+        self.sync = sync
+        # One asset file cannot describe several forms
+        self.sync_options = {'asset_file': None, **sync_options}
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run_form(self, form_uid: str) -> FormMetrics:
+        """
+        Syncs one form and records the outcome in its metrics.
+        """
+        form_metrics = self.metrics[form_uid]
+        form_metrics.last_started = datetime.datetime.utcnow()
+        started = time.monotonic()
+        try:
+            records, stored = self.sync(url=self.urls[form_uid], session=self.session,
+                                        max_workers=self.form_workers, **self.sync_options)
+            form_metrics.records += records
+            form_metrics.stored += stored
+            form_metrics.consecutive_failures = 0
+            form_metrics.last_error = None
+        except Exception as e:
+            form_metrics.failures += 1
+            form_metrics.consecutive_failures += 1
+            form_metrics.last_error = str(e)
+        finally:
+            form_metrics.runs += 1
+            form_metrics.last_duration = time.monotonic() - started
+            failures = form_metrics.consecutive_failures
+            backoff = min(2 ** failures, MAX_BACKOFF_INTERVALS) if failures else 1
+            form_metrics.next_run = started + self.interval * backoff
+            with self._lock:
+                self._running.discard(form_uid)
+            print(form_metrics)
+        return form_metrics
+
+    def run_once(self) -> Dict[str, FormMetrics]:
+        """
+        Syncs every form once and returns their metrics.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_forms, thread_name_prefix="form-sync") as executor:
+            list(executor.map(self.run_form, self.urls))
+        return self.metrics
+
+    def run_forever(self) -> None:
+        """
+        Syncs each form every ``interval`` seconds until ``stop`` is called.
+
+        Syncs in progress are finished before returning.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_forms, thread_name_prefix="form-sync") as executor:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                with self._lock:
+                    due = [form_uid for form_uid, form_metrics in self.metrics.items()
+                           if form_uid not in self._running and form_metrics.next_run <= now]
+                    self._running.update(due)
+                for form_uid in due:
+                    executor.submit(self.run_form, form_uid)
+
+                with self._lock:
+                    running = bool(self._running)
+                    next_due = min((form_metrics.next_run for form_uid, form_metrics in self.metrics.items()
+                                    if form_uid not in self._running), default=now + self.interval)
+                # Sleep until the next form is due; a running form is due again once
+                # it finishes, so look again every second while any is running
+                timeout = min(next_due - now, 1.0) if running else next_due - now
+                self._stop.wait(max(timeout, 0.1))
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def report(self) -> str:
+        return "\n".join(str(form_metrics) for form_metrics in self.metrics.values())
+
+
+def read_forms(forms: str = KOBO_FORMS, forms_file: Optional[str] = None) -> List[str]:
+    """
+    Returns the forms of a comma-separated list and of a file with one form per line ('#' starts a comment).
+    """
+    entries = forms.split(',')
+    if forms_file:
+        with open(forms_file) as f:
+            entries += [line.split('#', 1)[0] for line in f]
+    return [entry.strip() for entry in entries if entry.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync several KoboToolbox forms on a schedule.")
+    parser.add_argument("--forms", default=KOBO_FORMS, help="comma-separated asset UIDs or data URLs")
+    parser.add_argument("--forms-file", help="file with one asset UID or data URL per line")
+    parser.add_argument("--interval", type=float, default=SYNC_INTERVAL, help="seconds between syncs of a form")
+    parser.add_argument("--once", action="store_true", help="sync every form once and exit")
+    parser.add_argument("--max-forms", type=int, default=SCHEDULER_MAX_FORMS, help="forms synced at the same time")
+    parser.add_argument("--form-workers", type=int, default=SCHEDULER_FORM_WORKERS, help="page requests in flight per form")
+    parser.add_argument("--rate-limit", type=float, default=KOBO_RATE_LIMIT, help="requests per second per Kobo host")
+    parser.add_argument("--pipeline", action="store_true", default=PIPELINE, help="run download, transform and writes concurrently")
+    parser.add_argument("--metrics-interval", type=float, default=metrics.METRICS_LOG_INTERVAL,
+                        help="print a metrics summary line every N seconds (0 disables it)")
+    args = parser.parse_args()
+
+    forms = read_forms(args.forms, args.forms_file)
+    if not forms:
+        parser.error("no forms given (--forms, --forms-file or KOBO_FORMS)")
+
+    scheduler = Scheduler(forms, interval=args.interval, max_forms=args.max_forms, form_workers=args.form_workers,
+                          rate_limit=args.rate_limit, pipelined=args.pipeline)
+    reporter = metrics.MetricsReporter(args.metrics_interval, metrics_summary) if args.metrics_interval > 0 else None
+    if reporter is not None:
+        reporter.start()
+    try:
+        if args.once:
+            scheduler.run_once()
+        else:
+            signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+            print(f"Syncing {len(forms)} forms every {args.interval:.0f}s, {args.max_forms} at a time")
+            try:
+                scheduler.run_forever()
+            except KeyboardInterrupt:
+                scheduler.stop()
+    finally:
+        if reporter is not None:
+            reporter.stop()
+    print(scheduler.report())
@@ -0,0 +1,125 @@
+# app/api/sync_state.py
+
+import re
+import json
+import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.database.models import SyncState
+
+# Kobo data URLs look like https://kf.kobotoolbox.org/api/v2/assets/<uid>/data/
+ASSET_UID_PATTERN = re.compile(r'/assets/([^/]+)/data')
+
+# Format Kobo uses for _submission_time, which its query filter compares as a string
+KOBO_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def form_uid_from_url(url: str) -> str:
+    """
+    Returns the asset UID of a Kobo data URL, or the URL itself if it has none.
+    """
+    match = ASSET_UID_PATTERN.search(url or '')
+    return match.group(1) if match else url
+
+
+def get_sync_state(db: Session, form_uid: str) -> Optional[SyncState]:
+    """
+    Loads the sync cursor of a form, or None if the form was never synced.
+    """
+    return db.get(SyncState, form_uid)
+
+
+def build_query(state: Optional[SyncState]) -> Optional[str]:
+    """
+    Builds the Kobo ``query`` filter selecting submissions newer than the cursor.
+
+    Submissions sharing the cursor's ``_submission_time`` are told apart by ``_id``.
+
+    Args:
+        state (SyncState): The form's sync cursor.
+
+    Returns:
+        str: The JSON query, or None when there is no cursor (full sync).
+    """
+    if state is None or state.last_submission_time is None:
+        return None
+
+    last_time = state.last_submission_time.strftime(KOBO_TIME_FORMAT)
+    return json.dumps({
+        '$or': [
+            {'_submission_time': {'$gt': last_time}},
+            {'_submission_time': last_time, '_id': {'$gt': state.last_id or 0}},
+        ]
+    })
+
+
+def _cursor_key(record: Dict[str, Any]):
+    submission_time = record.get('_submission_time')
+    if not submission_time:
+        return None
+    # Kobo reports naive UTC timestamps, optionally with fractional seconds
+    parsed = datetime.datetime.strptime(submission_time[:19], KOBO_TIME_FORMAT)
+    return parsed, record['_id']
+
+
+def resume_offset(state: Optional[SyncState], query: Optional[str]) -> int:
+    """
+    Returns where an interrupted run with the same ``query`` stopped, or 0.
+    """
+    if state is None or not state.resume_offset or (state.resume_query or '') != (query or ''):
+        return 0
+    return state.resume_offset
+
+
+def advance_sync_state(db: Session, form_uid: str, records: List[Dict[str, Any]],
+                       query: Optional[str] = None, offset: Optional[int] = None) -> Optional[SyncState]:
+    """
+    Moves the form's cursor to the newest ``(_submission_time, _id)`` in ``records``.
+
+    Call it once the records are committed; the cursor never moves backwards.
+    When ``offset`` is given it is saved as the checkpoint of the run fetching
+    ``query``, so a crashed run can resume from there.
+
+    Args:
+        db (Session): SQLAlchemy session object.
+        form_uid (str): The form's asset UID.
+        records (list): Records from KoboToolbox API that were stored.
+        query (str): The Kobo query filter of the current run.
+        offset (int): The number of records of the run stored so far.
+
+    Returns:
+        SyncState: The updated cursor.
+    """
+    keys = [key for key in map(_cursor_key, records) if key is not None]
+    state = get_sync_state(db, form_uid)
+    if not keys and offset is None:
+        return state
+
+    if state is None:
+        state = SyncState(form_uid=form_uid)
+        db.add(state)
+
+    if keys:
+        newest = max(keys)
+        if state.last_submission_time is None or (state.last_submission_time, state.last_id or 0) < newest:
+            state.last_submission_time, state.last_id = newest
+
+    if offset is not None:
+        state.resume_offset = offset
+        state.resume_query = query
+
+    db.commit()
+    return state
+
+
+def clear_checkpoint(db: Session, form_uid: str) -> None:
+    """
+    Forgets the resume point once a run has fetched everything.
+    """
+    state = get_sync_state(db, form_uid)
+    if state is not None and (state.resume_offset or state.resume_query):
+        state.resume_offset = None
+        state.resume_query = None
+        db.commit()
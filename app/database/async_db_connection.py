@@ -0,0 +1,69 @@
+# app/database/async_db_connection.py
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database.db_connection import DATABASE_URL, engine_options, register_pool_metrics
+
+# Async drivers for the sync URLs used by the rest of the app
+ASYNC_DRIVERS = {
+    "postgres://": "postgresql+asyncpg://",
+    "postgresql://": "postgresql+asyncpg://",
+    "postgresql+psycopg2://": "postgresql+asyncpg://",
+    "sqlite://": "sqlite+aiosqlite://",
+}
+
+
+def to_async_url(database_url: str) -> str:
+    """
+    Rewrites a sync database URL to use asyncpg (PostgreSQL) or aiosqlite (SQLite).
+    """
+    for prefix, async_prefix in ASYNC_DRIVERS.items():
+        if database_url.startswith(prefix):
+            database_url = async_prefix + database_url[len(prefix):]
+            break
+    # asyncpg takes ssl=... where psycopg2 takes sslmode=...
+    return database_url.replace("sslmode=", "ssl=")
+
+
+def build_async_engine(database_url: str, **kwargs):
+    """
+    Creates an async engine for the given (sync) URL; see ``build_engine``.
+    """
+    if database_url.startswith("sqlite"):
+        kwargs.setdefault("execution_options", {"schema_translate_map": {"public": None}})
+        # Concurrent requests each hold a connection; SQLite allows one writer
+        # at a time, so let them queue on the file lock rather than fail
+        kwargs.setdefault("connect_args", {"timeout": 30})
+    return create_async_engine(to_async_url(database_url), **kwargs)
+
+
+# Created on first use, so processes that never touch the async path (the
+# kobo_client batch job) do not need the async drivers installed
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = build_async_engine(DATABASE_URL, **engine_options(DATABASE_URL, async_driver=True))
+        register_pool_metrics(_async_engine, "async")
+    return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    """
+    Returns a new ``AsyncSession`` bound to the async engine.
+    """
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(
+            bind=get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory()
+
+
+# Dependency to get an async database session in FastAPI handlers
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,190 @@
+# app/database/bulk_loader.py
+
+import io
+import json
+import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import JSON, text
+from sqlalchemy.orm import Session
+
+from app.database.models import KoboSubmission, SUBMISSION_KEY, CLIENT_KEY
+from app.database import ingest_events, stats
+from app.database.writer import (
+    CHILD_TABLES, ON_CONFLICT_MODES, stamp_updated_at, unique_submissions, write_batch, WRITE_BATCH_SIZE, INSERT_SECONDS, STATS_SECONDS, COMMIT_SECONDS, STORED
+)
+from app.utils import metrics
+
+COPY_SECONDS = metrics.histogram('kobo_db_copy_seconds', 'Time streaming a batch into its staging table, per table',
+                                 ('table',))
+
+# Staging table per target table; rows are matched to their submission by _id
+STAGING_TABLES = {
+    'submission': ('kobo_submissions', 'stage_kobo_submissions'),
+    'client': ('clients', 'stage_clients'),
+    'business_info': ('business_info', 'stage_business_info'),
+    'survey_metadata': ('survey_metadata', 'stage_survey_metadata'),
+}
+
+
+# Columns stored as JSON; their values are serialized like the JSON type does
+JSON_COLUMNS = {column.name for column in KoboSubmission.__table__.columns if isinstance(column.type, JSON)}
+
+
+def copy_value(value: Any, is_json: bool = False) -> str:
+    """
+    Formats a value for PostgreSQL's ``COPY ... FROM STDIN`` text format.
+
+    Timezone-aware datetimes are converted to UTC, as they are when bound as
+    parameters on a UTC session.
+    """
+    if value is None:
+        return '\\N'
+    if is_json:
+        value = json.dumps(value)
+    elif isinstance(value, bool):
+        value = 't' if value else 'f'
+    elif isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        value = value.isoformat()
+    elif isinstance(value, datetime.date):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return (value.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_rows(cursor, table: str, columns: List[str], rows: List[Dict[str, Any]]) -> None:
+    json_flags = [column in JSON_COLUMNS for column in columns]
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(row.get(column), is_json) for column, is_json in zip(columns, json_flags)))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def _conflict_clause(key, columns: List[str], on_conflict: str) -> str:
+    if on_conflict == 'update':
+        updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns if column not in key)
+        return f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {updates}"
+    return f"ON CONFLICT ({', '.join(key)}) DO NOTHING"
+
+
+def copy_batch(db: Session, items: List[Dict[str, Optional[Dict[str, Any]]]], on_conflict: str = 'skip') -> int:
+    """
+    Loads transformed submissions with ``COPY`` into staging tables and one set-based merge.
+
+    The rows of all four tables are streamed into temporary staging tables with
+    ``COPY FROM STDIN``. Then one ``INSERT ... SELECT ... ON CONFLICT`` per
+    table moves them into place. It dedups on ``_id`` and assigns
+    ``submission_id`` by joining the children to the inserted submissions.
+    The semantics match ``write_batch``. On databases other than PostgreSQL
+    the batch is written with ``write_batch`` (executemany inserts).
+
+    Args:
+        db (Session): SQLAlchemy session object.
+        items (list): Transformed submissions (see ``write_batch``).
+        on_conflict (str): ``'skip'`` or ``'update'``.
+
+    Returns:
+        int: The number of submissions inserted (or updated).
+    """
+    if on_conflict not in ON_CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {ON_CONFLICT_MODES}, got {on_conflict!r}")
+    if not items:
+        return 0
+    if db.get_bind().dialect.name != 'postgresql':
+        return write_batch(db, items, on_conflict)
+
+    # One item per _id, so a repeated _id cannot stage its child rows twice
+    items = list(unique_submissions(stamp_updated_at(items), on_conflict).values())
+    # Clients shared by several submissions keep the first row for skip, the last for update (as write_batch)
+    order = 'DESC' if on_conflict == 'update' else 'ASC'
+    WRITE_BATCH_SIZE.observe(len(items), writer='copy')
+
+    try:
+        keys = stats.affected_keys(db, items) if stats.STATS_INCREMENTAL else ()
+        cursor = db.connection().connection.cursor()
+        columns = {}
+        for key, (table, staging) in STAGING_TABLES.items():
+            present = [(position, item) for position, item in enumerate(items) if item.get(key) is not None]
+            if not present:
+                continue
+            columns[key] = list(present[0][1][key])
+            # Submissions are staged with their position in the batch, children with their submission's _id
+            link = '_position' if key == 'submission' else '_id'
+            rows = []
+            for position, item in present:
+                row = dict(item[key])
+                row[link] = position if key == 'submission' else item['submission']['_id']
+                rows.append(row)
+            db.execute(text(
+                f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+                f"SELECT NULL::bigint AS {link}, {', '.join(columns[key])} FROM public.{table} WITH NO DATA"
+            ))
+            with COPY_SECONDS.time(table=table):
+                copy_rows(cursor, staging, [link, *columns[key]], rows)
+
+        submission_columns = ', '.join(columns['submission'])
+        db.execute(text(
+            "CREATE TEMP TABLE stage_ids ON COMMIT DROP AS "
+            "SELECT id, _id, submission_time FROM public.kobo_submissions WITH NO DATA"
+        ))
+        with INSERT_SECONDS.time(table='kobo_submissions'):
+            db.execute(text(f"""
+                WITH merged AS (
+                    INSERT INTO public.kobo_submissions ({submission_columns})
+                    SELECT DISTINCT ON (_id) {submission_columns}
+                    FROM stage_kobo_submissions
+                    ORDER BY _id, _position {order}
+                    {_conflict_clause(SUBMISSION_KEY, columns['submission'], on_conflict)}
+                    RETURNING id, _id, submission_time
+                )
+                INSERT INTO stage_ids SELECT id, _id, submission_time FROM merged
+            """))
+
+        if on_conflict == 'update':
+            # Updated submissions get their children rewritten from the new payload
+            for model in CHILD_TABLES.values():
+                db.execute(text(
+                    f"DELETE FROM public.{model.__tablename__} WHERE submission_id IN (SELECT id FROM stage_ids)"
+                ))
+
+        for key, model in CHILD_TABLES.items():
+            if key not in columns:
+                continue
+            table, staging = STAGING_TABLES[key]
+            select = f"{', '.join(f'staged.{column}' for column in columns[key])}, ids.id, ids.submission_time"
+            dedup, conflict = '', ''
+            if table == 'clients':
+                # A client keeps its unique_id across submissions; one row per client per statement
+                client_key = ', '.join('ids.submission_time' if column == 'submission_time' else f'staged.{column}'
+                                       for column in CLIENT_KEY)
+                select = f"DISTINCT ON ({client_key}) {select}"
+                dedup = f"ORDER BY {client_key}, ids._id {order}"
+                conflict = _conflict_clause(CLIENT_KEY, [*columns[key], 'submission_id', 'submission_time'], on_conflict)
+            with INSERT_SECONDS.time(table=table):
+                db.execute(text(f"""
+                    INSERT INTO public.{table} ({', '.join(columns[key])}, submission_id, submission_time)
+                    SELECT {select}
+                    FROM {staging} AS staged JOIN stage_ids AS ids ON ids._id = staged._id
+                    {dedup}
+                    {conflict}
+                """))
+
+        stored = db.execute(text("SELECT count(*) FROM stage_ids")).scalar()
+        with STATS_SECONDS.time():
+            stats.queue_refresh(db, keys)
+        if stored:
+            ingest_events.record(db, {item['submission'].get('form_uuid') for item in items})
+        with COMMIT_SECONDS.time():
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    STORED.inc(stored, writer='copy')
+    return stored
@@ -2,6 +2,8 @@
 
 import os
 import sys
+import argparse
+import datetime
 from sqlalchemy.exc import SQLAlchemyError
 
 # Add the parent directory to sys.path
@@ -9,8 +11,16 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
-from database.db_connection import engine, Base
-from database.models import KoboSubmission, Client, BusinessInfo, SurveyMetadata
+from database.db_connection import engine, Base, DB_PARTITION_BY_MONTH
+from database.partitions import create_partitions, detach_partitions
+from database.models import KoboSubmission, Client, BusinessInfo, SurveyMetadata, SyncState
+
+def stamp_migrations():
+    from alembic import command
+    from alembic.config import Config
+
+    command.stamp(Config(os.path.join(os.path.dirname(parent_dir), "alembic.ini")), "head")
+    print("Marked the database as migrated to the latest revision.")
 
 def create_tables():
     try:
@@ -22,6 +32,15 @@ def create_tables():
 
         print("Tables created successfully.")
 
+        if DB_PARTITION_BY_MONTH:
+            # Idempotent; run this script regularly so upcoming months exist in time
+            statements = create_partitions(engine)
+            print(f"Ensured {len(statements)} partitions.")
+
+        # The tables now match the latest migration; record that so later
+        # `alembic upgrade head` runs only apply newer revisions
+        stamp_migrations()
+
         # Verify tables in the database
         from sqlalchemy import inspect
         inspector = inspect(engine)
@@ -39,4 +58,14 @@ def create_tables():
         print(f"An unexpected error occurred: {e}")
 
 if __name__ == "__main__":
-    create_tables()
+    parser = argparse.ArgumentParser(description="Create the tables (and monthly partitions).")
+    parser.add_argument("--detach", metavar="YYYY-MM",
+                        help="detach this month's partitions for archiving instead of creating tables")
+    args = parser.parse_args()
+
+    if args.detach:
+        month = datetime.datetime.strptime(args.detach, "%Y-%m").date()
+        for name in detach_partitions(engine, month):
+            print(f"Detached {name}")
+    else:
+        create_tables()
@@ -0,0 +1,347 @@
+# app/database/data_quality.py
+"""
+Profiles the stored data of each form version with SQL aggregates and stores the reports.
+
+Usage:
+    python app/database/data_quality.py [--form-uuid UUID] [--version VERSION]
+
+Null rates, distinct counts, histograms and outliers are computed by the
+database, a few statements per table, so memory does not grow with the number
+of rows and nothing is downloaded.
+"""
+
+import os
+import sys
+import json
+import math
+import datetime
+import argparse
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+# Add current directory
+sys.path.append(os.getcwd())
+
+from sqlalchemy import JSON, BigInteger, Boolean, DateTime, Float, Integer, UniqueConstraint, case, cast, func, null, or_, select
+from sqlalchemy.orm import Session
+
+from app.database.models import KoboSubmission, Client, BusinessInfo, SurveyMetadata, DataQualityReport
+
+QUALITY_TABLES = (KoboSubmission, Client, BusinessInfo, SurveyMetadata)
+# Keys and links; their quality is enforced by the schema
+SKIPPED_COLUMNS = {'id', 'submission_id'}
+
+# Equal-width bins of numeric histograms, and most frequent values listed for other columns
+HISTOGRAM_BINS = int(os.getenv("DQ_HISTOGRAM_BINS", 10))
+TOP_VALUES = int(os.getenv("DQ_TOP_VALUES", 20))
+# Columns with more distinct values (identifiers, free text) get no histogram
+HISTOGRAM_MAX_DISTINCT = int(os.getenv("DQ_HISTOGRAM_MAX_DISTINCT", 1000))
+# Histograms of several columns are counted by one GROUP BY while it yields at most this many groups
+MAX_GROUPS = 10000
+# Numeric values further than this many standard deviations from the mean are outliers
+OUTLIER_STDDEVS = float(os.getenv("DQ_OUTLIER_STDDEVS", 3))
+# Submissions (_id) listed per flag
+FLAGGED_EXAMPLES = 10
+
+# Plausible ranges; values outside are flagged as invalid whatever the distribution
+VALID_RANGES = {
+    'age': (10, 100),
+    'responsible_people': (0, 50),
+}
+
+
+def column_kind(column) -> str:
+    if isinstance(column.type, JSON):
+        return 'json'
+    if isinstance(column.type, Boolean):
+        return 'categorical'
+    if isinstance(column.type, (Integer, BigInteger, Float)):
+        return 'numeric'
+    if isinstance(column.type, DateTime):
+        return 'datetime'
+    return 'categorical'
+
+
+def profiled_columns(model) -> List[Tuple[Any, str]]:
+    return [(column, column_kind(column)) for column in model.__table__.columns if column.name not in SKIPPED_COLUMNS]
+
+
+# Limits a statement over a table to the rows of the form version profiled
+Scope = Callable[[Any, Any], Any]
+
+
+def version_scope(form_uuid: UUID, version: Optional[str], whole_table: bool = False) -> Scope:
+    """
+    Returns the scope of one form version; with ``whole_table`` (the only version stored) it filters nothing.
+    """
+    def scope(stmt, model):
+        if whole_table:
+            return stmt
+        if model is not KoboSubmission:
+            stmt = stmt.join(KoboSubmission, model.submission_id == KoboSubmission.id)
+        version_filter = KoboSubmission.version.is_(None) if version is None else KoboSubmission.version == version
+        return stmt.where(KoboSubmission.form_uuid == form_uuid, version_filter)
+    return scope
+
+
+def form_versions(db: Session, form_uuid: Optional[UUID] = None,
+                  version: Optional[str] = None) -> List[Tuple[UUID, Optional[str], int]]:
+    """
+    Returns the stored (form_uuid, version, submissions) combinations, optionally filtered.
+    """
+    stmt = select(KoboSubmission.form_uuid, KoboSubmission.version, func.count())
+    if form_uuid is not None:
+        stmt = stmt.where(KoboSubmission.form_uuid == form_uuid)
+    if version is not None:
+        stmt = stmt.where(KoboSubmission.version == version)
+    stmt = stmt.group_by(KoboSubmission.form_uuid, KoboSubmission.version)
+    return [tuple(row) for row in db.execute(stmt.order_by(KoboSubmission.form_uuid, KoboSubmission.version))]
+
+
+def json_value(value: Any) -> Any:
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def is_unique(column) -> bool:
+    # Single-column unique constraints: the distinct count is the non-null count
+    return any(len(constraint.columns) == 1 and next(iter(constraint.columns)) is column
+               for constraint in column.table.constraints if isinstance(constraint, UniqueConstraint))
+
+
+def counts_distinct(column, kind: str) -> bool:
+    # Timestamps are nearly all distinct and JSON values are not compared
+    return kind in ('numeric', 'categorical') and not is_unique(column)
+
+
+def summarize(db: Session, model, columns, scope: Scope) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+    """
+    Computes the per-column counts and moments of a table in one statement.
+    """
+    aggregates = [func.count()]
+    for column, kind in columns:
+        aggregates.append(func.count(column))
+        if counts_distinct(column, kind):
+            aggregates.append(func.count(func.distinct(column)))
+        if kind in ('numeric', 'datetime'):
+            aggregates += [func.min(column), func.max(column)]
+        if kind == 'numeric':
+            value = cast(column, Float)
+            aggregates += [func.avg(value), func.avg(value * value)]
+    values = iter(db.execute(scope(select(*aggregates).select_from(model), model)).one())
+
+    rows = next(values)
+    profiles = {}
+    for column, kind in columns:
+        present = next(values)
+        profile = {'kind': kind, 'nulls': rows - present, 'null_rate': (rows - present) / rows if rows else None}
+        if counts_distinct(column, kind):
+            profile['distinct'] = next(values)
+        elif is_unique(column):
+            profile['distinct'] = present
+        if kind in ('numeric', 'datetime'):
+            profile['min'], profile['max'] = json_value(next(values)), json_value(next(values))
+        if kind == 'numeric':
+            mean, mean_square = next(values), next(values)
+            profile['mean'] = mean
+            profile['stddev'] = math.sqrt(max(mean_square - mean * mean, 0)) if mean is not None else None
+        profiles[column.name] = profile
+    return rows, profiles
+
+
+def bin_edges(profile: Dict[str, Any]) -> List[float]:
+    # Lower edges of the equal-width bins between a numeric column's min and max
+    low, high = profile['min'], profile['max']
+    width = (high - low) / HISTOGRAM_BINS
+    return [low + width * index for index in range(HISTOGRAM_BINS)] if width else [low]
+
+
+def histogram_key(column, profile: Dict[str, Any]):
+    """
+    Returns what a column's histogram counts (its bin or its value) and how many groups it yields.
+    """
+    if profile['kind'] == 'numeric':
+        edges = bin_edges(profile)
+        # Bins as a CASE over their upper edges, the same on every database
+        bin_index = case((column.is_(None), null()),
+                         *((column < edge, index) for index, edge in enumerate(edges[1:])), else_=len(edges) - 1)
+        return bin_index, len(edges) + 1
+    return column, profile['distinct'] + 1
+
+
+def histograms(db: Session, model, columns, profiles: Dict[str, Dict[str, Any]], scope: Scope) -> None:
+    """
+    Adds the histograms of a table's numeric and categorical columns to their profiles.
+
+    Columns are packed into as few ``GROUP BY`` statements as the group count
+    allows (MAX_GROUPS): one statement counts the combinations of several
+    columns' values and each histogram is summed from them, so a table is
+    scanned once or twice instead of once per column.
+    """
+    keys = []
+    for column, kind in columns:
+        profile = profiles[column.name]
+        if kind == 'numeric':
+            wanted = profile['min'] is not None
+        else:
+            # Identifiers are skipped, whatever their number
+            wanted = kind == 'categorical' and not is_unique(column) and 0 < profile['distinct'] <= HISTOGRAM_MAX_DISTINCT
+        if wanted:
+            expression, groups = histogram_key(column, profile)
+            keys.append((column.name, expression, groups))
+
+    batches, batch, groups_in_batch = [], [], 1
+    for key in sorted(keys, key=lambda key: key[2]):
+        if batch and groups_in_batch * key[2] > MAX_GROUPS:
+            batches.append(batch)
+            batch, groups_in_batch = [], 1
+        batch.append(key)
+        groups_in_batch *= key[2]
+    if batch:
+        batches.append(batch)
+
+    for batch in batches:
+        expressions = [expression for _, expression, _ in batch]
+        counts = [Counter() for _ in batch]
+        for row in db.execute(scope(select(*expressions, func.count()).select_from(model), model).group_by(*expressions)):
+            for counter, value in zip(counts, row[:-1]):
+                counter[value] += row[-1]
+
+        for (name, _, _), counter in zip(batch, counts):
+            profile = profiles[name]
+            counter.pop(None, None)
+            if profile['kind'] == 'numeric':
+                edges = bin_edges(profile)
+                highs = edges[1:] + [profile['max']]
+                profile['histogram'] = [{'low': low, 'high': high, 'count': counter.get(index, 0)}
+                                        for index, (low, high) in enumerate(zip(edges, highs))]
+            else:
+                top = sorted(counter.items(), key=lambda item: (-item[1], str(item[0])))[:TOP_VALUES]
+                profile['histogram'] = [{'value': json_value(value), 'count': count} for value, count in top]
+
+
+def flagged(db: Session, model, condition, scope: Scope) -> Dict[str, Any]:
+    """
+    Counts the rows matching ``condition`` and lists the ``_id`` of a few of their submissions.
+    """
+    count = db.scalar(scope(select(func.count()).select_from(model), model).where(condition))
+    examples = []
+    if count:
+        link = KoboSubmission.id if model is KoboSubmission else model.submission_id
+        submission_ids = list(db.scalars(scope(select(link).select_from(model), model)
+                                         .where(condition).order_by(link).limit(FLAGGED_EXAMPLES)))
+        examples = list(db.scalars(select(KoboSubmission._id).where(KoboSubmission.id.in_(submission_ids))
+                                   .order_by(KoboSubmission._id)))
+    return {'count': count, 'examples': examples}
+
+
+def profile_table(db: Session, model, scope: Scope) -> Dict[str, Any]:
+    """
+    Profiles every column of a table for one form version.
+    """
+    columns = profiled_columns(model)
+    rows, profiles = summarize(db, model, columns, scope)
+    if rows:
+        histograms(db, model, columns, profiles, scope)
+    for column, kind in columns:
+        profile = profiles[column.name]
+        if kind == 'numeric' and profile['stddev'] and not is_unique(column):
+            low = profile['mean'] - OUTLIER_STDDEVS * profile['stddev']
+            high = profile['mean'] + OUTLIER_STDDEVS * profile['stddev']
+            profile['outliers'] = dict(low=low, high=high, **flagged(db, model, or_(column < low, column > high), scope))
+        if column.name in VALID_RANGES and rows:
+            low, high = VALID_RANGES[column.name]
+            profile['invalid'] = dict(low=low, high=high, **flagged(db, model, or_(column < low, column > high), scope))
+    return {'rows': rows, 'columns': profiles}
+
+
+def build_report(db: Session, form_uuid: UUID, version: Optional[str], whole_table: bool = False) -> Dict[str, Any]:
+    """
+    Profiles the four tables for the submissions of one form version.
+
+    Args:
+        db (Session): SQLAlchemy session object.
+        form_uuid (UUID): The form.
+        version (str): The form version (``__version__``).
+        whole_table (bool): The tables hold nothing else, so no filter (and join) is needed.
+
+    Returns:
+        dict: Per table the row count and, per column, null count and rate,
+        distinct count, histogram, and for numeric columns min, max, mean,
+        standard deviation, outliers and values outside VALID_RANGES.
+    """
+    scope = version_scope(form_uuid, version, whole_table)
+    return {
+        'form_uuid': str(form_uuid),
+        'version': version,
+        'tables': {model.__tablename__: profile_table(db, model, scope) for model in QUALITY_TABLES},
+    }
+
+
+def store_reports(db: Session, form_uuid: Optional[UUID] = None, version: Optional[str] = None) -> List[DataQualityReport]:
+    """
+    Builds and stores a report for every stored form version (or the ones selected).
+
+    Every run adds new reports, so quality can be compared over time.
+
+    Returns:
+        list: The stored reports.
+    """
+    reports = []
+    try:
+        versions = form_versions(db, form_uuid, version)
+        only_version = len(versions) == 1 and len(form_versions(db)) == 1
+        for report_form, report_version, submissions in versions:
+            report = DataQualityReport(form_uuid=report_form, version=report_version, submissions=submissions,
+                                       report=build_report(db, report_form, report_version, only_version))
+            db.add(report)
+            reports.append(report)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return reports
+
+
+def latest_report(db: Session, form_uuid: UUID, version: Optional[str]) -> Optional[DataQualityReport]:
+    version_filter = DataQualityReport.version.is_(None) if version is None else DataQualityReport.version == version
+    return db.scalars(select(DataQualityReport)
+                      .where(DataQualityReport.form_uuid == form_uuid, version_filter)
+                      .order_by(DataQualityReport.created_at.desc(), DataQualityReport.id.desc())).first()
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """
+    Renders the null rates and flags of a report as text, one line per column.
+    """
+    lines = [f"Form {report['form_uuid']} version {report['version']}"]
+    for table, profile in report['tables'].items():
+        lines.append(f"  {table}: {profile['rows']} rows")
+        for name, column in profile['columns'].items():
+            flags = ', '.join(f"{column[flag]['count']} {flag}" for flag in ('outliers', 'invalid')
+                              if column.get(flag, {}).get('count'))
+            null_rate = f"{column['null_rate']:.1%}" if column['null_rate'] is not None else "-"
+            distinct = f"{column['distinct']} distinct" if 'distinct' in column else ""
+            lines.append(f"    {name:<28} {null_rate:>7} null  {distinct:<16} {flags}".rstrip())
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from app.database.db_connection import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Profile the stored data of each form version.")
+    parser.add_argument("--form-uuid", type=UUID, help="only this form")
+    parser.add_argument("--version", help="only this form version")
+    parser.add_argument("--json", action="store_true", help="print the full reports as JSON")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        for stored in store_reports(db, args.form_uuid, args.version):
+            print(json.dumps(stored.report, indent=2) if args.json else format_report(stored.report))
+    finally:
+        db.close()
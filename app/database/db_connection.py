@@ -1,15 +1,20 @@
 import os
+import time
 import logging
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
 from dotenv import load_dotenv
+from app.utils import metrics
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Determine if we're in production or development
@@ -23,15 +28,192 @@ else:
     DATABASE_URL = os.getenv("LOCAL_DATABASE_URL")
     logger.info("Using local database.")
 
-logger.info(f"Using database URL: {DATABASE_URL}")
+if DATABASE_URL:
+    logger.info(f"Using database URL: {make_url(DATABASE_URL).render_as_string(hide_password=True)}")
 
-# Ensure the DATABASE_URL is using the correct protocol
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+def env_flag(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
+# Engine configuration; with several uvicorn workers every process gets its own
+# pool, so the database sees up to workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections
+DB_ECHO = env_flag("DB_ECHO", False)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", True)
+# Server-side limit per statement in milliseconds (PostgreSQL only); 0 disables it
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+
+# Range-partition kobo_submissions and its child tables by month of
+# submission_time (PostgreSQL only; decided when the tables are created)
+DB_PARTITION_BY_MONTH = env_flag("DB_PARTITION_BY_MONTH", False) and (DATABASE_URL or "").startswith("postgres")
+# First month with its own partition ('YYYY-MM', default: the current month);
+# older rows go to the default partition
+DB_PARTITION_START = os.getenv("DB_PARTITION_START")
+# Monthly partitions created ahead of the current month
+DB_PARTITION_MONTHS_AHEAD = int(os.getenv("DB_PARTITION_MONTHS_AHEAD", 3))
+
+
+POOL_WAIT_SECONDS = metrics.histogram('kobo_db_pool_wait_seconds', 'Time waiting for a pooled connection')
+POOL_TIMEOUTS = metrics.counter('kobo_db_pool_timeouts_total', 'Checkouts that gave up waiting for a connection')
+POOL_CONNECTIONS = metrics.gauge('kobo_db_pool_connections', 'Connections of the pool by state',
+                                 ('engine', 'state'))
+POOL_SIZE = metrics.gauge('kobo_db_pool_size', 'Configured size of the pool', ('engine',))
+
+
+class PoolWaitStats:
+    """
+    How often and how long callers waited for a pooled connection.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+        POOL_WAIT_SECONDS.observe(seconds)
+        if timed_out:
+            POOL_TIMEOUTS.inc()
+
+
+class TimedQueuePool(QueuePool):
+    """
+    ``QueuePool`` that records how long each checkout waited for a connection.
+
+    Only checkouts that gave up after ``pool_timeout`` count as timeouts;
+    other errors (e.g. failing to connect) are raised without being recorded.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.wait_stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - started)
+        return connection
+
+
+class TimedAsyncAdaptedQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """
+    ``TimedQueuePool`` for async engines.
+    """
+
+
+def engine_options(database_url: str, async_driver: bool = False) -> dict:
+    """
+    Builds ``create_engine`` keyword arguments from the DB_* environment variables.
+
+    Args:
+        database_url (str): The database URL the engine is created for.
+        async_driver (bool): Whether the engine uses asyncpg rather than psycopg2.
+
+    Returns:
+        dict: Engine options (echo, pool settings, statement timeout).
+    """
+    options = {"echo": DB_ECHO}
+    if database_url.startswith("sqlite"):
+        # SQLite uses its own single-file pools
+        return options
+
+    options.update(
+        poolclass=TimedAsyncAdaptedQueuePool if async_driver else TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    if DB_STATEMENT_TIMEOUT_MS:
+        if async_driver:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def pool_stats(engine) -> dict:
+    """
+    Reports the current state of an engine's connection pool.
+
+    Returns:
+        dict: Pool size, checked-out/idle/overflow connections and, for pools
+        built by ``engine_options``, checkout counts and wait times in seconds.
+    """
+    pool = getattr(engine, "sync_engine", engine).pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    wait_stats = getattr(pool, "wait_stats", None)
+    if wait_stats is not None:
+        stats.update(
+            checkouts=wait_stats.checkouts,
+            timeouts=wait_stats.timeouts,
+            total_wait=round(wait_stats.total_wait, 6),
+            avg_wait=round(wait_stats.total_wait / wait_stats.checkouts, 6) if wait_stats.checkouts else 0.0,
+            max_wait=round(wait_stats.max_wait, 6),
+        )
+    return stats
+
+
+def register_pool_metrics(engine, name: str) -> None:
+    """
+    Exposes the size and the connections by state of ``engine``'s pool as gauges, read on every scrape.
+    """
+    def collect():
+        stats = pool_stats(engine)
+        if 'size' not in stats:
+            return
+        POOL_SIZE.set(stats['size'], engine=name)
+        for state in ('checked_out', 'idle', 'overflow'):
+            POOL_CONNECTIONS.set(stats[state], engine=name, state=state)
+
+    metrics.REGISTRY.add_collector(collect)
+
+
+def build_engine(database_url: str, **kwargs):
+    """
+    Creates a SQLAlchemy engine for the given URL.
+
+    Normalises Heroku/Render style ``postgres://`` URLs and, for SQLite, maps the
+    ``public`` schema used by the models away so a local SQLite file can stand in
+    for PostgreSQL (tests, benchmarks).
+    """
+    # Ensure the DATABASE_URL is using the correct protocol
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+    if database_url.startswith("sqlite"):
+        kwargs.setdefault("execution_options", {"schema_translate_map": {"public": None}})
+
+    return create_engine(database_url, **kwargs)
 
 # Create the database engine
-engine = create_engine(DATABASE_URL, echo=True)
+engine = build_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 logger.info("Database engine created successfully.")
+register_pool_metrics(engine, "sync")
 
 # Create a configured "Session" class
 SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
@@ -0,0 +1,494 @@
+# app/database/form_tables.py
+
+import os
+import re
+import json
+import hashlib
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import (BigInteger, Column, Date, DateTime, Float, ForeignKey, Integer, MetaData, Table, Text,
+                        UniqueConstraint, delete, inspect, select, text)
+from sqlalchemy.orm import Session
+
+from app.database.models import JSONType
+from app.database.writer import ON_CONFLICT_MODES, dialect_insert, on_conflict_clause, stamp_updated_at, unique_submissions
+from app.utils import field_mapping
+from app.utils.field_mapping import Field, compile_mapping, to_int
+from app.utils.parsing import parse_date, parse_datetime
+
+# Directory holding one generated table layout per form version
+FORM_SCHEMA_CACHE_DIR = os.getenv("FORM_SCHEMA_CACHE_DIR", ".form_schema_cache")
+
+# Generated tables are named kobo_form_<asset uid>[__<repeat group>]
+FORM_TABLE_PREFIX = 'kobo_form_'
+
+# PostgreSQL truncates identifiers longer than this
+MAX_IDENTIFIER_LENGTH = 63
+
+
+def to_float(value: Any) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def to_text(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value) if isinstance(value, (list, dict)) else str(value)
+
+
+# Column kinds of the generated tables: SQL type and coercer of the Kobo value
+COLUMN_KINDS = {
+    'integer': (BigInteger, to_int),
+    'decimal': (Float, to_float),
+    'date': (Date, parse_date),
+    'datetime': (DateTime, parse_datetime),
+    'text': (Text, to_text),
+    'json': (JSONType, None),
+}
+
+# XLSForm question types -> column kind; every other type is stored as text
+# (select_multiple keeps Kobo's space-separated choice names)
+QUESTION_KINDS = {
+    'integer': 'integer',
+    'decimal': 'decimal',
+    'range': 'decimal',
+    'date': 'date',
+    'today': 'date',
+    'datetime': 'datetime',
+    'start': 'datetime',
+    'end': 'datetime',
+}
+
+# Survey rows that never carry a value in the submission
+SKIPPED_TYPES = {'note'}
+
+
+class FormColumn(NamedTuple):
+    """
+    One column of a generated table.
+
+    Attributes:
+        name (str): Column name.
+        path (str): Key of the value in the Kobo record (or repeat entry).
+        kind (str): Key of COLUMN_KINDS.
+    """
+    name: str
+    path: str
+    kind: str
+
+
+# Submission metadata every Kobo record carries; stored on the form's main table
+META_COLUMNS = (
+    FormColumn('_id', '_id', 'integer'),
+    FormColumn('_uuid', '_uuid', 'text'),
+    FormColumn('form_uuid', 'formhub/uuid', 'text'),
+    FormColumn('instance_id', 'meta/instanceID', 'text'),
+    FormColumn('_submission_time', '_submission_time', 'datetime'),
+    FormColumn('_status', '_status', 'text'),
+    FormColumn('_submitted_by', '_submitted_by', 'text'),
+    FormColumn('form_version', '__version__', 'text'),
+    FormColumn('_geolocation', '_geolocation', 'json'),
+    FormColumn('_tags', '_tags', 'json'),
+    FormColumn('_notes', '_notes', 'json'),
+    FormColumn('_validation_status', '_validation_status', 'json'),
+    FormColumn('_attachments', '_attachments', 'json'),
+)
+
+# Kobo bookkeeping keys that are neither stored nor reported as unmapped
+IGNORED_PATHS = {
+    '_xform_id_string', '_bamboo_dataset_id', '_media_all_received', '_media_count', '_total_media',
+    '_supplementalDetails', 'meta/rootUuid', 'meta/deprecatedID',
+}
+
+# Columns added to the generated tables by the schema itself
+RESERVED_COLUMNS = {'id', 'parent_id', 'repeat_index', '_unmapped', 'updated_at'}
+
+
+class FormTable:
+    """
+    A generated table: the form's main table or one repeat group.
+
+    Attributes:
+        name (str): Table name.
+        path (str): Key of the repeat group in the record; None for the main table.
+        columns (list): The question columns (FormColumn).
+        children (list): Tables of the repeat groups nested in this one.
+    """
+
+    def __init__(self, name: str, path: Optional[str] = None, columns: Optional[List[FormColumn]] = None,
+                 children: Optional[List['FormTable']] = None):
+        self.name = name
+        self.path = path
+        self.columns = columns or []
+        self.children = children or []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'path': self.path,
+            'columns': [list(column) for column in self.columns],
+            'children': [child.to_dict() for child in self.children],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FormTable':
+        return cls(data['name'], data['path'], [FormColumn(*column) for column in data['columns']],
+                   [cls.from_dict(child) for child in data['children']])
+
+
+def identifier(name: str) -> str:
+    """
+    Turns a form name into a lower-case SQL identifier of at most 63 characters.
+    """
+    name = re.sub(r'\W', '_', name).lower()
+    if len(name) > MAX_IDENTIFIER_LENGTH:
+        digest = hashlib.md5(name.encode()).hexdigest()[:8]
+        name = f"{name[:MAX_IDENTIFIER_LENGTH - 9]}_{digest}"
+    return name
+
+
+def unique_identifier(candidates: List[str], taken: set) -> str:
+    """
+    Returns the first candidate not in ``taken`` (numbering the last one if needed) and marks it taken.
+    """
+    names = [identifier(candidate) for candidate in candidates]
+    name = next((name for name in names if name not in taken), None)
+    number = 2
+    while name is None:
+        name = identifier(f"{candidates[-1]}_{number}")
+        name = None if name in taken else name
+        number += 1
+    taken.add(name)
+    return name
+
+
+def describe_asset(asset: Dict[str, Any], uid: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Derives the table layout of a form from its Kobo asset.
+
+    Questions become columns of the form's main table; every repeat group becomes
+    a child table (nested repeats nest further). Groups only prefix the record
+    keys. A question whose name is taken in its table is prefixed with its groups.
+
+    Args:
+        asset (dict): The asset from ``/api/v2/assets/<uid>/`` or its ``content`` alone.
+        uid (str): Asset UID, if the asset does not carry it (local files).
+
+    Returns:
+        dict: ``uid``, ``version`` and the main ``table`` (see ``FormTable.to_dict``),
+        the JSON that is cached per form version.
+
+    Raises:
+        ValueError: If the asset has no survey or its groups are unbalanced.
+    """
+    uid = asset.get('uid') or uid
+    version = asset.get('deployed_version_id') or asset.get('version_id')
+    survey = asset.get('content', asset).get('survey')
+    if not uid or not survey:
+        raise ValueError("The asset must have a uid and a survey")
+
+    root = FormTable(identifier(f"{FORM_TABLE_PREFIX}{uid}"))
+    table_names = {root.name}
+    column_names = {root.name: RESERVED_COLUMNS | {column.name for column in META_COLUMNS}}
+    # (table, group names) of every open group; repeats open a new table
+    stack: List[Tuple[FormTable, List[str]]] = []
+    table, groups = root, []
+
+    for row in survey:
+        kind = (row.get('type') or '').split(' ')[0]
+        name = row.get('name') or row.get('$autoname')
+        if kind.startswith('begin_'):
+            stack.append((table, groups))
+            groups = groups + [name]
+            if kind == 'begin_repeat':
+                child = FormTable(unique_identifier([f"{root.name}__{name}", f"{table.name}__{name}"], table_names),
+                                  '/'.join(groups))
+                column_names[child.name] = set(RESERVED_COLUMNS)
+                table.children.append(child)
+                table = child
+        elif kind.startswith('end_'):
+            if not stack:
+                raise ValueError(f"Unbalanced {kind} in the survey")
+            table, groups = stack.pop()
+        elif name and kind not in SKIPPED_TYPES:
+            path = '/'.join(groups + [name])
+            column = unique_identifier([name, path.replace('/', '__')], column_names[table.name])
+            table.columns.append(FormColumn(column, path, QUESTION_KINDS.get(kind, 'text')))
+
+    if stack:
+        raise ValueError("Unclosed group in the survey")
+    return {'uid': uid, 'version': version, 'table': root.to_dict()}
+
+
+class FormSchema:
+    """
+    The SQLAlchemy tables, transform and writer generated for one Kobo form.
+
+    Every table has an ``id`` primary key and an ``_unmapped`` JSON column for
+    record keys the form definition does not know (fields added after the
+    schema was generated), so nothing is dropped. The main table also has the
+    submission metadata (META_COLUMNS) with ``_id`` unique, and the
+    ``updated_at`` the writers set on every insert and update. Repeat tables link
+    to their parent row through ``parent_id`` and keep the entry's position in
+    ``repeat_index``.
+    """
+
+    def __init__(self, description: Dict[str, Any]):
+        self.description = description
+        self.uid = description['uid']
+        self.version = description['version']
+        self.root = FormTable.from_dict(description['table'])
+        self.metadata = MetaData()
+        self.tables: Dict[str, Table] = {}
+        self._transforms: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {}
+        self._known_paths: Dict[str, set] = {}
+        self._build(self.root)
+
+    def _build(self, table: FormTable, parent: Optional[FormTable] = None) -> None:
+        columns = list(table.columns) if parent else [*META_COLUMNS, *table.columns]
+        sql_columns = [Column('id', Integer, primary_key=True, autoincrement=True)]
+        if parent is None:
+            constraint = UniqueConstraint('_id', name=identifier(f"{table.name}__id_key"))
+        else:
+            sql_columns += [
+                Column('parent_id', Integer, ForeignKey(f'public.{parent.name}.id', ondelete='CASCADE'), nullable=False),
+                Column('repeat_index', Integer, nullable=False),
+            ]
+            constraint = UniqueConstraint('parent_id', 'repeat_index', name=identifier(f"{table.name}_parent_id_key"))
+        sql_columns += [Column(column.name, COLUMN_KINDS[column.kind][0]) for column in columns]
+        sql_columns.append(Column('_unmapped', JSONType))
+        if parent is None:
+            sql_columns.append(Column('updated_at', DateTime))
+        self.tables[table.name] = Table(table.name, self.metadata, *sql_columns, constraint, schema='public')
+
+        fields = tuple(
+            Field(column.name, column.path, COLUMN_KINDS[column.kind][1], required=column.name == '_id' and not parent)
+            for column in columns
+        )
+        self._transforms[table.name] = compile_mapping((field_mapping.Table('row', fields),))
+        known = {column.path for column in columns} | {child.path for child in table.children}
+        self._known_paths[table.name] = known if parent else known | IGNORED_PATHS
+
+        for child in table.children:
+            self._build(child, table)
+
+    def transform(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Transforms a Kobo record into rows of the generated tables.
+
+        Returns:
+            dict: ``{'submission': row, 'repeats': {table name: [entry, ...]}}``, where
+            each repeat entry is ``{'row': row, 'repeats': {...}}`` in record order.
+
+        Raises:
+            KeyError: If the record has no ``_id``.
+            ValueError: If a value cannot be coerced or a repeat group is not a list.
+        """
+        row, repeats = self._transform(self.root, record)
+        return {'submission': row, 'repeats': repeats}
+
+    def _transform(self, table: FormTable, record: Dict[str, Any]):
+        row = self._transforms[table.name](record)['row']
+        known = self._known_paths[table.name]
+        row['_unmapped'] = {key: value for key, value in record.items() if key not in known} or None
+        repeats = {}
+        for child in table.children:
+            entries = record.get(child.path) or []
+            if not isinstance(entries, list):
+                raise ValueError(f"Repeat group {child.path} is not a list")
+            repeats[child.name] = []
+            for entry in entries:
+                child_row, child_repeats = self._transform(child, entry)
+                repeats[child.name].append({'row': child_row, 'repeats': child_repeats})
+        return row, repeats
+
+    def create_tables(self, bind) -> List[str]:
+        """
+        Creates the form's tables and adds the columns a newer form version introduced.
+
+        Columns are only ever added; columns of questions removed from the form stay.
+
+        Args:
+            bind: Engine to create the tables with.
+
+        Returns:
+            list: The added columns as ``table.column``.
+        """
+        self.metadata.create_all(bind)
+        added = []
+        with bind.begin() as conn:
+            inspector = inspect(conn)
+            translate = conn.get_execution_options().get('schema_translate_map') or {}
+            preparer = conn.dialect.identifier_preparer
+            for table in self.metadata.sorted_tables:
+                schema = translate.get(table.schema, table.schema)
+                existing = {column['name'] for column in inspector.get_columns(table.name, schema=schema)}
+                qualified = preparer.quote(table.name)
+                if schema:
+                    qualified = f"{preparer.quote_schema(schema)}.{qualified}"
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    conn.execute(text(f"ALTER TABLE {qualified} ADD COLUMN {preparer.quote(column.name)} "
+                                      f"{column.type.compile(dialect=conn.dialect)}"))
+                    added.append(f"{table.name}.{column.name}")
+        return added
+
+    def write_batch(self, db: Session, items: List[Dict[str, Any]], on_conflict: str = 'skip') -> int:
+        """
+        Writes a batch of transformed records to the form's tables in one transaction.
+
+        Behaves like ``app.database.writer.write_batch``: main rows are upserted
+        on ``_id`` and the repeat rows are linked through ``RETURNING id``.
+        Updated submissions get their repeat rows replaced.
+
+        Args:
+            db (Session): SQLAlchemy session object.
+            items (list): Records transformed by ``transform``.
+            on_conflict (str): ``'skip'`` or ``'update'``.
+
+        Returns:
+            int: The number of submissions inserted (or updated).
+        """
+        if on_conflict not in ON_CONFLICT_MODES:
+            raise ValueError(f"on_conflict must be one of {ON_CONFLICT_MODES}, got {on_conflict!r}")
+
+        unique_items = unique_submissions(stamp_updated_at(items), on_conflict)
+        if not unique_items:
+            return 0
+
+        table = self.tables[self.root.name]
+        rows = [item['submission'] for item in unique_items.values()]
+
+        try:
+            stmt = on_conflict_clause(dialect_insert(db, table), ['_id'], list(rows[0]), on_conflict)
+            ids = {kobo_id: row_id for row_id, kobo_id in db.execute(stmt.returning(table.c.id, table.c._id), rows)}
+
+            if ids and on_conflict == 'update':
+                self._delete_repeats(db, self.root, list(ids.values()))
+
+            self._insert_repeats(db, self.root, [
+                (ids[_id], item['repeats']) for _id, item in unique_items.items() if _id in ids
+            ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return len(ids)
+
+    def _delete_repeats(self, db: Session, table: FormTable, parent_ids: List[int]) -> None:
+        for child in table.children:
+            sql_table = self.tables[child.name]
+            if child.children:
+                child_ids = db.scalars(select(sql_table.c.id).where(sql_table.c.parent_id.in_(parent_ids))).all()
+                self._delete_repeats(db, child, list(child_ids))
+            db.execute(delete(sql_table).where(sql_table.c.parent_id.in_(parent_ids)))
+
+    def _insert_repeats(self, db: Session, table: FormTable, parents: List[Tuple[int, Dict[str, Any]]]) -> None:
+        for child in table.children:
+            rows, entries = [], {}
+            for parent_id, repeats in parents:
+                for index, entry in enumerate(repeats[child.name]):
+                    rows.append(dict(entry['row'], parent_id=parent_id, repeat_index=index))
+                    entries[parent_id, index] = entry['repeats']
+            if not rows:
+                continue
+            sql_table = self.tables[child.name]
+            if not child.children:
+                db.execute(sql_table.insert(), rows)
+                continue
+            stmt = sql_table.insert().returning(sql_table.c.id, sql_table.c.parent_id, sql_table.c.repeat_index)
+            self._insert_repeats(db, child, [
+                (row_id, entries[parent_id, index]) for row_id, parent_id, index in db.execute(stmt, rows)
+            ])
+
+
+# Schemas loaded by this process, by (form uid, version)
+_loaded_schemas: Dict[Tuple[str, Optional[str]], FormSchema] = {}
+
+
+def cache_path(uid: str, version: Optional[str], cache_dir: Optional[str] = None) -> str:
+    return os.path.join(cache_dir or FORM_SCHEMA_CACHE_DIR, f"{identifier(uid)}-{identifier(version or 'unversioned')}.json")
+
+
+def latest_path(uid: str, cache_dir: Optional[str] = None) -> str:
+    return os.path.join(cache_dir or FORM_SCHEMA_CACHE_DIR, f"{identifier(uid)}.latest.json")
+
+
+def latest_version(uid: str, cache_dir: Optional[str] = None) -> Optional[str]:
+    """
+    Returns the form version whose layout was cached last, or None if there is none.
+    """
+    try:
+        with open(latest_path(uid, cache_dir)) as f:
+            return json.load(f)['version']
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def set_latest_version(uid: str, version: Optional[str], cache_dir: Optional[str] = None) -> None:
+    """
+    Makes ``version`` the one ``load_form_schema`` uses when no version is asked for.
+    """
+    path = latest_path(uid, cache_dir)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'version': version}, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_form_schema(uid: str, version: Optional[str] = None,
+                     fetch: Optional[Callable[[], Dict[str, Any]]] = None,
+                     cache_dir: Optional[str] = None) -> FormSchema:
+    """
+    Returns the generated schema of a form version, generating it only once per version.
+
+    A known version is served from memory or from its cached layout in
+    FORM_SCHEMA_CACHE_DIR without contacting Kobo; without a version, the
+    latest cached one is used (see ``set_latest_version``). Otherwise the asset
+    is fetched and its layout is cached under the asset's current version,
+    which becomes the latest. A version the fetched asset no longer describes
+    is cached with that layout too, so it is not fetched again.
+
+    Args:
+        uid (str): Asset UID of the form.
+        version (str): Form version (``__version__`` of a record); None for the latest cached one,
+            or the deployed one if nothing is cached.
+        fetch (callable): Returns the form's asset; called on a cache miss.
+        cache_dir (str): Overrides FORM_SCHEMA_CACHE_DIR.
+
+    Returns:
+        FormSchema: The form's tables, transform and writer.
+
+    Raises:
+        LookupError: If the version is not cached and no ``fetch`` was given.
+    """
+    if version is None:
+        version = latest_version(uid, cache_dir)
+    if version is not None:
+        if (uid, version) in _loaded_schemas:
+            return _loaded_schemas[uid, version]
+        try:
+            with open(cache_path(uid, version, cache_dir)) as f:
+                schema = FormSchema(json.load(f))
+            _loaded_schemas[uid, version] = schema
+            return schema
+        except FileNotFoundError:
+            pass
+
+    if fetch is None:
+        raise LookupError(f"No cached schema for form {uid} version {version}")
+
+    description = describe_asset(fetch(), uid)
+    schema = FormSchema(description)
+    for cached_version in {description['version'], version or description['version']}:
+        path = cache_path(uid, cached_version, cache_dir)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(description, f)
+        _loaded_schemas[uid, cached_version] = schema
+    set_latest_version(uid, description['version'], cache_dir)
+    return schema
@@ -0,0 +1,120 @@
+# app/database/ingest_events.py
+
+import select
+import threading
+from typing import Callable, Iterable, List, Optional, Set
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+# PostgreSQL channel announcing the forms an ingest transaction committed rows for
+INGEST_CHANNEL = 'kobo_ingest'
+# Session.info key of the forms written by the current transaction
+PENDING_KEY = 'ingested_forms'
+# Dispatched instead of form uuids when notifications may have been missed
+ALL_FORMS = '*'
+
+_subscribers: List[Callable[[Set[str]], None]] = []
+
+
+def subscribe(callback: Callable[[Set[str]], None]) -> None:
+    """
+    Calls ``callback`` with the form uuids (as strings) of every committed ingest.
+    """
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+
+
+def unsubscribe(callback: Callable[[Set[str]], None]) -> None:
+    if callback in _subscribers:
+        _subscribers.remove(callback)
+
+
+def dispatch(forms: Set[str]) -> None:
+    for callback in list(_subscribers):
+        try:
+            callback(forms)
+        except Exception as e:
+            print(f"Ingest subscriber failed: {e}")
+
+
+def record(db: Session, form_uuids: Iterable) -> None:
+    """
+    Announces that the session's transaction wrote submissions of ``form_uuids``.
+
+    Subscribers in this process are called once the transaction commits, and
+    not at all if it rolls back. On PostgreSQL a ``NOTIFY`` is queued in the
+    transaction as well, which the server delivers to other processes (see
+    ``NotificationListener``) only on commit.
+    """
+    forms = {str(form_uuid) for form_uuid in form_uuids if form_uuid is not None}
+    if not forms:
+        return
+    db.info.setdefault(PENDING_KEY, set()).update(forms)
+    if db.get_bind().dialect.name == 'postgresql':
+        for form in sorted(forms):
+            db.execute(text("SELECT pg_notify(:channel, :form)"), {'channel': INGEST_CHANNEL, 'form': form})
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session: Session) -> None:
+    forms = session.info.pop(PENDING_KEY, None)
+    if forms:
+        dispatch(forms)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session: Session) -> None:
+    session.info.pop(PENDING_KEY, None)
+
+
+class NotificationListener(threading.Thread):
+    """
+    Relays ingest notifications committed by other processes (the pull job, replays) to the subscribers.
+
+    PostgreSQL only: it ``LISTEN``s on INGEST_CHANNEL over a dedicated
+    connection and reconnects after errors.
+
+    Args:
+        engine: Synchronous engine of a PostgreSQL database.
+        poll_interval (float): Seconds between checks of the stop flag.
+    """
+
+    def __init__(self, engine, poll_interval: float = 1.0):
+        super().__init__(name="ingest-listener", daemon=True)
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        reconnected = False
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = self.engine.raw_connection()
+                dbapi_connection = connection.dbapi_connection
+                dbapi_connection.autocommit = True
+                dbapi_connection.cursor().execute(f"LISTEN {INGEST_CHANNEL}")
+                if reconnected:
+                    # Commits while the connection was down went unnoticed
+                    dispatch({ALL_FORMS})
+                while not self._stopping.is_set():
+                    if select.select([dbapi_connection], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    forms = set()
+                    while dbapi_connection.notifies:
+                        forms.add(dbapi_connection.notifies.pop(0).payload)
+                    if forms:
+                        dispatch(forms)
+            except Exception as e:
+                print(f"Ingest listener error, reconnecting: {e}")
+                reconnected = True
+                self._stopping.wait(5)
+            finally:
+                if connection is not None:
+                    connection.invalidate()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopping.set()
+        self.join(timeout)
@@ -1,28 +1,66 @@
-
-from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, JSON
-from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+import datetime
+from sqlalchemy import (Column, Integer, BigInteger, String, Text, Boolean, Date, DateTime, ForeignKeyConstraint,
+                        Index, JSON, UniqueConstraint, Uuid)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
-from .db_connection import Base
+from .db_connection import Base, DB_PARTITION_BY_MONTH
+
+# JSONB on PostgreSQL (indexable, no reparsing on read), plain JSON elsewhere
+JSONType = JSON().with_variant(JSONB(), 'postgresql')
+
+# With monthly partitioning every primary key, unique constraint and foreign key
+# has to include the partition column, so it is appended to all of them
+PARTITION_KEY = ('submission_time',) if DB_PARTITION_BY_MONTH else ()
+PARTITION_OPTIONS = {'postgresql_partition_by': 'RANGE (submission_time)'} if DB_PARTITION_BY_MONTH else {}
+
+# Columns identifying a submission and a client for ON CONFLICT
+SUBMISSION_KEY = ('_id',) + PARTITION_KEY
+CLIENT_KEY = ('unique_id',) + PARTITION_KEY
+
+
+def submission_link(table: str):
+    """
+    Foreign key from a child table to the submission it belongs to.
+    """
+    return ForeignKeyConstraint(
+        ['submission_id', *PARTITION_KEY],
+        ['public.kobo_submissions.id', *(f'public.kobo_submissions.{column}' for column in PARTITION_KEY)],
+        name=f'{table}_submission_id_fkey',
+    )
 
 class KoboSubmission(Base):
     __tablename__ = 'kobo_submissions'
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        # Keyset pagination and time-range filters (ORDER BY submission_time, id)
+        Index('ix_kobo_submissions_submission_time_id', 'submission_time', 'id'),
+        Index('ix_kobo_submissions_survey_date', 'survey_date'),
+        Index('ix_kobo_submissions_form_uuid', 'form_uuid'),
+        # Incremental exports (WHERE (updated_at, id) > cursor ORDER BY updated_at, id)
+        Index('ix_kobo_submissions_updated_at_id', 'updated_at', 'id'),
+        # Tag containment queries (_tags @> '["..."]'); PostgreSQL only
+        Index('ix_kobo_submissions_tags', '_tags', postgresql_using='gin').ddl_if(dialect='postgresql'),
+        UniqueConstraint(*SUBMISSION_KEY, name='kobo_submissions__id_key'),
+        UniqueConstraint('instance_id', *PARTITION_KEY, name='kobo_submissions_instance_id_key'),
+        {'schema': 'public', **PARTITION_OPTIONS},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    _id = Column(Integer, unique=True, nullable=False)
-    form_uuid = Column(PG_UUID(as_uuid=True), nullable=False)
-    instance_id = Column(PG_UUID(as_uuid=True), nullable=False)
-    submission_time = Column(DateTime, nullable=False)
+    _id = Column(BigInteger, nullable=False)
+    form_uuid = Column(Uuid(as_uuid=True), nullable=False)
+    instance_id = Column(Uuid(as_uuid=True), nullable=False)
+    submission_time = Column(DateTime, nullable=False, primary_key=DB_PARTITION_BY_MONTH)
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime, nullable=False)
     survey_date = Column(Date, nullable=False)
-    _geolocation = Column(JSON)
+    _geolocation = Column(JSONType)
     _status = Column(String(50))
-    _tags = Column(JSON)
-    _notes = Column(JSON)
-    _validation_status = Column(JSON)
+    _tags = Column(JSONType)
+    _notes = Column(JSONType)
+    _validation_status = Column(JSONType)
     _submitted_by = Column(String(100))
     version = Column(String(50))
+    # Time of the last insert or update; incremental exports follow it
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
     # Relationships
     clients = relationship("Client", back_populates="submission")
@@ -31,10 +69,15 @@ class KoboSubmission(Base):
 
 class Client(Base):
     __tablename__ = 'clients'
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        Index('ix_clients_submission_id', 'submission_id'),
+        submission_link('clients'),
+        UniqueConstraint(*CLIENT_KEY, name='clients_unique_id_key'),
+        {'schema': 'public', **PARTITION_OPTIONS},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    unique_id = Column(String(50), unique=True, nullable=False)
+    unique_id = Column(String(50), nullable=False)
     client_name = Column(String(100), nullable=False)
     client_id_manifest = Column(String(50))
     location = Column(String(100))
@@ -51,15 +94,20 @@ class Client(Base):
     sole_income_earner = Column(Boolean, default=False)
     responsible_people = Column(Integer)
 
-    # Foreign Key
-    submission_id = Column(Integer, ForeignKey('public.kobo_submissions.id'), nullable=False)
+    # Foreign Key; submission_time is copied from the submission (partition key)
+    submission_id = Column(Integer, nullable=False)
+    submission_time = Column(DateTime, primary_key=DB_PARTITION_BY_MONTH)
 
     # Relationships
     submission = relationship("KoboSubmission", back_populates="clients")
 
 class BusinessInfo(Base):
     __tablename__ = 'business_info'
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        Index('ix_business_info_submission_id', 'submission_id'),
+        submission_link('business_info'),
+        {'schema': 'public', **PARTITION_OPTIONS},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     country_name = Column(String(100))
@@ -70,26 +118,141 @@ class BusinessInfo(Base):
     biz_status = Column(String(50))
     biz_operating = Column(Boolean, default=False)
 
-    # Foreign Key
-    submission_id = Column(Integer, ForeignKey('public.kobo_submissions.id'), nullable=False)
+    # Foreign Key; submission_time is copied from the submission (partition key)
+    submission_id = Column(Integer, nullable=False)
+    submission_time = Column(DateTime, primary_key=DB_PARTITION_BY_MONTH)
 
     # Relationships
     submission = relationship("KoboSubmission", back_populates="business_infos")
 
 class SurveyMetadata(Base):
     __tablename__ = 'survey_metadata'
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        Index('ix_survey_metadata_submission_id', 'submission_id'),
+        submission_link('survey_metadata'),
+        {'schema': 'public', **PARTITION_OPTIONS},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    form_uuid = Column(PG_UUID(as_uuid=True), nullable=False)
-    instance_id = Column(PG_UUID(as_uuid=True), nullable=False)
+    form_uuid = Column(Uuid(as_uuid=True), nullable=False)
+    instance_id = Column(Uuid(as_uuid=True), nullable=False)
     form_version = Column(String(50))
 
-    # Foreign Key
-    submission_id = Column(Integer, ForeignKey('public.kobo_submissions.id'), nullable=False)
+    # Foreign Key; submission_time is copied from the submission (partition key)
+    submission_id = Column(Integer, nullable=False)
+    submission_time = Column(DateTime, primary_key=DB_PARTITION_BY_MONTH)
 
     # Relationships
     submission = relationship("KoboSubmission", back_populates="survey_metadatas")
 
     def __repr__(self):
-        return f"<SurveyMetadata(id={self.id}, form_uuid={self.form_uuid}, instance_id={self.instance_id})>"
\ No newline at end of file
+        return f"<SurveyMetadata(id={self.id}, form_uuid={self.form_uuid}, instance_id={self.instance_id})>"
+
+class RawSubmission(Base):
+    __tablename__ = 'raw_submissions'
+    __table_args__ = (
+        Index('ix_raw_submissions_instance_id', 'instance_id'),
+        Index('ix_raw_submissions_form_uid_id', 'form_uid', '_id'),
+        {'schema': 'public'},
+    )
+
+    # Every submission exactly as Kobo sent it, so the normalized tables can be
+    # rebuilt locally (app/api/replay.py); JSONB values are compressed by TOAST
+    _id = Column(BigInteger, primary_key=True, autoincrement=False)
+    instance_id = Column(String(64))
+    form_uid = Column(String(100))
+    submission_time = Column(DateTime)
+    payload = Column(JSONType, nullable=False)
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f"<RawSubmission(_id={self._id}, form_uid={self.form_uid}, instance_id={self.instance_id})>"
+
+class SyncState(Base):
+    __tablename__ = 'sync_state'
+    __table_args__ = {'schema': 'public'}
+
+    # Incremental sync cursor for one Kobo form (asset UID)
+    form_uid = Column(String(100), primary_key=True)
+    last_submission_time = Column(DateTime)
+    last_id = Column(BigInteger)
+    # Resume point of an interrupted run: records already stored for resume_query
+    resume_offset = Column(Integer)
+    resume_query = Column(Text)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SyncState(form_uid={self.form_uid}, last_submission_time={self.last_submission_time}, last_id={self.last_id})>"
+
+class DailySubmissionStats(Base):
+    __tablename__ = 'daily_submission_stats'
+    __table_args__ = (
+        Index('ix_daily_submission_stats_day', 'day'),
+        {'schema': 'public'},
+    )
+
+    # Submissions and businesses per day, form, region, cohort and program,
+    # kept up to date by every ingest batch (app/database/stats.py)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    form_uuid = Column(Uuid(as_uuid=True), nullable=False)
+    country_name = Column(String(100))
+    region_name = Column(String(100))
+    cohort = Column(String(50))
+    program = Column(String(50))
+    submissions = Column(Integer, nullable=False)
+    businesses = Column(Integer, nullable=False)
+    businesses_operating = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<DailySubmissionStats(day={self.day}, region_name={self.region_name}, submissions={self.submissions})>"
+
+class DailyClientStats(Base):
+    __tablename__ = 'daily_client_stats'
+    __table_args__ = (
+        Index('ix_daily_client_stats_day', 'day'),
+        {'schema': 'public'},
+    )
+
+    # Clients per day, form, gender and age band
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    form_uuid = Column(Uuid(as_uuid=True), nullable=False)
+    gender = Column(String(10))
+    age_band = Column(String(10))
+    clients = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<DailyClientStats(day={self.day}, gender={self.gender}, age_band={self.age_band}, clients={self.clients})>"
+
+class StatsRefreshQueue(Base):
+    __tablename__ = 'stats_refresh_queue'
+    __table_args__ = {'schema': 'public'}
+
+    # (form, day) slices of the daily rollups that ingests changed and the
+    # refresher has not rebuilt yet (app/database/stats.py). A slice may be
+    # queued many times; ingests only append, so they never wait on each other
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    form_uuid = Column(Uuid(as_uuid=True), nullable=False)
+    day = Column(Date, nullable=False)
+
+    def __repr__(self):
+        return f"<StatsRefreshQueue(form_uuid={self.form_uuid}, day={self.day})>"
+
+class DataQualityReport(Base):
+    __tablename__ = 'data_quality_reports'
+    __table_args__ = (
+        Index('ix_data_quality_reports_form_version', 'form_uuid', 'version', 'created_at'),
+        {'schema': 'public'},
+    )
+
+    # Column profile of one form version's stored data (app/database/data_quality.py)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    form_uuid = Column(Uuid(as_uuid=True), nullable=False)
+    version = Column(String(50))
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    submissions = Column(Integer, nullable=False)
+    report = Column(JSONType, nullable=False)
+
+    def __repr__(self):
+        return f"<DataQualityReport(form_uuid={self.form_uuid}, version={self.version}, created_at={self.created_at})>"
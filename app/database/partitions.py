@@ -0,0 +1,97 @@
+# app/database/partitions.py
+
+import datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from .db_connection import DB_PARTITION_MONTHS_AHEAD, DB_PARTITION_START
+
+# Tables partitioned by month of submission_time, parent first
+PARTITIONED_TABLES = ('kobo_submissions', 'clients', 'business_info', 'survey_metadata')
+
+
+def add_months(month: datetime.date, count: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_months(start: Optional[str] = DB_PARTITION_START, months_ahead: int = DB_PARTITION_MONTHS_AHEAD,
+                     today: Optional[datetime.date] = None) -> List[datetime.date]:
+    """
+    Returns the first day of every month that should have its own partition.
+
+    Args:
+        start (str): First month ('YYYY-MM'); defaults to the current month.
+        months_ahead (int): Months after the current one to create in advance.
+        today (date): Reference date (defaults to today).
+    """
+    today = today or datetime.date.today()
+    current = today.replace(day=1)
+    first = datetime.datetime.strptime(start, '%Y-%m').date() if start else current
+    months = []
+    month = first
+    while month <= add_months(current, months_ahead):
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_name(table: str, month: datetime.date) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+def partition_ddl(table: str, month: Optional[datetime.date]) -> str:
+    """
+    ``CREATE TABLE`` statement for one month of ``table``, or for its default
+    partition (rows older than the first month) when ``month`` is None.
+    """
+    if month is None:
+        return f"CREATE TABLE IF NOT EXISTS public.{table}_default PARTITION OF public.{table} DEFAULT"
+    return (
+        f"CREATE TABLE IF NOT EXISTS public.{partition_name(table, month)} PARTITION OF public.{table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+def create_partitions(engine, months: Optional[List[datetime.date]] = None) -> List[str]:
+    """
+    Creates the missing monthly partitions (and default partitions) of the partitioned tables.
+
+    Meant to run regularly (``create_tables.py`` from cron) so the partitions for
+    the coming months exist before data for them arrives.
+
+    Args:
+        engine: Engine of the PostgreSQL database.
+        months (list): Months to create; defaults to ``partition_months()``.
+
+    Returns:
+        list: The statements that were executed.
+    """
+    months = partition_months() if months is None else months
+    statements = [partition_ddl(table, month) for table in PARTITIONED_TABLES for month in [None, *months]]
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+    return statements
+
+
+def detach_partitions(engine, month: datetime.date) -> List[str]:
+    """
+    Detaches one month from every partitioned table so it can be archived
+    (``pg_dump -t``) and dropped. Child tables are detached before the
+    submissions they reference.
+
+    Returns:
+        list: The names of the detached tables.
+    """
+    detached = []
+    with engine.begin() as conn:
+        for table in reversed(PARTITIONED_TABLES):
+            name = partition_name(table, month)
+            conn.execute(text(f"ALTER TABLE public.{table} DETACH PARTITION public.{name}"))
+            if table != 'kobo_submissions':
+                # The detached rows no longer need (or allow detaching) their parents
+                conn.execute(text(f"ALTER TABLE public.{name} DROP CONSTRAINT IF EXISTS {table}_submission_id_fkey"))
+            detached.append(f"public.{name}")
+    return detached
@@ -0,0 +1,119 @@
+# app/database/queries.py
+
+import datetime
+from typing import Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import selectinload
+
+from app.database.models import KoboSubmission
+
+# Columns submissions can be paged by; ties are broken by id
+ORDER_COLUMNS = ('id', 'submission_time')
+
+# Loads every child collection of a page with one extra ``SELECT ... WHERE
+# submission_id IN (...)`` per relationship instead of one query per submission
+CHILD_LOADERS = (
+    selectinload(KoboSubmission.clients),
+    selectinload(KoboSubmission.business_infos),
+    selectinload(KoboSubmission.survey_metadatas),
+)
+
+
+class SubmissionQuery:
+    """
+    Filters and keyset position for listing submissions.
+
+    Pages are addressed by a cursor (the sort key of the last row seen) instead
+    of an OFFSET, so every page costs an index range scan no matter how deep
+    into the table it is.
+
+    Args:
+        limit (int): Page size; None for no limit.
+        after (str): Cursor returned with the previous page.
+        order_by (str): ``'id'`` or ``'submission_time'``.
+        since (datetime): Only submissions received at or after this time.
+        until (datetime): Only submissions received before this time.
+        form_uuid (UUID): Only submissions of this form.
+        status (str): Only submissions with this ``_status``.
+        version (str): Only submissions of this form version.
+
+    Raises:
+        ValueError: If ``order_by`` or the cursor is invalid.
+    """
+
+    def __init__(self, limit: Optional[int] = None, after: Optional[str] = None, order_by: str = 'id',
+                 since: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None,
+                 form_uuid: Optional[UUID] = None, status: Optional[str] = None, version: Optional[str] = None):
+        if order_by not in ORDER_COLUMNS:
+            raise ValueError(f"order_by must be one of {ORDER_COLUMNS}")
+        self.limit = limit
+        self.order_by = order_by
+        self.after = self.decode_cursor(after) if after else None
+        self.since = since
+        self.until = until
+        self.form_uuid = form_uuid
+        self.status = status
+        self.version = version
+
+    def decode_cursor(self, cursor: str):
+        try:
+            if self.order_by == 'id':
+                return int(cursor)
+            submission_time, _, submission_id = cursor.rpartition('_')
+            return datetime.datetime.fromisoformat(submission_time), int(submission_id)
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+    def encode_cursor(self, submission: KoboSubmission) -> str:
+        if self.order_by == 'id':
+            return str(submission.id)
+        return f"{submission.submission_time.isoformat()}_{submission.id}"
+
+    def statement(self, with_children: bool = False):
+        """
+        Builds the ``SELECT`` for one page (or, without a limit, the whole stream).
+
+        Args:
+            with_children (bool): Also load the clients, business infos and survey
+                metadata of the selected submissions.
+        """
+        stmt = select(KoboSubmission)
+        if with_children:
+            stmt = stmt.options(*CHILD_LOADERS)
+        if self.since is not None:
+            stmt = stmt.where(KoboSubmission.submission_time >= self.since)
+        if self.until is not None:
+            stmt = stmt.where(KoboSubmission.submission_time < self.until)
+        if self.form_uuid is not None:
+            stmt = stmt.where(KoboSubmission.form_uuid == self.form_uuid)
+        if self.status is not None:
+            stmt = stmt.where(KoboSubmission._status == self.status)
+        if self.version is not None:
+            stmt = stmt.where(KoboSubmission.version == self.version)
+
+        if self.order_by == 'id':
+            if self.after is not None:
+                stmt = stmt.where(KoboSubmission.id > self.after)
+            stmt = stmt.order_by(KoboSubmission.id)
+        else:
+            if self.after is not None:
+                after_time, after_id = self.after
+                stmt = stmt.where(or_(
+                    KoboSubmission.submission_time > after_time,
+                    and_(KoboSubmission.submission_time == after_time, KoboSubmission.id > after_id),
+                ))
+            stmt = stmt.order_by(KoboSubmission.submission_time, KoboSubmission.id)
+
+        if self.limit is not None:
+            stmt = stmt.limit(self.limit)
+        return stmt
+
+    def next_cursor(self, page: Sequence[KoboSubmission]) -> Optional[str]:
+        """
+        Returns the cursor of the page after ``page``, or None if ``page`` was the last one.
+        """
+        if self.limit is None or len(page) < self.limit:
+            return None
+        return self.encode_cursor(page[-1])
@@ -0,0 +1,117 @@
+# app/database/raw_archive.py
+
+import os
+import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database.models import RawSubmission
+from app.database.writer import dialect_insert, on_conflict_clause
+from app.utils.parsing import parse_datetime
+
+# Keep every ingested payload in raw_submissions
+RAW_ARCHIVE = os.getenv("RAW_ARCHIVE", "true").lower() in ("1", "true", "yes")
+
+
+def raw_row(record: Dict[str, Any], form_uid: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Returns the raw_submissions row of a Kobo record.
+
+    Raises:
+        KeyError: If the record has no ``_id``.
+        ValueError: If its ``_id`` or ``_submission_time`` is malformed.
+    """
+    return {
+        '_id': int(record['_id']),
+        'instance_id': record.get('meta/instanceID'),
+        'form_uid': form_uid or record.get('_xform_id_string'),
+        'submission_time': parse_datetime(record.get('_submission_time')),
+        'payload': record,
+        'archived_at': datetime.datetime.utcnow(),
+    }
+
+
+def archive_records(db: Session, records: Iterable[Dict[str, Any]], form_uid: Optional[str] = None) -> int:
+    """
+    Stores records as received in raw_submissions, in one transaction.
+
+    Records are archived before they are mapped, so records the mapping rejects
+    are kept as well. A record that is already archived is replaced by the newer
+    payload (Kobo keeps the ``_id`` when a submission is edited). Records that
+    cannot be keyed are reported and skipped. Nothing is written when
+    RAW_ARCHIVE is off.
+
+    Args:
+        db (Session): SQLAlchemy session object.
+        records (iterable): Records from the Kobo API or webhook.
+        form_uid (str): Asset UID of the form; taken from ``_xform_id_string`` if omitted.
+
+    Returns:
+        int: The number of records archived.
+    """
+    if not RAW_ARCHIVE:
+        return 0
+
+    # One row per _id per statement; the latest payload wins
+    rows = {}
+    for record in records:
+        try:
+            row = raw_row(record, form_uid)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Not archiving record {record.get('_id')}: {e}")
+            continue
+        rows[row['_id']] = row
+
+    if not rows:
+        return 0
+
+    try:
+        stmt = on_conflict_clause(dialect_insert(db, RawSubmission), ['_id'], list(next(iter(rows.values()))), 'update')
+        db.execute(stmt, list(rows.values()))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows)
+
+
+def raw_id_ranges(db: Session, batch_size: int, form_uid: Optional[str] = None,
+                  after_id: Optional[int] = None) -> Iterable[Tuple[int, int]]:
+    """
+    Splits the archive into ``(first _id, last _id)`` ranges of ``batch_size`` records.
+
+    Only the ``_id`` index is read, so the ranges can be handed to workers that
+    load the payloads themselves.
+    """
+    stmt = select(RawSubmission._id).order_by(RawSubmission._id)
+    if form_uid:
+        stmt = stmt.where(RawSubmission.form_uid == form_uid)
+    if after_id is not None:
+        stmt = stmt.where(RawSubmission._id > after_id)
+
+    first = last = None
+    count = 0
+    for (_id,) in db.execute(stmt.execution_options(yield_per=10000)):
+        if first is None:
+            first = _id
+        last = _id
+        count += 1
+        if count >= batch_size:
+            yield first, last
+            first, count = None, 0
+    if first is not None:
+        yield first, last
+
+
+def load_raw_range(db: Session, first_id: int, last_id: int, form_uid: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Returns the archived payloads with ``first_id <= _id <= last_id`` in ``_id`` order.
+    """
+    stmt = (select(RawSubmission.payload)
+            .where(RawSubmission._id.between(first_id, last_id))
+            .order_by(RawSubmission._id))
+    if form_uid:
+        stmt = stmt.where(RawSubmission.form_uid == form_uid)
+    return list(db.scalars(stmt))
@@ -0,0 +1,327 @@
+# app/database/stats.py
+"""
+Daily rollups of the submissions, businesses and clients, for dashboards and /stats.
+
+Ingests do not touch the rollups: they queue the (form, day) slices they
+changed in ``stats_refresh_queue``, and ``refresh_pending`` rebuilds those
+slices later, outside the ingest transactions. The web app runs it every
+STATS_REFRESH_INTERVAL seconds and the pull job at the end of each run, so
+/stats lags the ingests by about that much.
+
+Usage:
+    python app/database/stats.py              # rebuild every day from the fact tables
+    python app/database/stats.py --pending    # rebuild the queued slices (e.g. from cron)
+"""
+
+import os
+import sys
+import argparse
+import datetime
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+# Add current directory
+sys.path.append(os.getcwd())
+
+from sqlalchemy import Date, and_, case, delete, func, insert, null, or_, select, text
+from sqlalchemy.orm import Session
+
+from app.database.models import (
+    KoboSubmission, Client, BusinessInfo, DailySubmissionStats, DailyClientStats, StatsRefreshQueue
+)
+from app.database import ingest_events
+from app.utils import metrics
+
+# Queue the (form, day) slices every ingest batch touches for the refresher;
+# when off, rebuild the rollups periodically with this script
+STATS_INCREMENTAL = os.getenv("STATS_INCREMENTAL", "true").lower() in ("1", "true", "yes")
+# Seconds between the web app's refreshes of the queued slices; 0 leaves them to --pending
+STATS_REFRESH_INTERVAL = float(os.getenv("STATS_REFRESH_INTERVAL", 10))
+# Queue entries claimed per refresh transaction
+STATS_REFRESH_BATCH = int(os.getenv("STATS_REFRESH_BATCH", 10000))
+
+# Client age bands: (first age of the next band, label)
+AGE_BANDS = ((18, 'under 18'), (25, '18-24'), (35, '25-34'), (45, '35-44'), (55, '45-54'))
+OLDEST_AGE_BAND = '55+'
+
+# Columns /stats can group by, per rollup table
+SUBMISSION_DIMENSIONS = ('day', 'form_uuid', 'country_name', 'region_name', 'cohort', 'program')
+CLIENT_DIMENSIONS = ('day', 'form_uuid', 'gender', 'age_band')
+
+REFRESH_SECONDS = metrics.histogram('kobo_stats_refresh_seconds', 'Time rebuilding the queued rollup slices')
+REFRESHED_SLICES = metrics.counter('kobo_stats_slices_refreshed_total', 'Rollup (form, day) slices rebuilt')
+
+# A (form uuid, day) slice of the rollups
+StatsKey = Tuple[UUID, datetime.date]
+
+
+def submission_day(submission_time: Optional[datetime.datetime]) -> Optional[datetime.date]:
+    # Aware timestamps are stored in UTC
+    if submission_time is None:
+        return None
+    if submission_time.tzinfo is not None:
+        submission_time = submission_time.astimezone(datetime.timezone.utc)
+    return submission_time.date()
+
+
+def affected_keys(db: Session, items: Iterable[Dict[str, Any]]) -> Set[StatsKey]:
+    """
+    Returns the (form uuid, day) slices whose rollups change when ``items`` are written.
+
+    Call it before the batch is written: besides the slices of the new rows it
+    includes the current slices of the submissions and clients the batch will
+    update, since an updated row may move out of its day or form.
+    """
+    items = list(items)
+    keys = {(item['submission'].get('form_uuid'), submission_day(item['submission'].get('submission_time')))
+            for item in items}
+    kobo_ids = [item['submission']['_id'] for item in items]
+    unique_ids = [item['client']['unique_id'] for item in items if item.get('client')]
+    if kobo_ids:
+        keys.update((form_uuid, submission_day(submission_time)) for form_uuid, submission_time in db.execute(
+            select(KoboSubmission.form_uuid, KoboSubmission.submission_time).where(KoboSubmission._id.in_(kobo_ids))))
+    if unique_ids:
+        keys.update((form_uuid, submission_day(submission_time)) for form_uuid, submission_time in db.execute(
+            select(KoboSubmission.form_uuid, KoboSubmission.submission_time)
+            .join(Client, Client.submission_id == KoboSubmission.id)
+            .where(Client.unique_id.in_(unique_ids))))
+    return {(form_uuid, day) for form_uuid, day in keys if form_uuid is not None and day is not None}
+
+
+def queue_refresh(db: Session, keys: Iterable[StatsKey]) -> None:
+    """
+    Queues the rebuild of ``keys`` in the caller's transaction.
+
+    Only appends rows, so concurrent ingests of the same slices never wait on
+    each other; ``refresh_pending`` collapses the duplicates.
+    """
+    rows = [{'form_uuid': form_uuid, 'day': day} for form_uuid, day in sorted(keys)]
+    if rows:
+        db.execute(insert(StatsRefreshQueue), rows)
+
+
+def day_filter(column, days: Iterable[datetime.date]):
+    # Ranges instead of date(column), so the submission_time index is used
+    one_day = datetime.timedelta(days=1)
+    return or_(*(and_(column >= datetime.datetime.combine(day, datetime.time()),
+                      column < datetime.datetime.combine(day + one_day, datetime.time()))
+                 for day in days))
+
+
+def age_band(age):
+    return case((age.is_(None), null()), *((age < limit, label) for limit, label in AGE_BANDS),
+                else_=OLDEST_AGE_BAND)
+
+
+def submission_rollup():
+    day = func.date(KoboSubmission.submission_time, type_=Date)
+    groups = (day, KoboSubmission.form_uuid, BusinessInfo.country_name, BusinessInfo.region_name,
+              BusinessInfo.cohort, BusinessInfo.program)
+    return (select(*groups,
+                   func.count(func.distinct(KoboSubmission.id)),
+                   func.count(BusinessInfo.id),
+                   func.coalesce(func.sum(case((BusinessInfo.biz_operating.is_(True), 1), else_=0)), 0))
+            .select_from(KoboSubmission)
+            .outerjoin(BusinessInfo, BusinessInfo.submission_id == KoboSubmission.id)
+            .group_by(*groups))
+
+
+def client_rollup():
+    day = func.date(KoboSubmission.submission_time, type_=Date)
+    band = age_band(Client.age)
+    groups = (day, KoboSubmission.form_uuid, Client.gender, band)
+    return (select(*groups, func.count(Client.id))
+            .select_from(Client)
+            .join(KoboSubmission, Client.submission_id == KoboSubmission.id)
+            .group_by(*groups))
+
+
+SUBMISSION_STATS_COLUMNS = ('day', 'form_uuid', 'country_name', 'region_name', 'cohort', 'program',
+                            'submissions', 'businesses', 'businesses_operating')
+CLIENT_STATS_COLUMNS = ('day', 'form_uuid', 'gender', 'age_band', 'clients')
+
+
+def refresh_keys(db: Session, keys: Iterable[StatsKey]) -> None:
+    """
+    Recomputes the rollups of the (form uuid, day) slices ``keys`` from the fact tables, in the caller's transaction.
+
+    Each slice is rebuilt from its own rows, so the result does not depend on
+    what the batches inserted, updated or skipped. On PostgreSQL a transaction
+    lock per slice serializes concurrent refreshes of the same slice; slices
+    are locked in order, so two refreshers cannot deadlock on them. Ingests
+    never take these locks.
+    """
+    days_by_form = defaultdict(set)
+    for form_uuid, day in keys:
+        days_by_form[form_uuid].add(day)
+    if db.get_bind().dialect.name == 'postgresql':
+        for form_uuid, days in sorted(days_by_form.items()):
+            for day in sorted(days):
+                db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:form), :day)"),
+                           {'form': str(form_uuid), 'day': day.toordinal()})
+
+    for form_uuid, days in sorted(days_by_form.items()):
+        days = sorted(days)
+        db.execute(delete(DailySubmissionStats).where(DailySubmissionStats.form_uuid == form_uuid,
+                                                      DailySubmissionStats.day.in_(days)))
+        db.execute(delete(DailyClientStats).where(DailyClientStats.form_uuid == form_uuid,
+                                                  DailyClientStats.day.in_(days)))
+        in_slices = and_(KoboSubmission.form_uuid == form_uuid, day_filter(KoboSubmission.submission_time, days))
+        db.execute(insert(DailySubmissionStats).from_select(SUBMISSION_STATS_COLUMNS, submission_rollup().where(in_slices)))
+        db.execute(insert(DailyClientStats).from_select(CLIENT_STATS_COLUMNS, client_rollup().where(in_slices)))
+
+
+def refresh_pending(db: Session, limit: int = STATS_REFRESH_BATCH) -> int:
+    """
+    Rebuilds the slices queued by ingests, ``limit`` queue entries per transaction, until the queue is empty.
+
+    On PostgreSQL entries are claimed with ``SKIP LOCKED``, so several
+    refreshers (the web app's workers, a cron job) share the queue. The
+    refreshed forms are announced as ingests, which drops their cached /stats
+    responses.
+
+    Returns:
+        int: The number of slices rebuilt.
+    """
+    refreshed = 0
+    while True:
+        try:
+            with REFRESH_SECONDS.time():
+                claim = select(StatsRefreshQueue.id, StatsRefreshQueue.form_uuid, StatsRefreshQueue.day) \
+                    .order_by(StatsRefreshQueue.id).limit(limit)
+                if db.get_bind().dialect.name == 'postgresql':
+                    claim = claim.with_for_update(skip_locked=True)
+                entries = db.execute(claim).all()
+                if not entries:
+                    db.rollback()
+                    return refreshed
+                keys = {(entry.form_uuid, entry.day) for entry in entries}
+                refresh_keys(db, keys)
+                db.execute(delete(StatsRefreshQueue).where(StatsRefreshQueue.id.in_([entry.id for entry in entries])))
+                ingest_events.record(db, {form_uuid for form_uuid, _ in keys})
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        refreshed += len(keys)
+        REFRESHED_SLICES.inc(len(keys))
+        if len(entries) < limit:
+            return refreshed
+
+
+class StatsRefresher(threading.Thread):
+    """
+    Runs ``refresh_pending`` every ``interval`` seconds until stopped.
+
+    Args:
+        session_factory (callable): Returns a new session.
+        interval (float): Seconds between refreshes.
+    """
+
+    def __init__(self, session_factory, interval: float = STATS_REFRESH_INTERVAL):
+        super().__init__(name="stats-refresher", daemon=True)
+        self.session_factory = session_factory
+        self.interval = interval
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            db = self.session_factory()
+            try:
+                refresh_pending(db)
+            except Exception as e:
+                print(f"Refreshing the daily rollups failed: {e}")
+            finally:
+                db.close()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopping.set()
+        self.join(timeout)
+
+
+def refresh_all(db: Session) -> None:
+    """
+    Rebuilds the rollups of every day, e.g. after a backfill with STATS_INCREMENTAL off.
+
+    Queue entries committed before the rebuild started are dropped; newer ones
+    are left for ``refresh_pending``.
+    """
+    try:
+        if db.get_bind().dialect.name == 'postgresql':
+            db.execute(text("LOCK TABLE public.daily_submission_stats, public.daily_client_stats IN EXCLUSIVE MODE"))
+        queued = db.scalar(select(func.max(StatsRefreshQueue.id)))
+        if queued is not None:
+            db.execute(delete(StatsRefreshQueue).where(StatsRefreshQueue.id <= queued))
+        db.execute(delete(DailySubmissionStats))
+        db.execute(delete(DailyClientStats))
+        db.execute(insert(DailySubmissionStats).from_select(SUBMISSION_STATS_COLUMNS, submission_rollup()))
+        db.execute(insert(DailyClientStats).from_select(CLIENT_STATS_COLUMNS, client_rollup()))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def stats_statement(by: List[str], since: Optional[datetime.date] = None, until: Optional[datetime.date] = None,
+                    form_uuid: Optional[UUID] = None):
+    """
+    Builds the query summing the rollups by ``by``; it reads one row per day and group.
+
+    Args:
+        by (list): Columns of SUBMISSION_DIMENSIONS, or of CLIENT_DIMENSIONS; empty for the totals.
+        since (date): First day included.
+        until (date): First day excluded.
+        form_uuid (UUID): Only this form.
+
+    Raises:
+        ValueError: If ``by`` mixes the two tables or names an unknown column.
+    """
+    if all(name in SUBMISSION_DIMENSIONS for name in by):
+        model, measures = DailySubmissionStats, ('submissions', 'businesses', 'businesses_operating')
+    elif all(name in CLIENT_DIMENSIONS for name in by):
+        model, measures = DailyClientStats, ('clients',)
+    else:
+        raise ValueError(f"by must be columns of {SUBMISSION_DIMENSIONS} or of {CLIENT_DIMENSIONS}, got {by}")
+
+    groups = [getattr(model, name) for name in by]
+    stmt = select(*groups, *(func.sum(getattr(model, name)).label(name) for name in measures))
+    if since is not None:
+        stmt = stmt.where(model.day >= since)
+    if until is not None:
+        stmt = stmt.where(model.day < until)
+    if form_uuid is not None:
+        stmt = stmt.where(model.form_uuid == form_uuid)
+    return stmt.group_by(*groups).order_by(*groups)
+
+
+def stats_row(row) -> Dict[str, Any]:
+    """
+    Returns a /stats result row as a dict, with the business operating rate when it applies.
+    """
+    values = dict(row._mapping)
+    for name in ('submissions', 'businesses', 'businesses_operating', 'clients'):
+        if name in values:
+            values[name] = int(values[name] or 0)
+    if 'businesses' in values:
+        values['operating_rate'] = values['businesses_operating'] / values['businesses'] if values['businesses'] else None
+    return values
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the daily rollup tables.")
+    parser.add_argument("--pending", action="store_true", help="rebuild only the slices queued by ingests")
+    args = parser.parse_args()
+
+    from app.database.db_connection import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if args.pending:
+            print(f"Rebuilt {refresh_pending(db)} queued (form, day) slices")
+        else:
+            refresh_all(db)
+            print("Rebuilt daily_submission_stats and daily_client_stats")
+    finally:
+        db.close()
@@ -0,0 +1,174 @@
+# app/database/writer.py
+
+import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.database.models import KoboSubmission, Client, BusinessInfo, SurveyMetadata, SUBMISSION_KEY, CLIENT_KEY
+from app.database import ingest_events, stats
+from app.utils import metrics
+
+# Child tables keyed by the name used in a transformed submission
+CHILD_TABLES = {
+    'client': Client,
+    'business_info': BusinessInfo,
+    'survey_metadata': SurveyMetadata,
+}
+
+# What to do with a submission whose _id is already stored
+ON_CONFLICT_MODES = ('skip', 'update')
+
+WRITE_BATCH_SIZE = metrics.histogram('kobo_db_batch_size', 'Submissions per write transaction', ('writer',),
+                                     buckets=metrics.SIZE_BUCKETS)
+INSERT_SECONDS = metrics.histogram('kobo_db_insert_seconds', 'Time of the insert statements of a batch, per table',
+                                   ('table',))
+STATS_SECONDS = metrics.histogram('kobo_db_stats_queue_seconds', 'Time queueing the rollup slices a batch touched')
+COMMIT_SECONDS = metrics.histogram('kobo_db_commit_seconds', 'Time committing a write transaction')
+STORED = metrics.counter('kobo_db_submissions_written_total', 'Submissions inserted or updated', ('writer',))
+
+
+def dialect_insert(db: Session, model):
+    """
+    Returns an ``INSERT`` for ``model`` that supports ``ON CONFLICT`` on the session's database.
+
+    Raises:
+        NotImplementedError: If the database is neither PostgreSQL nor SQLite.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return pg_insert(model)
+    if dialect == 'sqlite':
+        return sqlite_insert(model)
+    raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect}")
+
+
+def on_conflict_clause(stmt, index_elements: List[str], columns: List[str], on_conflict: str):
+    """
+    Adds ``ON CONFLICT (index_elements)`` to an insert: update ``columns`` or do nothing.
+    """
+    if on_conflict == 'update':
+        return stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={name: stmt.excluded[name] for name in columns if name not in index_elements},
+        )
+    return stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+
+def unique_submissions(items: List[Dict[str, Optional[Dict[str, Any]]]],
+                       on_conflict: str) -> Dict[int, Dict[str, Optional[Dict[str, Any]]]]:
+    """
+    Returns the items by ``_id``, one per submission: the first copy when skipping, the latest when updating.
+
+    A statement may touch each ``_id`` only once, and a repeated ``_id`` must
+    not add its child rows twice.
+    """
+    unique_items = {}
+    for item in items:
+        _id = item['submission']['_id']
+        if on_conflict == 'update':
+            unique_items[_id] = item
+        else:
+            unique_items.setdefault(_id, item)
+    return unique_items
+
+
+def stamp_updated_at(items: List[Dict[str, Optional[Dict[str, Any]]]]) -> List[Dict[str, Optional[Dict[str, Any]]]]:
+    """
+    Returns copies of the items whose submission rows carry ``updated_at`` (now, UTC) for the export cursor.
+    """
+    now = datetime.datetime.utcnow()
+    return [dict(item, submission=dict(item['submission'], updated_at=now)) for item in items]
+
+
+def write_batch(db: Session, items: List[Dict[str, Optional[Dict[str, Any]]]], on_conflict: str = 'skip') -> int:
+    """
+    Writes a batch of transformed submissions to all four tables in one transaction.
+
+    Each item is a dict with a ``submission`` row and optional ``client``,
+    ``business_info`` and ``survey_metadata`` rows (column name -> value, without
+    ``submission_id`` and ``submission_time``). Rows are written with multi-row
+    ``INSERT ... ON CONFLICT`` statements and the children are linked through
+    ``RETURNING id``, so replaying a batch is safe even when another writer races
+    on the same ``_id``. Inserted and updated submissions get a new ``updated_at``.
+
+    With ``on_conflict='skip'`` submissions that are already stored are left
+    untouched. With ``on_conflict='update'`` they are updated in place and their
+    child rows are replaced. The (form, day) slices of the daily rollups the
+    batch touches are queued for a rebuild in the same transaction (see
+    ``stats.queue_refresh``).
+
+    Args:
+        db (Session): SQLAlchemy session object.
+        items (list): Transformed submissions.
+        on_conflict (str): ``'skip'`` or ``'update'``.
+
+    Returns:
+        int: The number of submissions inserted (or updated).
+    """
+    if on_conflict not in ON_CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {ON_CONFLICT_MODES}, got {on_conflict!r}")
+
+    unique_items = unique_submissions(stamp_updated_at(items), on_conflict)
+    if not unique_items:
+        return 0
+
+    rows = [item['submission'] for item in unique_items.values()]
+    WRITE_BATCH_SIZE.observe(len(rows), writer='insert')
+
+    try:
+        keys = stats.affected_keys(db, unique_items.values()) if stats.STATS_INCREMENTAL else ()
+        stmt = on_conflict_clause(dialect_insert(db, KoboSubmission), list(SUBMISSION_KEY), list(rows[0]), on_conflict)
+        with INSERT_SECONDS.time(table=KoboSubmission.__tablename__):
+            result = db.execute(stmt.returning(KoboSubmission.id, KoboSubmission._id, KoboSubmission.submission_time),
+                                rows).all()
+        ids, times = {}, {}
+        for submission_id, kobo_id, submission_time in result:
+            ids[kobo_id] = submission_id
+            times[kobo_id] = submission_time
+
+        if ids and on_conflict == 'update':
+            # Updated submissions get their children rewritten from the new payload
+            for model in CHILD_TABLES.values():
+                db.execute(
+                    delete(model).where(model.submission_id.in_(list(ids.values()))),
+                    execution_options={'synchronize_session': False},
+                )
+
+        for key, model in CHILD_TABLES.items():
+            child_rows = [
+                dict(item[key], submission_id=ids[_id], submission_time=times[_id])
+                for _id, item in unique_items.items()
+                if _id in ids and item.get(key) is not None
+            ]
+            if not child_rows:
+                continue
+            stmt = dialect_insert(db, model)
+            if model is Client:
+                # A client keeps its unique_id across submissions; a statement may touch it only once
+                clients = {}
+                for row in child_rows:
+                    client_key = tuple(row[name] for name in CLIENT_KEY)
+                    if on_conflict == 'update':
+                        clients[client_key] = row
+                    else:
+                        clients.setdefault(client_key, row)
+                child_rows = list(clients.values())
+                stmt = on_conflict_clause(stmt, list(CLIENT_KEY), list(child_rows[0]), on_conflict)
+            with INSERT_SECONDS.time(table=model.__tablename__):
+                db.execute(stmt, child_rows)
+
+        with STATS_SECONDS.time():
+            stats.queue_refresh(db, keys)
+        ingest_events.record(db, {unique_items[_id]['submission'].get('form_uuid') for _id in ids})
+        with COMMIT_SECONDS.time():
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    STORED.inc(len(ids), writer='insert')
+    return len(ids)
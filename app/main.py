@@ -1,10 +1,7 @@
-from fastapi import FastAPI
-from app.webhook.webhook_endpoint import router as webhook_router
-
-app = FastAPI()
-
-app.include_router(webhook_router)
+# The API and webhook live in app.webhook.webhook_endpoint, whose app renders
+# responses with orjson when it is installed (FastJSONResponse)
+from app.webhook.webhook_endpoint import app
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -80,6 +80,16 @@ class SurveyMetadataSchema(BaseModel):
         orm_mode = True
 
 
+# KoboSubmission with its child records
+class KoboSubmissionDetailSchema(KoboSubmissionSchema):
+    clients: List[ClientSchema] = []
+    business_infos: List[BusinessInfoSchema] = []
+    survey_metadatas: List[SurveyMetadataSchema] = []
+
+    class Config:
+        orm_mode = True
+
+
 # Schema for List Responses (Optional)
 class KoboSubmissionListSchema(BaseModel):
     submissions: List[KoboSubmissionSchema]
@@ -0,0 +1,87 @@
+# app/utils/fast_json.py
+
+import json
+import uuid
+import typing
+import datetime
+import functools
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib json module is used instead
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def loads(data) -> Any:
+    """
+    Parses JSON (bytes or str) with orjson when it is installed.
+
+    Raises:
+        ValueError: If the data is not valid JSON.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Serializes to compact UTF-8 JSON with orjson when it is installed.
+
+    Datetimes, dates and UUIDs are written as ISO 8601 and canonical strings,
+    as Pydantic does, whichever library is used.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    ``JSONResponse`` rendered by ``dumps`` (orjson when it is installed).
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# (field name, nested fields or None) per field of a schema
+RowFields = Tuple[Tuple[str, Optional['RowFields']], ...]
+
+
+@functools.lru_cache(maxsize=None)
+def row_fields(schema: type) -> RowFields:
+    """
+    Returns the fields ``schema`` outputs, with the fields of nested list-of-model fields.
+    """
+    fields = []
+    for name, field in schema.model_fields.items():
+        nested = next((arg for arg in typing.get_args(field.annotation)
+                       if isinstance(arg, type) and issubclass(arg, BaseModel)), None)
+        fields.append((name, row_fields(nested) if nested else None))
+    return tuple(fields)
+
+
+def row_to_dict(row: Any, fields: RowFields) -> Dict[str, Any]:
+    """
+    Copies the schema's fields from an ORM object or a result row into a dict.
+
+    This replaces validating every row through the Pydantic schema when the
+    values already have the schema's types, as rows read from the database do.
+    """
+    return {
+        name: getattr(row, name) if nested is None else [row_to_dict(child, nested) for child in getattr(row, name)]
+        for name, nested in fields
+    }
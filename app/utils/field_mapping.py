@@ -0,0 +1,149 @@
+# app/utils/field_mapping.py
+
+import datetime
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from app.utils.parsing import clean_uuid, parse_datetime, parse_date
+
+
+class Field(NamedTuple):
+    """
+    One column filled from one Kobo path.
+
+    Attributes:
+        column (str): Column name in the target table.
+        path (str): Key of the value in the Kobo record.
+        coerce (callable): Converts the raw value; None stores it unchanged.
+        default (callable): Called for a value when the coerced value is None.
+        required (bool): The path must be present (a missing key makes the record invalid).
+    """
+    column: str
+    path: str
+    coerce: Optional[Callable[[Any], Any]] = None
+    default: Optional[Callable[[], Any]] = None
+    required: bool = False
+
+
+class Table(NamedTuple):
+    """
+    The row of one table built from a Kobo record.
+
+    Attributes:
+        key (str): Name of the row in the transformed record.
+        fields (tuple): The row's fields.
+        when (str): Only build the row if the record has this path; None builds it always.
+    """
+    key: str
+    fields: Tuple[Field, ...]
+    when: Optional[str] = None
+
+
+def to_uuid(value: Optional[str]):
+    return clean_uuid(value or '')
+
+
+def to_int(value: Any) -> Optional[int]:
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+def is_yes(value: Any) -> bool:
+    # Kobo choice names differ in case between questions ('Yes' / 'yes')
+    return isinstance(value, str) and value.lower() == 'yes'
+
+
+# Kobo form paths -> columns of the four tables. Used by the pull job and the webhook.
+KOBO_MAPPING = (
+    Table('submission', (
+        Field('_id', '_id', int, required=True),
+        Field('form_uuid', 'formhub/uuid', to_uuid),
+        Field('instance_id', 'meta/instanceID', to_uuid),
+        # Kobo always sends these; deliveries without them are stamped on receipt
+        Field('submission_time', '_submission_time', parse_datetime, datetime.datetime.now),
+        Field('start_time', 'starttime', parse_datetime, datetime.datetime.now),
+        Field('end_time', 'endtime', parse_datetime, datetime.datetime.now),
+        Field('survey_date', 'cd_survey_date', parse_date, datetime.date.today),
+        # JSON columns keep the payload's lists and objects as they are
+        Field('_geolocation', '_geolocation'),
+        Field('_status', '_status'),
+        Field('_tags', '_tags'),
+        Field('_notes', '_notes'),
+        Field('_validation_status', '_validation_status'),
+        Field('_submitted_by', '_submitted_by'),
+        Field('version', '__version__'),
+    )),
+    Table('client', (
+        Field('unique_id', 'sec_a/unique_id'),
+        Field('client_name', 'sec_c/cd_client_name'),
+        Field('client_id_manifest', 'sec_c/cd_client_id_manifest'),
+        Field('location', 'sec_c/cd_location'),
+        Field('client_phone', 'sec_c/cd_clients_phone'),
+        Field('alt_phone', 'sec_c/cd_phoneno_alt_number'),
+        Field('phone_type', 'sec_c/cd_clients_phone_smart_feature'),
+        Field('gender', 'sec_c/cd_gender'),
+        Field('age', 'sec_c/cd_age', to_int),
+        Field('nationality', 'sec_c/cd_nationality'),
+        Field('strata', 'sec_c/cd_strata'),
+        Field('disability', 'sec_c/cd_disability', is_yes),
+        Field('education', 'sec_c/cd_education'),
+        Field('client_status', 'sec_c/cd_client_status'),
+        Field('sole_income_earner', 'sec_c/cd_sole_income_earner', is_yes),
+        Field('responsible_people', 'sec_c/cd_howrespble_pple', to_int),
+    ), when='sec_a/unique_id'),
+    Table('business_info', (
+        Field('country_name', 'sec_a/cd_biz_country_name'),
+        Field('region_name', 'sec_a/cd_biz_region_name'),
+        Field('bda_name', 'sec_b/bda_name'),
+        Field('cohort', 'sec_b/cd_cohort'),
+        Field('program', 'sec_b/cd_program'),
+        Field('biz_status', 'group_mx5fl16/cd_biz_status'),
+        Field('biz_operating', 'group_mx5fl16/bd_biz_operating', is_yes),
+    ), when='sec_a/cd_biz_country_name'),
+    Table('survey_metadata', (
+        Field('form_uuid', 'formhub/uuid', to_uuid),
+        Field('instance_id', 'meta/instanceID', to_uuid),
+        Field('form_version', '__version__'),
+    )),
+)
+
+
+def compile_mapping(tables: Tuple[Table, ...]) -> Callable[[Dict[str, Any]], Dict[str, Optional[Dict[str, Any]]]]:
+    """
+    Compiles a mapping into one transform function.
+
+    The function is generated as Python source with one dict literal per table,
+    so transforming a record is a single call with no per-field loop or lookup
+    of the spec.
+
+    Returns:
+        callable: ``transform(record)`` returning ``{table key: row or None}``.
+        Raises KeyError for a missing required path and ValueError/TypeError for
+        values that cannot be coerced.
+    """
+    namespace: Dict[str, Any] = {}
+    lines = ["def transform(record):", "    get = record.get"]
+    for table in tables:
+        entries = []
+        for field in table.fields:
+            value = f"record[{field.path!r}]" if field.required else f"get({field.path!r})"
+            if field.coerce is not None:
+                name = f"coerce_{table.key}_{field.column}"
+                namespace[name] = field.coerce
+                value = f"{name}({value})"
+            if field.default is not None:
+                name = f"default_{table.key}_{field.column}"
+                namespace[name] = field.default
+                value = f"(_ if (_ := {value}) is not None else {name}())"
+            entries.append(f"{field.column!r}: {value}")
+        row = "{" + ", ".join(entries) + "}"
+        if table.when is not None:
+            row = f"({row} if {table.when!r} in record else None)"
+        lines.append(f"    {table.key} = {row}")
+    lines.append("    return {" + ", ".join(f"{table.key!r}: {table.key}" for table in tables) + "}")
+
+    exec(compile("\n".join(lines), "<kobo mapping>", "exec"), namespace)
+    return namespace["transform"]
+
+
+transform_record = compile_mapping(KOBO_MAPPING)
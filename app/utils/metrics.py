@@ -0,0 +1,361 @@
+# app/utils/metrics.py
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Record metrics at all; when off, every update returns straight away
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Seconds between the metrics log lines of the pull job; 0 disables them
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", 0))
+
+# Histogram buckets (upper bounds) for durations in seconds and for batch sizes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Metric:
+    """
+    A named metric with one value (or histogram) per combination of label values.
+
+    Updates take a lock, so metrics can be shared between the web server's
+    threads, the ingest workers and the pipeline stages.
+
+    Args:
+        registry (Registry): Registry the metric is exposed by.
+        name (str): Metric name, e.g. ``kobo_fetch_seconds``.
+        documentation (str): The ``# HELP`` text.
+        labelnames (sequence): Names of the labels every update passes as keyword arguments.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, registry: 'Registry', name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if not labels and not self.labelnames:
+            return ()
+        if len(labels) == len(self.labelnames):
+            try:
+                return tuple([str(labels[name]) for name in self.labelnames])
+            except KeyError:
+                pass
+        raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        """
+        Returns (name suffix, label names, label values, value) for every sample of the metric.
+        """
+        with self._lock:
+            return [('', self.labelnames, key, value) for key, value in sorted(self._values.items())]
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, e.g. records processed or retries.
+    """
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down, e.g. a queue depth or the connections checked out.
+    """
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(Metric):
+    """
+    Counts of observations (durations, batch sizes) per bucket, with their sum.
+
+    Args:
+        buckets (sequence): Upper bounds of the buckets, ascending; ``+Inf`` is added.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, registry: 'Registry', name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the seconds spent in the ``with`` block, also when it raises.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels) -> Tuple[int, float]:
+        """
+        Returns the number and the sum of the observations.
+        """
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def totals(self) -> Tuple[int, float]:
+        """
+        Returns the number and the sum of the observations over all label values.
+        """
+        with self._lock:
+            return sum(state[2] for state in self._values.values()), sum(state[1] for state in self._values.values())
+
+    def samples(self):
+        samples = []
+        names = self.labelnames + ('le',)
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip((*self.buckets, float('inf')), counts):
+                    cumulative += bucket_count
+                    samples.append(('_bucket', names, (*key, format_value(bound)), cumulative))
+                samples.append(('_sum', self.labelnames, key, total))
+                samples.append(('_count', self.labelnames, key, count))
+        return samples
+
+
+class Registry:
+    """
+    The metrics of the process, rendered in the Prometheus text format.
+
+    Metrics are created once per name: asking again for a name returns the
+    existing metric, so modules can declare theirs at import time. Collectors
+    are called before every render to refresh gauges that are read from
+    elsewhere (pool state, queue depths).
+
+    Args:
+        enabled (bool): Record updates (default is set by METRICS_ENABLED).
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind} with labels {metric.labelnames}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], None]) -> None:
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def collect(self) -> None:
+        if not self.enabled:
+            return
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+
+    def clear(self) -> None:
+        """
+        Resets every metric to no samples (the metrics stay registered).
+        """
+        for metric in list(self._metrics.values()):
+            metric.clear()
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format (version 0.0.4).
+        """
+        self.collect()
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {escape(metric.documentation)}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for suffix, labelnames, labelvalues, value in metric.samples():
+                lines.append(f"{name}{suffix}{format_labels(labelnames, labelvalues)} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request into ``http_request_duration_seconds``.
+
+    Requests are labelled with the path template of the route that handled
+    them (``/exports/{path:path}``, not the requested file), so the number of
+    series stays bounded; requests no route matched share ``unmatched``.
+
+    Args:
+        app: The ASGI application.
+        routes (iterable): The application's routes, to name the handler of a request.
+        registry (Registry): Registry of the histogram.
+    """
+
+    def __init__(self, app, routes: Iterable, registry: Registry = REGISTRY):
+        self.app = app
+        self.routes = routes
+        self.registry = registry
+        self.latency = registry.histogram('http_request_duration_seconds', 'Latency of the HTTP requests',
+                                          ('method', 'route', 'status'))
+        self._route_names = None
+
+    def route_name(self, endpoint) -> str:
+        if self._route_names is None:
+            self._route_names = {getattr(route, 'endpoint', None): getattr(route, 'path', None) for route in self.routes}
+        return self._route_names.get(endpoint) or 'unmatched'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.registry.enabled:
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # The router stored the matched endpoint in the (shared) scope
+            self.latency.observe(time.perf_counter() - started, method=scope['method'],
+                                 route=self.route_name(scope.get('endpoint')), status=status)
+
+
+class MetricsReporter(threading.Thread):
+    """
+    Prints a summary line of the metrics every ``interval`` seconds, for jobs without a /metrics endpoint.
+
+    Args:
+        interval (float): Seconds between the lines.
+        summary (callable): Returns the line to print.
+    """
+
+    def __init__(self, interval: float, summary: Callable[[], str]):
+        super().__init__(name="metrics-reporter", daemon=True)
+        self.interval = interval
+        self.summary = summary
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                print(self.summary())
+            except Exception as e:
+                print(f"Metrics report failed: {e}")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopping.set()
+        self.join(timeout)
@@ -0,0 +1,56 @@
+# app/utils/parsing.py
+
+import uuid
+import datetime
+from typing import Optional
+
+
+def clean_uuid(uuid_string: str) -> uuid.UUID:
+    """
+    Cleans and validates a UUID string.
+
+    Args:
+        uuid_string (str): The UUID string to clean and validate.
+
+    Returns:
+        uuid.UUID: A valid UUID object.
+
+    Raises:
+        ValueError: If the UUID is invalid after cleaning.
+    """
+    if uuid_string.startswith('uuid:'):
+        uuid_string = uuid_string[5:]
+    try:
+        return uuid.UUID(uuid_string)
+    except ValueError:
+        raise ValueError(f"Invalid UUID: {uuid_string}")
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime.datetime]:
+    """
+    Parses an ISO 8601 timestamp from the KoboToolbox API.
+
+    Args:
+        value (str): The timestamp string, e.g. ``2024-08-24T09:44:06.712+02:00``.
+
+    Returns:
+        datetime.datetime: The parsed timestamp, or None if no value was given.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.datetime.fromisoformat(value)
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime.date]:
+    """
+    Parses an ISO 8601 date (``YYYY-MM-DD``) from the KoboToolbox API.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value[:10])
@@ -0,0 +1,203 @@
+# app/utils/response_cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+from uuid import UUID
+
+from app.database.ingest_events import ALL_FORMS
+
+
+class CachedResponse(NamedTuple):
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    etag: bytes
+    # Form the response is limited to; None when it covers every form
+    form_uuid: Optional[str]
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    LRU cache of response bodies with a time to live, invalidated per form.
+
+    An entry is dropped when its form (or, for responses that cover every
+    form, any form) commits new rows. Each form has a generation counter that
+    invalidation bumps; a response is only stored if the generation it was
+    computed under is still current, so a query that raced an ingest is never
+    cached.
+
+    Args:
+        max_entries (int): Responses kept; the least recently used are evicted. 0 disables the cache.
+        ttl (float): Seconds a response is served from the cache at most.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, CachedResponse]' = OrderedDict()
+        self._generations: Dict[Optional[str], int] = {}
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'not_modified': 0, 'stores': 0, 'evictions': 0,
+                         'expirations': 0, 'invalidations': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def generation(self, form_uuid: Optional[str]) -> Tuple[int, int]:
+        # A form's responses go stale when that form ingests, the others (form None) on any ingest
+        with self._lock:
+            return self._generations.get(ALL_FORMS, 0), self._generations.get(form_uuid, 0)
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            self.counters[counter] += 1
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self.counters['expirations'] += 1
+                entry = None
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return entry
+
+    def put(self, key: str, status: int, headers: List[Tuple[bytes, bytes]], body: bytes,
+            form_uuid: Optional[str], generation: Tuple[int, int]) -> CachedResponse:
+        """
+        Stores a response computed under ``generation``, unless an ingest invalidated it meanwhile.
+        """
+        entry = CachedResponse(status, headers, body, etag(body), form_uuid, time.monotonic() + self.ttl)
+        if self.generation(form_uuid) != generation:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.counters['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+        return entry
+
+    def invalidate(self, forms: Iterable[str]) -> None:
+        """
+        Drops the responses of ``forms`` and the ones covering every form (ALL_FORMS drops everything).
+        """
+        forms = set(forms)
+        with self._lock:
+            for form in forms | {None}:
+                self._generations[form] = self._generations.get(form, 0) + 1
+            stale = [key for key, entry in self._entries.items()
+                     if ALL_FORMS in forms or entry.form_uuid is None or entry.form_uuid in forms]
+            for key in stale:
+                del self._entries[key]
+            self.counters['invalidations'] += len(stale)
+
+    def clear(self) -> None:
+        self.invalidate({ALL_FORMS})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return {**self.counters, 'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'ttl': self.ttl, 'hit_rate': self.counters['hits'] / lookups if lookups else None}
+
+
+def form_key(value: Optional[str]) -> Optional[str]:
+    # Ingests announce forms as canonical UUID strings
+    try:
+        return str(UUID(value)) if value else None
+    except ValueError:
+        return value
+
+
+def etag(body: bytes) -> bytes:
+    return b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode() + b'"'
+
+
+def matches(if_none_match: Optional[bytes], tag: bytes) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == b'*':
+        return True
+    # Weak comparison, as If-None-Match requires
+    return tag in {candidate.strip().removeprefix(b'W/') for candidate in if_none_match.split(b',')}
+
+
+class ResponseCacheMiddleware:
+    """
+    ASGI middleware serving GET requests to ``paths`` from a ``ResponseCache``.
+
+    Responses are keyed on path and query parameters (filters and cursor),
+    carry an ``ETag`` and answer ``If-None-Match`` with 304, whether they come
+    from the cache or not. ``X-Cache`` tells a hit from a miss. Requests with a
+    ``format`` other than ``json`` (NDJSON streams) and error responses are
+    passed through uncached.
+
+    Args:
+        app: The ASGI application.
+        cache (ResponseCache): Cache of the responses.
+        paths (iterable): Paths whose responses are cached.
+    """
+
+    def __init__(self, app, cache: ResponseCache, paths: Iterable[str]):
+        self.app = app
+        self.cache = cache
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] != 'http' or scope['method'] != 'GET' or scope['path'] not in self.paths
+                or not self.cache.enabled):
+            return await self.app(scope, receive, send)
+        params = parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True)
+        if dict(params).get('format', 'json') != 'json':
+            return await self.app(scope, receive, send)
+
+        key = f"{scope['path']}?{urlencode(sorted(params))}"
+        form_uuid = form_key(dict(params).get('form_uuid'))
+        if_none_match = dict(scope['headers']).get(b'if-none-match')
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            return await self.respond(send, entry, if_none_match, b'HIT')
+
+        generation = self.cache.generation(form_uuid)
+        start, body = {}, []
+
+        async def capture(message):
+            if message['type'] == 'http.response.start':
+                start.update(message)
+            elif message['type'] == 'http.response.body':
+                body.append(message.get('body', b''))
+
+        await self.app(scope, receive, capture)
+        headers = [(name, value) for name, value in start.get('headers', []) if name.lower() != b'content-length']
+        if start.get('status') == 200:
+            entry = self.cache.put(key, 200, headers, b''.join(body), form_uuid, generation)
+        else:
+            entry = CachedResponse(start.get('status', 500), headers, b''.join(body), b'', form_uuid, 0)
+        await self.respond(send, entry, if_none_match, b'MISS')
+
+    async def respond(self, send, entry: CachedResponse, if_none_match: Optional[bytes], cache_status: bytes):
+        headers = [*entry.headers, (b'x-cache', cache_status)]
+        if entry.etag:
+            headers.append((b'etag', entry.etag))
+        if entry.etag and matches(if_none_match, entry.etag):
+            self.cache.count('not_modified')
+            headers = [(name, value) for name, value in headers if name.lower() != b'content-type']
+            await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        headers.append((b'content-length', str(len(entry.body)).encode()))
+        await send({'type': 'http.response.start', 'status': entry.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': entry.body})
@@ -0,0 +1,111 @@
+# app/webhook/coalescer.py
+
+import asyncio
+from typing import Any, Dict, List, Optional, Set
+
+from app.database.async_db_connection import AsyncSessionLocal
+from app.database.raw_archive import archive_records
+from app.database.writer import write_batch
+
+
+class Coalescer:
+    """
+    Groups concurrent webhook submissions into shared multi-row transactions.
+
+    ``submit`` parks a submission until ``max_batch`` submissions are waiting
+    or ``max_delay_ms`` has passed since the first one arrived. The whole group
+    is then archived with ``archive_records`` and written with one
+    ``write_batch`` call over an async session, so the event loop keeps
+    accepting requests, and every caller gets the outcome of
+    the flush that contained its submission. If the group fails, its
+    submissions are written one by one so each request reports its own error.
+
+    Args:
+        max_batch (int): Flush as soon as this many submissions are waiting.
+        max_delay_ms (float): Longest time a submission waits for others to join it.
+        on_conflict (str): ``write_batch`` conflict mode.
+    """
+
+    def __init__(self, max_batch: int = 100, max_delay_ms: float = 20.0, on_conflict: str = 'update'):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.on_conflict = on_conflict
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The loop only keeps weak references to tasks; running flushes are kept here
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Dict[str, Any], payload: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Waits until ``item`` (and its raw ``payload``, if given) has been written.
+
+        Raises:
+            Exception: The error that prevented this submission from being stored.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, payload, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+
+        await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.get_running_loop().create_task(self._write(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        """
+        Flushes the waiting submissions and waits for every running flush to finish.
+        """
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _write(self, pending: List[tuple]) -> None:
+        items = [item for item, _, _ in pending]
+        payloads = [payload for _, payload, _ in pending if payload is not None]
+        try:
+            errors = await self._write_items(items, payloads)
+        except Exception as e:
+            errors = [e] * len(pending)
+
+        for (_, _, future), error in zip(pending, errors):
+            if future.done():
+                continue  # the request was cancelled, e.g. the client disconnected
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    async def _write_items(self, items: List[Dict[str, Any]],
+                           payloads: List[Dict[str, Any]]) -> List[Optional[Exception]]:
+        async with AsyncSessionLocal() as db:
+            try:
+                await db.run_sync(archive_records, payloads)
+            except Exception as e:
+                print(f"Archiving {len(payloads)} coalesced submissions failed: {e}")
+
+            try:
+                await db.run_sync(write_batch, items, self.on_conflict)
+                return [None] * len(items)
+            except Exception as e:
+                print(f"Coalesced insert of {len(items)} submissions failed, retrying one by one: {e}")
+
+            errors = []
+            for item in items:
+                try:
+                    await db.run_sync(write_batch, [item], self.on_conflict)
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(e)
+            return errors
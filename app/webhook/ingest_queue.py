@@ -0,0 +1,287 @@
+# app/webhook/ingest_queue.py
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.database.db_connection import SessionLocal
+from app.database.raw_archive import archive_records
+from app.database.writer import write_batch
+from app.utils import metrics
+
+# A queued webhook delivery: (entry id, payload, failed attempts so far)
+Entry = Tuple[int, Dict[str, Any], int]
+
+DROPPED = metrics.counter('kobo_webhook_dropped_total', 'Queued webhook deliveries given up on', ('reason',))
+
+
+class QueueFull(Exception):
+    """
+    Raised when the in-memory queue cannot take another delivery.
+
+    Args:
+        message (str): The error message.
+        entries (list): The deliveries that could not be re-queued, when raised by ``retry``.
+    """
+
+    def __init__(self, message: str, entries: Optional[List[Entry]] = None):
+        super().__init__(message)
+        self.entries = entries or []
+
+
+class MemoryQueue:
+    """
+    Bounded in-process queue of webhook payloads.
+
+    Fast, but deliveries still queued are lost if the process dies; use
+    ``SpoolQueue`` when that matters.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._ids = iter(range(1, 2 ** 63))
+        self._lock = threading.Lock()
+
+    def put(self, payload: Dict[str, Any], attempts: int = 0) -> None:
+        with self._lock:
+            entry_id = next(self._ids)
+        try:
+            self._queue.put_nowait((entry_id, payload, attempts))
+        except queue.Full:
+            raise QueueFull("Webhook queue is full")
+
+    def get_batch(self, max_items: int, timeout: float) -> List[Entry]:
+        """
+        Waits up to ``timeout`` seconds for a delivery, then takes whatever else is queued, up to ``max_items``.
+        """
+        try:
+            entries = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(entries) < max_items:
+            try:
+                entries.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return entries
+
+    def ack(self, entries: List[Entry]) -> None:
+        pass
+
+    def retry(self, entries: List[Entry]) -> None:
+        """
+        Re-queues failed deliveries; raises ``QueueFull`` with those that did not fit.
+        """
+        dropped = []
+        for entry in entries:
+            try:
+                self.put(entry[1], entry[2] + 1)
+            except QueueFull:
+                dropped.append(entry)
+        if dropped:
+            raise QueueFull(f"Webhook queue is full; {len(dropped)} deliveries could not be retried", dropped)
+
+    def discard(self, entries: List[Entry]) -> None:
+        pass
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+
+class SpoolQueue:
+    """
+    Durable webhook queue backed by a local SQLite file.
+
+    A delivery is only removed once it has been written to the database, so
+    deliveries survive a crash or restart. Deliveries that keep failing are
+    kept with state ``dead`` for inspection instead of being dropped.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._ready = threading.Condition()
+        with self._ready:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS webhook_spool ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " payload TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " state TEXT NOT NULL DEFAULT 'pending',"
+                " received_at REAL NOT NULL)"
+            )
+            # Deliveries a previous process claimed but never finished
+            self._conn.execute("UPDATE webhook_spool SET state = 'pending' WHERE state = 'claimed'")
+
+    def put(self, payload: Dict[str, Any]) -> None:
+        with self._ready:
+            self._conn.execute(
+                "INSERT INTO webhook_spool (payload, received_at) VALUES (?, ?)",
+                (json.dumps(payload), time.time()),
+            )
+            self._ready.notify()
+
+    def get_batch(self, max_items: int, timeout: float) -> List[Entry]:
+        """
+        Claims up to ``max_items`` pending deliveries, waiting up to ``timeout`` seconds for the first.
+        """
+        deadline = time.monotonic() + timeout
+        with self._ready:
+            while True:
+                rows = self._conn.execute(
+                    "SELECT id, payload, attempts FROM webhook_spool WHERE state = 'pending' ORDER BY id LIMIT ?",
+                    (max_items,),
+                ).fetchall()
+                if rows:
+                    self._set_state([row[0] for row in rows], 'claimed')
+                    return [(entry_id, json.loads(payload), attempts) for entry_id, payload, attempts in rows]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._ready.wait(remaining)
+
+    def _set_state(self, entry_ids: List[int], state: str, attempts_increment: int = 0) -> None:
+        placeholders = ", ".join("?" * len(entry_ids))
+        self._conn.execute(
+            f"UPDATE webhook_spool SET state = ?, attempts = attempts + ? WHERE id IN ({placeholders})",
+            (state, attempts_increment, *entry_ids),
+        )
+
+    def ack(self, entries: List[Entry]) -> None:
+        if not entries:
+            return
+        placeholders = ", ".join("?" * len(entries))
+        with self._ready:
+            self._conn.execute(
+                f"DELETE FROM webhook_spool WHERE id IN ({placeholders})", [entry[0] for entry in entries]
+            )
+
+    def retry(self, entries: List[Entry]) -> None:
+        if entries:
+            with self._ready:
+                self._set_state([entry[0] for entry in entries], 'pending', 1)
+                self._ready.notify_all()
+
+    def discard(self, entries: List[Entry]) -> None:
+        if entries:
+            with self._ready:
+                self._set_state([entry[0] for entry in entries], 'dead', 1)
+
+    def qsize(self) -> int:
+        with self._ready:
+            return self._conn.execute("SELECT COUNT(*) FROM webhook_spool WHERE state = 'pending'").fetchone()[0]
+
+
+class IngestWorkers:
+    """
+    Worker threads draining a webhook queue into the database in micro-batches.
+
+    Each worker takes up to ``batch_size`` queued deliveries, archives them
+    with ``archive_records``, maps them with ``transform`` and upserts them with
+    one ``write_batch`` transaction. If the batch fails, its deliveries are written one by one; those that still fail
+    are retried later and given up after ``max_attempts``, or right away if the queue is too full to take them
+    back. Deliveries given up on are counted in ``kobo_webhook_dropped_total`` and can be replayed from the raw
+    archive.
+
+    Args:
+        ingest_queue: A ``MemoryQueue`` or ``SpoolQueue``.
+        transform (callable): Maps a webhook payload to a ``write_batch`` item.
+        workers (int): The number of worker threads.
+        batch_size (int): The maximum number of deliveries per transaction.
+        max_attempts (int): Failed writes before a delivery is discarded.
+    """
+
+    def __init__(self, ingest_queue, transform: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 workers: int = 2, batch_size: int = 100, max_attempts: int = 5):
+        self.queue = ingest_queue
+        self.transform = transform
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"webhook-ingest-{n}", daemon=True)
+            for n in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stops the workers once the queue is drained, waiting at most ``timeout`` seconds.
+        """
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def _run(self) -> None:
+        db = SessionLocal()
+        try:
+            while True:
+                entries = self.queue.get_batch(self.batch_size, timeout=0.5)
+                if entries:
+                    self._run_batch(db, entries)
+                elif self._stop.is_set():
+                    break
+        finally:
+            db.close()
+            SessionLocal.remove()
+
+    def _run_batch(self, db, entries: List[Entry]) -> None:
+        # Nothing may escape: an exception here would end the worker thread
+        try:
+            self._process(db, entries)
+        except QueueFull as e:
+            print(f"{e}; dropping them (their payloads are in the raw archive)")
+            DROPPED.inc(len(e.entries), reason='queue_full')
+        except Exception as e:
+            print(f"An error occurred while processing {len(entries)} webhook submissions: {e}")
+            db.rollback()
+
+    def _process(self, db, entries: List[Entry]) -> None:
+        try:
+            # Archived before mapping, so payloads the mapping rejects are kept too
+            archive_records(db, [entry[1] for entry in entries])
+        except Exception as e:
+            print(f"Archiving {len(entries)} webhook submissions failed: {e}")
+
+        items, valid = [], []
+        for entry in entries:
+            try:
+                items.append(self.transform(entry[1]))
+                valid.append(entry)
+            except Exception as e:
+                # A payload that cannot be mapped will not get better on retry
+                print(f"Discarding webhook submission {entry[1].get('_id')}: {e}")
+                self.queue.discard([entry])
+                DROPPED.inc(reason='invalid')
+
+        try:
+            write_batch(db, items, on_conflict='update')
+            self.queue.ack(valid)
+            return
+        except Exception as e:
+            print(f"Webhook batch insert failed, falling back to per-submission inserts: {e}")
+
+        failed = []
+        for entry, item in zip(valid, items):
+            try:
+                write_batch(db, [item], on_conflict='update')
+                self.queue.ack([entry])
+            except Exception as e:
+                print(f"An error occurred while saving webhook submission {entry[1].get('_id')}: {e}")
+                failed.append(entry)
+
+        dead = [entry for entry in failed if entry[2] + 1 >= self.max_attempts]
+        self.queue.discard(dead)
+        if dead:
+            DROPPED.inc(len(dead), reason='max_attempts')
+        self.queue.retry([entry for entry in failed if entry[2] + 1 < self.max_attempts])
@@ -1,117 +1,165 @@
 # app/webhook/webhook_endpoint.py
 
-from fastapi import FastAPI, Request, HTTPException, Depends
-from sqlalchemy.orm import Session
-from app.database.db_connection import SessionLocal
+import os
+from fastapi import FastAPI, Request, Response, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.async_db_connection import get_async_db, get_async_engine
+from app.database.db_connection import SessionLocal, engine, pool_stats
 from app.database.models import KoboSubmission, Client, BusinessInfo, SurveyMetadata
-from app.schemas import KoboSubmissionSchema, ClientSchema, BusinessInfoSchema, SurveyMetadataSchema  # Import Pydantic schemas
+from app.database.writer import write_batch
+from app.database.queries import SubmissionQuery
+from app.database.raw_archive import archive_records
+from app.database import stats
+from app.database.stats import stats_statement, stats_row
+from app.database import ingest_events
+from app.utils.field_mapping import transform_record
+from app.api import export
+from app.utils.fast_json import FastJSONResponse, dumps, loads, row_fields, row_to_dict
+from app.utils.response_cache import ResponseCache, ResponseCacheMiddleware
+from app.utils import metrics
+from app.utils.metrics import MetricsMiddleware
+from app.api.pipeline import QUEUE_DEPTH
+from app.webhook.ingest_queue import MemoryQueue, SpoolQueue, IngestWorkers, QueueFull
+from app.webhook.coalescer import Coalescer
+from app.schemas import KoboSubmissionSchema, KoboSubmissionDetailSchema, ClientSchema, BusinessInfoSchema, SurveyMetadataSchema  # Import Pydantic schemas
 from uuid import UUID
 import datetime
-from typing import List
+import threading
+from typing import List, Optional
 
-app = FastAPI()
+# Responses are rendered with orjson when it is installed
+app = FastAPI(default_response_class=FastJSONResponse)
 
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# 'sync' writes each delivery before answering; 'coalesce' also answers after
+# the write, but shares one transaction between concurrent deliveries; 'queue'
+# answers 202 once the delivery is queued and background workers write it in
+# micro-batches
+WEBHOOK_MODE = os.getenv("WEBHOOK_MODE", "sync")
+# SQLite file for a durable queue; without it deliveries are queued in memory
+WEBHOOK_SPOOL_PATH = os.getenv("WEBHOOK_SPOOL_PATH")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 2))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", 100))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 10000))
+# Longest a delivery waits for others to share its transaction in 'coalesce' mode
+WEBHOOK_COALESCE_MS = float(os.getenv("WEBHOOK_COALESCE_MS", 20))
+# 'rows' serializes listed submissions straight from the database rows;
+# 'pydantic' validates every row through its response schema first
+API_SERIALIZER = os.getenv("API_SERIALIZER", "rows")
+# Responses of the read endpoints kept in memory (0 disables the cache) and
+# the longest a response is served from it; ingests invalidate them sooner
+API_CACHE_SIZE = int(os.getenv("API_CACHE_SIZE", 256))
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", 30))
+CACHED_PATHS = ("/submissions", "/submissions/full", "/stats")
+
+# Every committed ingest drops the cached responses of its forms; on PostgreSQL
+# ingests of other processes (the pull job) arrive through LISTEN/NOTIFY
+response_cache = ResponseCache(API_CACHE_SIZE, API_CACHE_TTL)
+ingest_events.subscribe(response_cache.invalidate)
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache, paths=CACHED_PATHS)
+ingest_listener = None
+# Rebuilds the rollup slices queued by ingests (of any process) for /stats
+stats_refresher = None
+
+# Added last, so it is the outermost middleware and times cache hits as well
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+
+# One export at a time; a second request gets 409 instead of exporting the same rows again
+export_lock = threading.Lock()
+
+ingest_queue = None
+ingest_workers = None
+coalescer = Coalescer(WEBHOOK_BATCH_SIZE, WEBHOOK_COALESCE_MS)
+
+def start_ingest_workers():
+    """
+    Creates the webhook queue and starts the workers draining it.
+    """
+    global ingest_queue, ingest_workers
+    ingest_queue = SpoolQueue(WEBHOOK_SPOOL_PATH) if WEBHOOK_SPOOL_PATH else MemoryQueue(WEBHOOK_QUEUE_SIZE)
+    ingest_workers = IngestWorkers(ingest_queue, transform_record, WEBHOOK_WORKERS, WEBHOOK_BATCH_SIZE)
+    ingest_workers.start()
+
+def collect_queue_depth():
+    if ingest_queue is not None:
+        QUEUE_DEPTH.set(ingest_queue.qsize(), queue='webhook')
+
+metrics.REGISTRY.add_collector(collect_queue_depth)
+
+def stop_ingest_workers():
+    if ingest_workers is not None:
+        ingest_workers.stop()
+
+@app.on_event("startup")
+def on_startup():
+    global ingest_listener, stats_refresher
+    if WEBHOOK_MODE == "queue":
+        start_ingest_workers()
+    if stats.STATS_INCREMENTAL and stats.STATS_REFRESH_INTERVAL > 0:
+        stats_refresher = stats.StatsRefresher(SessionLocal, stats.STATS_REFRESH_INTERVAL)
+        stats_refresher.start()
+    if response_cache.enabled and engine.dialect.name == "postgresql":
+        ingest_listener = ingest_events.NotificationListener(engine)
+        ingest_listener.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await coalescer.close()
+    stop_ingest_workers()
+    if ingest_listener is not None:
+        ingest_listener.stop(timeout=5)
+    if stats_refresher is not None:
+        stats_refresher.stop(timeout=30)
 
 @app.post("/webhook")
-async def webhook_endpoint(request: Request, db: Session = Depends(get_db)):
+async def webhook_endpoint(request: Request, db: AsyncSession = Depends(get_async_db)):
     try:
-        payload = await request.json()
-        print(f"Received webhook data: {payload}")
-
-        # Extract data from payload
-        submission_data = payload
-        client_data = submission_data
-        business_info_data = submission_data
-        survey_metadata_data = submission_data
-
-        # Log extracted data for verification
-        print(f"Submission Data: {submission_data}")
-        print(f"Client Data: {client_data}")
-        print(f"Business Info Data: {business_info_data}")
-        print(f"Survey Metadata Data: {survey_metadata_data}")
-
-        # Create KoboSubmission instance
-        new_submission = KoboSubmission(
-            _id=submission_data.get("_id"),
-            form_uuid=UUID(submission_data.get("formhub/uuid")) if submission_data.get("formhub/uuid") else None,
-            instance_id=UUID(submission_data.get("meta/instanceID")) if submission_data.get("meta/instanceID") else None,
-            submission_time=submission_data.get("_submission_time") or datetime.datetime.now(),
-            start_time=submission_data.get("starttime") or datetime.datetime.now(),
-            end_time=submission_data.get("endtime") or datetime.datetime.now(),
-            survey_date=submission_data.get("cd_survey_date") or datetime.date.today(),
-            _geolocation=str(submission_data.get("_geolocation")),
-            _status=submission_data.get("_status"),
-            _tags=str(submission_data.get("_tags")),
-            _notes=str(submission_data.get("_notes")),
-            _validation_status=str(submission_data.get("_validation_status")),
-            _submitted_by=submission_data.get("_submitted_by"),
-            version=submission_data.get("__version__")
-        )
-        
-        db.add(new_submission)
-        db.commit()
-        db.refresh(new_submission)  # Refresh to get the ID
-        print("New submission saved successfully")
-
-        # Create and associate Client instance
-        if client_data:
-            new_client = Client(
-                unique_id=client_data.get("sec_a/unique_id"),
-                client_name=client_data.get("sec_c/cd_client_name"),
-                client_id_manifest=client_data.get("sec_c/cd_client_id_manifest"),
-                location=client_data.get("sec_c/cd_location"),
-                client_phone=client_data.get("sec_c/cd_clients_phone"),
-                alt_phone=client_data.get("sec_c/cd_phoneno_alt_number"),
-                phone_type=client_data.get("sec_c/cd_clients_phone_smart_feature"),
-                gender=client_data.get("sec_c/cd_gender"),
-                age=client_data.get("sec_c/cd_age"),
-                nationality=client_data.get("sec_c/cd_nationality"),
-                strata=client_data.get("sec_c/cd_strata"),
-                disability=True if client_data.get("sec_c/cd_disability") == "Yes" else False,
-                education=client_data.get("sec_c/cd_education"),
-                client_status=client_data.get("sec_c/cd_client_status"),
-                sole_income_earner=True if client_data.get("sec_c/cd_sole_income_earner") == "Yes" else False,
-                responsible_people=int(client_data.get("sec_c/cd_howrespble_pple")),
-                submission_id=new_submission.id  # Associate with submission
-            )
-            db.add(new_client)
-            db.commit()
-            print("Client data saved successfully")
-
-        # Create and associate BusinessInfo instance
-        if business_info_data:
-            new_business_info = BusinessInfo(
-                country_name=business_info_data.get("sec_a/cd_biz_country_name"),
-                region_name=business_info_data.get("sec_a/cd_biz_region_name"),
-                bda_name=business_info_data.get("sec_b/bda_name"),
-                cohort=business_info_data.get("sec_b/cd_cohort"),
-                program=business_info_data.get("sec_b/cd_program"),
-                biz_status=business_info_data.get("group_mx5fl16/cd_biz_status"),
-                biz_operating=True if business_info_data.get("group_mx5fl16/bd_biz_operating") == "yes" else False,
-                submission_id=new_submission.id  # Associate with submission
-            )
-            db.add(new_business_info)
-            db.commit()
-            print("BusinessInfo data saved successfully")
-
-        # Create and associate SurveyMetadata instance
-        if survey_metadata_data:
-            new_survey_metadata = SurveyMetadata(
-                form_uuid=UUID(survey_metadata_data.get("formhub/uuid")) if survey_metadata_data.get("formhub/uuid") else None,
-                instance_id=UUID(survey_metadata_data.get("meta/instanceID")) if survey_metadata_data.get("meta/instanceID") else None,
-                form_version=survey_metadata_data.get("__version__"),
-                submission_id=new_submission.id  # Associate with submission
-            )
-            db.add(new_survey_metadata)
-            db.commit()
-            print("SurveyMetadata data saved successfully")
+        payload = loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body must be JSON")
+    if not isinstance(payload, dict) or not isinstance(payload.get("_id"), int):
+        raise HTTPException(status_code=422, detail="Payload must be a submission object with an integer _id")
+
+    if WEBHOOK_MODE == "queue":
+        try:
+            await run_in_threadpool(ingest_queue.put, payload)
+        except QueueFull:
+            # Kobo retries failed deliveries, so shed load instead of buffering without bound
+            raise HTTPException(status_code=503, detail="Webhook queue is full")
+        return JSONResponse(status_code=202, content={"status": "accepted", "message": "Webhook data received and queued"})
+
+    if WEBHOOK_MODE == "coalesce":
+        try:
+            item = transform_record(payload)
+        except (KeyError, TypeError, ValueError) as e:
+            # Archived anyway, so it can be replayed once the mapping accepts it
+            await db.run_sync(archive_records, [payload])
+            raise HTTPException(status_code=422, detail=f"Invalid submission: {e}")
+        try:
+            await coalescer.submit(item, payload)
+        except Exception as e:
+            print(f"An error occurred while saving submission {payload['_id']}: {e}")
+            raise HTTPException(status_code=500, detail="Internal Server Error")
+        return {"status": "success", "message": "Webhook data received and saved"}
+
+    try:
+        # Keep the payload as received, also when the mapping rejects it
+        await db.run_sync(archive_records, [payload])
+    except Exception as e:
+        print(f"An error occurred while archiving submission {payload['_id']}: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    try:
+        item = transform_record(payload)
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid submission: {e}")
+
+    try:
+        # Upsert all four rows in one transaction, so Kobo retrying a delivery
+        # updates the stored submission instead of failing on its unique _id
+        await db.run_sync(write_batch, [item], "update")
 
         return {"status": "success", "message": "Webhook data received and saved"}
 
@@ -119,13 +167,157 @@ async def webhook_endpoint(request: Request, db: Session = Depends(get_db)):
         print(f"An error occurred: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-# GET endpoint to retrieve all submissions
+# Dependency parsing the filters and cursor shared by the submission list endpoints
+def submission_query(
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (default 100; NDJSON streams everything if omitted)"),
+    after: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    order_by: str = Query("id", pattern="^(id|submission_time)$"),
+    since: Optional[datetime.datetime] = Query(None, description="Submitted at or after"),
+    until: Optional[datetime.datetime] = Query(None, description="Submitted before"),
+    form_uuid: Optional[UUID] = None,
+    status: Optional[str] = None,
+    version: Optional[str] = None,
+) -> SubmissionQuery:
+    try:
+        return SubmissionQuery(limit, after, order_by, since, until, form_uuid, status, version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Rows fetched per round trip while streaming NDJSON
+STREAM_CHUNK_SIZE = 1000
+
+# GET endpoint to retrieve submissions, one keyset-paginated page at a time
 @app.get("/submissions", response_model=List[KoboSubmissionSchema])
-def get_submissions(db: Session = Depends(get_db)):
+async def get_submissions(
+    response: Response,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    query: SubmissionQuery = Depends(submission_query),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await list_submissions(db, response, format, query, KoboSubmissionSchema)
+
+# GET endpoint to retrieve submissions together with their clients, business
+# infos and survey metadata; paginated and filtered like /submissions
+@app.get("/submissions/full", response_model=List[KoboSubmissionDetailSchema])
+async def get_full_submissions(
+    response: Response,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    query: SubmissionQuery = Depends(submission_query),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await list_submissions(db, response, format, query, KoboSubmissionDetailSchema, with_children=True)
+
+def column_statement(query: SubmissionQuery, schema):
+    # Only the schema's columns, as plain rows: no ORM objects are built for the page
+    return query.statement().with_only_columns(*(getattr(KoboSubmission, name) for name, _ in row_fields(schema)))
+
+async def list_submissions(db: AsyncSession, response: Response, format: str, query: SubmissionQuery,
+                           schema, with_children: bool = False):
+    if format == "ndjson":
+        return StreamingResponse(stream_submissions(db, query, schema, with_children), media_type="application/x-ndjson")
+
+    try:
+        if query.limit is None:
+            query.limit = 100
+        if API_SERIALIZER == "rows" and not with_children:
+            submissions = (await db.execute(column_statement(query, schema))).all()
+        else:
+            submissions = (await db.scalars(query.statement(with_children))).all()
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    next_cursor = query.next_cursor(submissions)
+    if API_SERIALIZER == "rows":
+        fields = row_fields(schema)
+        return FastJSONResponse([row_to_dict(submission, fields) for submission in submissions],
+                                headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return submissions
+
+async def stream_submissions(db: AsyncSession, query: SubmissionQuery, schema, with_children: bool = False):
+    """
+    Yields matching submissions as NDJSON lines, reading them through a server-side cursor.
+    """
+    if API_SERIALIZER == "rows":
+        fields = row_fields(schema)
+        if with_children:
+            result = await db.stream_scalars(query.statement(True).execution_options(yield_per=STREAM_CHUNK_SIZE))
+        else:
+            result = await db.stream(column_statement(query, schema).execution_options(yield_per=STREAM_CHUNK_SIZE))
+        async for row in result:
+            yield dumps(row_to_dict(row, fields)) + b"\n"
+        return
+
+    stmt = query.statement(with_children).execution_options(yield_per=STREAM_CHUNK_SIZE)
+    result = await db.stream_scalars(stmt)
+    async for submission in result:
+        yield dumps(jsonable_encoder(schema.model_validate(submission, from_attributes=True))) + b"\n"
+
+def run_export(format: str):
+    db = SessionLocal()
+    try:
+        return export.export_tables(db, export.EXPORT_DIR, format, settle_seconds=export.EXPORT_SETTLE_SECONDS)
+    finally:
+        db.close()
+
+@app.post("/exports")
+async def create_export(format: str = Query(export.EXPORT_FORMAT, pattern="^(parquet|arrow|csv)$")):
+    """
+    Exports the submissions added since the last export; returns the new files, relative to /exports/.
+    """
+    if not export_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="An export is already running")
+    try:
+        return await run_in_threadpool(run_export, format)
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    finally:
+        export_lock.release()
+
+@app.get("/exports/{path:path}")
+def get_export_file(path: str):
+    root = os.path.realpath(export.EXPORT_DIR)
+    file_path = os.path.realpath(os.path.join(root, path))
+    if not file_path.startswith(root + os.sep) or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="Export file not found")
+    return FileResponse(file_path)
+
+# GET endpoint summing the daily rollups; reads one row per day and group, never the fact tables
+@app.get("/stats")
+async def get_stats(
+    by: str = Query("", description="Comma-separated columns to group by, e.g. region_name,cohort or gender,age_band"),
+    since: Optional[datetime.date] = Query(None, description="First day included"),
+    until: Optional[datetime.date] = Query(None, description="First day excluded"),
+    form_uuid: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        stmt = stats_statement([name.strip() for name in by.split(",") if name.strip()], since, until, form_uuid)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     try:
-        # Fetch all submissions from the database
-        submissions = db.query(KoboSubmission).all()
-        return submissions
+        return [stats_row(row) for row in (await db.execute(stmt)).all()]
     except Exception as e:
         print(f"An error occurred: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
+
+# Hit, miss, 304 and invalidation counts of the response cache
+@app.get("/cache/stats")
+def get_cache_stats():
+    return response_cache.stats()
+
+# Request latencies, ingest and pool metrics of this process in the Prometheus text format
+@app.get("/metrics")
+def get_metrics():
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+# Connection pool usage, to size DB_POOL_SIZE / DB_MAX_OVERFLOW per worker process
+@app.get("/db/pool")
+def get_pool_stats():
+    return {"async": pool_stats(get_async_engine()), "sync": pool_stats(engine)}
@@ -0,0 +1,92 @@
+# benchmarks/bench_data_quality.py
+"""
+Time to profile one form version of --rows submissions with app/database/data_quality.py.
+
+Usage:
+    python benchmarks/bench_data_quality.py [--rows 1000000] [--database-url URL]
+
+The synthetic rows are generated by the database (see bench_indexes.py), with
+missing values, a few categories and some implausible ages to flag.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_indexes import SOURCES
+
+FORM = "7"
+
+
+def load(conn, dialect, rows):
+    from sqlalchemy import text
+
+    sql = SOURCES[dialect]
+    uuid, ts, day = sql["uuid"], sql["time"], sql["date"]
+    conn.execute(text(f"""
+        INSERT INTO kobo_submissions
+            (id, _id, form_uuid, instance_id, submission_time, start_time, end_time, survey_date, _status, version)
+        SELECT n, n, {uuid.format(FORM)}, {uuid.format("n")}, {ts.format('n')}, {ts.format('n')}, {ts.format('n')},
+               {day.format('n')}, CASE WHEN n % 50 = 0 THEN NULL ELSE 'submitted_via_web' END, 'v1'
+        FROM ({sql["numbers"]}) AS numbers
+    """), {"rows": rows})
+    conn.execute(text(f"""
+        INSERT INTO clients (id, unique_id, client_name, gender, age, responsible_people, disability, submission_id)
+        SELECT n, 'SS' || n, 'Client ' || n, CASE WHEN n % 2 = 0 THEN 'Female' ELSE 'Male' END,
+               CASE WHEN n % 10 = 0 THEN NULL WHEN n % 997 = 0 THEN 150 ELSE 18 + n % 50 END,
+               n % 7, n % 3 = 0, n
+        FROM ({sql["numbers"]}) AS numbers
+    """), {"rows": rows})
+    conn.execute(text(f"""
+        INSERT INTO business_info (id, country_name, region_name, cohort, biz_operating, submission_id)
+        SELECT n, 'Country', 'Region ' || (n % 12), 'Cohort ' || (n % 4), n % 5 <> 0, n
+        FROM ({sql["numbers"]}) AS numbers
+    """), {"rows": rows})
+    conn.execute(text(f"""
+        INSERT INTO survey_metadata (id, form_uuid, instance_id, submission_id)
+        SELECT n, {uuid.format(FORM)}, {uuid.format("n")}, n FROM ({sql["numbers"]}) AS numbers
+    """), {"rows": rows})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["LOCAL_DATABASE_URL"] = database_url
+    os.environ["ENVIRONMENT"] = "development"
+
+    import logging
+    from sqlalchemy.orm import sessionmaker
+    from app.database.db_connection import Base, build_engine
+    from app.database.data_quality import format_report, store_reports
+
+    logging.disable(logging.INFO)
+    engine = build_engine(database_url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        load(conn, engine.dialect.name, args.rows)
+    print(f"loaded {args.rows} submissions (+3 child rows each) in {time.perf_counter() - started:.1f}s\n")
+
+    db = sessionmaker(bind=engine)()
+    try:
+        started = time.perf_counter()
+        reports = store_reports(db)
+        elapsed = time.perf_counter() - started
+        print(format_report(reports[0].report))
+    finally:
+        db.close()
+    print(f"\nprofiled {args.rows} submissions (4 tables) in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_export.py
+"""
+Export time and size of the normalized tables as CSV, Parquet and Arrow files.
+
+Usage:
+    python benchmarks/bench_export.py [--records 100000] [--chunk-size 50000] [--database-url URL]
+
+Each format is exported twice into its own directory: a full export of
+``--records`` submissions, then an incremental one after another 10% were
+added. Parquet and Arrow need pyarrow and are left out without it.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_store import make_record
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["LOCAL_DATABASE_URL"] = database_url
+    os.environ["ENVIRONMENT"] = "development"
+
+    import contextlib
+    import io
+    import logging
+    from sqlalchemy.orm import sessionmaker
+    from app.api import export
+    from app.api.kobo_client import batched, transform_or_skip, write_items
+    from app.database.db_connection import Base, build_engine
+
+    logging.disable(logging.INFO)
+    engine = build_engine(database_url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    def load(first, last):
+        for chunk in batched([make_record(i) for i in range(first, last + 1)], 5000):
+            write_items(db, [transform_or_skip(record) for record in chunk])
+
+    formats = ["csv"] + (["parquet", "arrow"] if export.pyarrow else [])
+    output_dirs = {format: tempfile.mkdtemp(prefix=f"export-{format}-") for format in formats}
+    extra = max(args.records // 10, 1)
+    try:
+        load(1, args.records)
+        for step, records in (("full", args.records), ("incremental", extra)):
+            if step == "incremental":
+                load(args.records + 1, args.records + extra)
+            for format in formats:
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    summary = export.export_tables(db, output_dirs[format], format, args.chunk_size,
+                                                   settle_seconds=0)
+                elapsed = time.perf_counter() - started
+                size = directory_size(output_dirs[format]) / 2 ** 20
+                print(f"{step:<12} {format:<8} {records:>8} submissions {elapsed:8.2f}s "
+                      f"{len(summary['files']):>4} files  {size:8.1f} MiB in total")
+    finally:
+        db.close()
+    if not export.pyarrow:
+        print("pyarrow is not installed; pip install pyarrow to compare Parquet and Arrow")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_fetch.py
+"""
+Serial vs parallel page fetching from a local mock Kobo API with added latency.
+
+Usage:
+    python benchmarks/bench_fetch.py [--records 5000] [--page-size 100] [--latency 0.05] [--workers 8]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_store import make_record
+from benchmarks.mock_kobo import serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every page")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    server, url = serve([make_record(i) for i in range(1, args.records + 1)], args.latency)
+    os.environ["KOBO_API_URL"] = url
+    os.environ.setdefault("LOCAL_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+    from app.api import kobo_client
+
+    runs = (
+        ("serial", lambda: kobo_client.fetch_data_from_kobo(page_size=args.page_size)),
+        (f"parallel ({args.workers})", lambda: kobo_client.fetch_data_from_kobo_parallel(
+            page_size=args.page_size, max_workers=args.workers)),
+    )
+    try:
+        orders = []
+        for name, fetch in runs:
+            started = time.perf_counter()
+            ids = [record["_id"] for record in fetch()]
+            elapsed = time.perf_counter() - started
+            orders.append(ids)
+            print(f"{name:<14} {len(ids):>8} records {elapsed:8.2f}s {len(ids) / elapsed:10.0f} records/sec")
+        print(f"same order: {orders[0] == orders[1]}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# benchmarks/bench_indexes.py
+"""
+Query plans and timings of the ingest and API access patterns without and with the schema indexes.
+
+Usage:
+    python benchmarks/bench_indexes.py [--rows 1000000] [--database-url URL]
+
+Loads a synthetic dataset (one client, business info and survey metadata row
+per submission), drops the indexes declared on the models, EXPLAINs every
+query, then recreates the indexes and EXPLAINs again. On PostgreSQL the tables
+live in a throwaway ``bench_indexes`` schema and timings come from
+``EXPLAIN (ANALYZE, BUFFERS)``; on SQLite (the default, a temporary file) the
+plan comes from ``EXPLAIN QUERY PLAN`` and the query is timed separately.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_SCHEMA = "bench_indexes"
+
+# Form uuids are derived from numbers above any row number; 1000 forms in total
+FORM_BASE = "1000000000"
+
+# Per-dialect SQL for the synthetic rows; n is the row number
+SOURCES = {
+    "postgresql": {
+        "numbers": "SELECT g AS n FROM generate_series(1, :rows) AS g",
+        "uuid": "md5(({})::text)::uuid",
+        "time": "timestamp '2023-01-01' + {} * interval '30 seconds'",
+        "date": "(date '2023-01-01' + ({} / 2880)::int)",
+        "json": "{}::jsonb",
+    },
+    "sqlite": {
+        "numbers": "WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :rows) SELECT n FROM seq",
+        "uuid": "printf('%032x', {})",
+        "time": "datetime('2023-01-01', '+' || ({} * 30) || ' seconds')",
+        "date": "date('2023-01-01', '+' || ({} / 2880) || ' days')",
+        "json": "{}",
+    },
+}
+
+
+def load(conn, dialect, prefix, rows):
+    from sqlalchemy import text
+
+    sql = SOURCES[dialect]
+    uuid, ts, day, json_value = sql["uuid"], sql["time"], sql["date"], sql["json"]
+    tags = "CASE WHEN n % 100 = 0 THEN '[\"flagged\"]' ELSE '[]' END"
+    conn.execute(text(f"""
+        INSERT INTO {prefix}kobo_submissions
+            (id, _id, form_uuid, instance_id, submission_time, start_time, end_time, survey_date,
+             _status, _tags, version)
+        SELECT n, n + 100000000, {uuid.format(FORM_BASE + " + n % 1000")}, {uuid.format("n")},
+               {ts.format('n')}, {ts.format('n')}, {ts.format('n')}, {day.format('n')},
+               'submitted_via_web', {json_value.format(tags)}, 'v1'
+        FROM ({sql["numbers"]}) AS numbers
+    """), {"rows": rows})
+    conn.execute(text(f"""
+        INSERT INTO {prefix}clients (id, unique_id, client_name, submission_id)
+        SELECT n, 'SS' || n, 'Client ' || n, n FROM ({sql["numbers"]}) AS numbers
+    """), {"rows": rows})
+    conn.execute(text(f"""
+        INSERT INTO {prefix}business_info (id, country_name, submission_id)
+        SELECT n, 'Country', n FROM ({sql["numbers"]}) AS numbers
+    """), {"rows": rows})
+    conn.execute(text(f"""
+        INSERT INTO {prefix}survey_metadata (id, form_uuid, instance_id, submission_id)
+        SELECT n, {uuid.format(FORM_BASE + " + n % 1000")}, {uuid.format("n")}, n
+        FROM ({sql["numbers"]}) AS numbers
+    """), {"rows": rows})
+
+
+def analyze(conn, prefix):
+    from sqlalchemy import text
+
+    for table in ("kobo_submissions", "clients", "business_info", "survey_metadata"):
+        conn.execute(text(f"ANALYZE {prefix}{table}"))
+
+
+def queries(prefix, dialect, rows):
+    """
+    (name, SQL, params) for the access patterns the indexes are meant for.
+    """
+    middle = rows // 2
+    page = list(range(middle, middle + 100))
+    sql = SOURCES[dialect]
+    after_time = sql["time"].format(middle)
+    patterns = [
+        ("children of one submission", f"SELECT * FROM {prefix}clients WHERE submission_id = :id", {"id": middle}),
+        ("eager load of a 100-row page", f"SELECT * FROM {prefix}survey_metadata WHERE submission_id IN :ids", {"ids": page}),
+        ("update-mode child delete", f"DELETE FROM {prefix}business_info WHERE submission_id IN :ids", {"ids": page}),
+        ("keyset page by submission_time", f"""
+            SELECT * FROM {prefix}kobo_submissions
+            WHERE submission_time > {after_time} OR (submission_time = {after_time} AND id > :id)
+            ORDER BY submission_time, id LIMIT 100""", {"id": middle}),
+        ("survey_date range", f"""
+            SELECT count(*) FROM {prefix}kobo_submissions
+            WHERE survey_date BETWEEN {sql["date"].format(middle)} AND {sql["date"].format(middle + 2880)}""", {}),
+        ("one form's submissions", f"""
+            SELECT count(*) FROM {prefix}kobo_submissions WHERE form_uuid = {sql["uuid"].format(FORM_BASE + " + 7")}""", {}),
+    ]
+    if dialect == "postgresql":
+        patterns.append(("tag containment", f"""
+            SELECT count(*) FROM {prefix}kobo_submissions WHERE _tags @> '["flagged"]'""", {}))
+    return patterns
+
+
+def scan_nodes(plan):
+    nodes = []
+    if "Scan" in plan["Node Type"]:
+        index = plan.get("Index Name")
+        nodes.append(f"{plan['Node Type']} using {index}" if index else plan["Node Type"])
+    for child in plan.get("Plans", []):
+        nodes += scan_nodes(child)
+    return nodes
+
+
+def explain(conn, dialect, sql, params):
+    """
+    Returns (milliseconds, plan summary); the statement's effects are rolled back.
+    """
+    from sqlalchemy import bindparam, text
+
+    def statement(prefix=""):
+        stmt = text(prefix + sql)
+        return stmt.bindparams(bindparam("ids", expanding=True)) if ":ids" in sql else stmt
+
+    transaction = conn.begin()
+    try:
+        if dialect == "postgresql":
+            plan = conn.execute(statement("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "), params).scalar()[0]
+            return plan["Execution Time"], ", ".join(scan_nodes(plan["Plan"]))
+        summary = "; ".join(row[-1] for row in conn.execute(statement("EXPLAIN QUERY PLAN "), params))
+        started = time.perf_counter()
+        result = conn.execute(statement(), params)
+        if result.returns_rows:
+            result.all()
+        return (time.perf_counter() - started) * 1000, summary
+    finally:
+        transaction.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["LOCAL_DATABASE_URL"] = database_url
+    os.environ["ENVIRONMENT"] = "development"
+
+    import logging
+    from sqlalchemy import text
+    from app.database.db_connection import Base, build_engine
+    import app.database.models  # noqa: F401
+
+    logging.disable(logging.INFO)
+    engine = build_engine(database_url)
+    dialect = engine.dialect.name
+    prefix = ""
+    if dialect == "postgresql":
+        prefix = f"{BENCH_SCHEMA}."
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {BENCH_SCHEMA}"))
+        engine = engine.execution_options(schema_translate_map={"public": BENCH_SCHEMA})
+
+    indexes = [
+        index for table in Base.metadata.sorted_tables for index in table.indexes
+        if dialect == "postgresql" or not index.dialect_kwargs.get("postgresql_using")
+    ]
+
+    try:
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            Base.metadata.create_all(conn)
+            for index in indexes:
+                index.drop(conn)
+            load(conn, dialect, prefix, args.rows)
+        with engine.begin() as conn:
+            analyze(conn, prefix)
+        print(f"loaded {args.rows} submissions (+3 child rows each) in {time.perf_counter() - started:.1f}s\n")
+
+        results = {}
+        with engine.connect() as conn:
+            for name, sql, params in queries(prefix, dialect, args.rows):
+                results[name] = [explain(conn, dialect, sql, params)]
+
+        with engine.begin() as conn:
+            for index in indexes:
+                index.create(conn)
+            analyze(conn, prefix)
+
+        with engine.connect() as conn:
+            for name, sql, params in queries(prefix, dialect, args.rows):
+                results[name].append(explain(conn, dialect, sql, params))
+
+        for name, ((before_ms, before_plan), (after_ms, after_plan)) in results.items():
+            print(f"{name:<32} {before_ms:10.2f}ms -> {after_ms:8.2f}ms  ({before_ms / max(after_ms, 1e-3):7.1f}x)")
+            print(f"    before: {before_plan}")
+            print(f"    after:  {after_plan}")
+    finally:
+        if dialect == "postgresql":
+            with build_engine(database_url).begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_metrics.py
+"""
+Overhead of the metrics instrumentation on the webhook and on batch writes.
+
+Usage:
+    python benchmarks/bench_metrics.py [--requests 300] [--records 10000] [--rounds 3] [--database-url URL]
+
+Runs the same work with the metrics registry enabled and disabled, alternating
+rounds and keeping the best CPU time of each (time.process_time) so noise
+does not favour either side. Also reports the cost of one histogram update.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_store import make_record
+
+
+async def post_all(app, payloads):
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        started = time.process_time()
+        for payload in payloads:
+            response = await client.post("/webhook", json=payload)
+            assert response.status_code == 200, response.text
+        return time.process_time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["LOCAL_DATABASE_URL"] = database_url
+    os.environ["ENVIRONMENT"] = "development"
+
+    import logging
+    from app.api.kobo_client import batched, transform_or_skip, write_items
+    from app.database.db_connection import Base, SessionLocal, engine
+    from app.utils import metrics
+    from app.webhook import webhook_endpoint
+
+    engine.echo = False
+    logging.disable(logging.INFO)
+    webhook_endpoint.response_cache.max_entries = 0
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    def write_records(first_id):
+        items = [transform_or_skip(make_record(i)) for i in range(first_id, first_id + args.records)]
+        db = SessionLocal()
+        try:
+            started = time.process_time()
+            for chunk in batched(items, 500):
+                write_items(db, chunk)
+            return time.process_time() - started
+        finally:
+            db.close()
+
+    best = {}
+    next_id = 1
+    for _ in range(args.rounds):
+        for enabled in (True, False):
+            metrics.REGISTRY.enabled = enabled
+            payloads = [make_record(i) for i in range(next_id, next_id + args.requests)]
+            webhook = asyncio.run(post_all(webhook_endpoint.app, payloads))
+            writes = write_records(next_id + args.requests)
+            next_id += args.requests + args.records
+            previous = best.get(enabled, (float('inf'), float('inf')))
+            best[enabled] = (min(previous[0], webhook), min(previous[1], writes))
+
+    for index, name, count in ((0, "webhook", args.requests), (1, "write_items", args.records)):
+        on, off = best[True][index], best[False][index]
+        print(f"{name:<12} metrics on {on / count * 1e6:8.1f}us/item  off {off / count * 1e6:8.1f}us/item  "
+              f"overhead {(on - off) / off * 100:+.1f}%")
+
+    metrics.REGISTRY.enabled = True
+    histogram = metrics.REGISTRY.histogram('bench_seconds', 'Benchmark histogram', ('table',))
+    seconds = min(timeit.repeat(lambda: histogram.observe(0.003, table='clients'), number=100000, repeat=3))
+    print(f"histogram observe: {seconds / 100000 * 1e9:.0f}ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_serialize.py
+"""
+CPU time per request of a 1,000-row page of the list endpoints under each serializer.
+
+Usage:
+    python benchmarks/bench_serialize.py [--rows 1000] [--requests 20] [--database-url URL]
+
+Compares validating every row through its Pydantic schema ('pydantic') with
+copying the schema's columns straight from the rows ('rows'), each rendered by
+the stdlib json module and by orjson (when it is installed). Requests go
+straight to the ASGI app; CPU time is measured with time.process_time, so it
+includes the database driver but not time spent waiting on the database.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_store import make_record
+
+
+async def get_all(app, path, params, requests):
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        # Warm up: connections, statement caches and schema introspection
+        response = await client.get(path, params=params)
+        assert response.status_code == 200, response.text
+        started = time.process_time()
+        for _ in range(requests):
+            response = await client.get(path, params=params)
+        elapsed = time.process_time() - started
+        return elapsed / requests, len(response.json())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["LOCAL_DATABASE_URL"] = database_url
+    os.environ["ENVIRONMENT"] = "development"
+
+    import logging
+    from app.api.kobo_client import batched, transform_or_skip, write_items
+    from app.database.db_connection import Base, SessionLocal, engine
+    from app.utils import fast_json
+    from app.webhook import webhook_endpoint
+
+    engine.echo = False
+    # Every request has to be computed, not served from the response cache
+    webhook_endpoint.response_cache.max_entries = 0
+    logging.disable(logging.INFO)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for chunk in batched([make_record(i) for i in range(1, args.rows + 1)], 500):
+            write_items(db, [transform_or_skip(record) for record in chunk])
+    finally:
+        db.close()
+
+    orjson = fast_json.orjson
+    encoders = (("json", None), ("orjson", orjson)) if orjson else (("json", None),)
+    params = {"limit": args.rows}
+    for path in ("/submissions", "/submissions/full"):
+        for serializer in ("pydantic", "rows"):
+            for encoder, module in encoders:
+                webhook_endpoint.API_SERIALIZER = serializer
+                fast_json.orjson = module
+                cpu, rows = asyncio.run(get_all(webhook_endpoint.app, path, params, args.requests))
+                print(f"{path:<18} {serializer:<8} {encoder:<6} {rows:>6} rows  {cpu * 1000:8.1f}ms CPU/request")
+    if not orjson:
+        print("orjson is not installed; pip install orjson to compare it")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/bench_store.py
+"""
+Records/sec of the per-record, batched and COPY (backfill) write paths of kobo_client.
+
+Usage:
+    python benchmarks/bench_store.py [--records 5000] [--batch-size 500] [--copy-batch-size 10000] [--database-url URL]
+
+Defaults to a throwaway SQLite file; pass a PostgreSQL URL to measure the real thing
+(on SQLite the COPY path falls back to batched inserts). Every run starts from empty tables.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_record(_id):
+    return {
+        "_id": _id,
+        "formhub/uuid": "a7eb959a-da4c-485b-8334-ee761ab1e4a7",
+        "meta/instanceID": f"uuid:5c59e249-b88e-4742-abb6-{_id:012d}",
+        "_submission_time": "2024-08-24T07:45:34",
+        "starttime": "2024-08-24T09:44:06.712+02:00",
+        "endtime": "2024-08-24T09:44:39.156+02:00",
+        "cd_survey_date": "2024-08-24",
+        "_geolocation": [None, None],
+        "_status": "submitted_via_web",
+        "_tags": [],
+        "_notes": [],
+        "_validation_status": {},
+        "_submitted_by": None,
+        "__version__": "vBfco72yRxvHQun3cF8HPK",
+        "sec_a/unique_id": f"SS{_id}",
+        "sec_c/cd_client_name": "Test Client",
+        "sec_c/cd_gender": "Female",
+        "sec_c/cd_age": 30,
+        "sec_c/cd_disability": "No",
+        "sec_c/cd_sole_income_earner": "Yes",
+        "sec_c/cd_howrespble_pple": "3",
+        "sec_a/cd_biz_country_name": "Test Country",
+        "sec_a/cd_biz_region_name": "Test Region",
+        "sec_b/cd_cohort": "Cohort 1",
+        "group_mx5fl16/bd_biz_operating": "yes",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--copy-batch-size", type=int, default=10000)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["LOCAL_DATABASE_URL"] = database_url
+    os.environ["ENVIRONMENT"] = "development"
+
+    from sqlalchemy.orm import sessionmaker
+    from app.database.db_connection import Base, build_engine
+    from app.api.kobo_client import batched, store_batch_to_db, store_data_to_db, transform_or_skip, write_items
+    from app.database.bulk_loader import copy_batch
+
+    engine = build_engine(database_url)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    records = [make_record(i) for i in range(1, args.records + 1)]
+
+    def per_record(db):
+        for record in records:
+            store_data_to_db(db, record)
+
+    def batch(db):
+        for chunk in batched(records, args.batch_size):
+            store_batch_to_db(db, chunk)
+
+    def copy(db):
+        for chunk in batched(records, args.copy_batch_size):
+            write_items(db, [transform_or_skip(record) for record in chunk], bulk_write=copy_batch)
+
+    runs = (
+        ("per-record", per_record),
+        (f"batched ({args.batch_size})", batch),
+        (f"copy ({args.copy_batch_size})", copy),
+    )
+    for name, run in runs:
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        db = Session()
+        try:
+            started = time.perf_counter()
+            run(db)
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+        print(f"{name:<20} {len(records):>8} records {elapsed:8.2f}s {len(records) / elapsed:10.0f} records/sec")
+
+
+if __name__ == "__main__":
+    main()
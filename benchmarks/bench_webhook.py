@@ -0,0 +1,98 @@
+# benchmarks/bench_webhook.py
+"""
+Webhook latency under concurrent load: synchronous writes, coalesced writes and a queue for background workers.
+
+Usage:
+    python benchmarks/bench_webhook.py [--requests 2000] [--concurrency 100] [--database-url URL]
+
+Requests go straight to the ASGI app (no network), so the numbers show the time
+each delivery spends in the app: waiting for the event loop and, in sync mode,
+for the database.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_store import make_record
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def post_all(app, payloads, concurrency):
+    import httpx
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def post(payload):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/webhook", json=payload)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code in (200, 202), response.text
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(payload) for payload in payloads))
+        return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["LOCAL_DATABASE_URL"] = database_url
+    os.environ["ENVIRONMENT"] = "development"
+
+    import contextlib
+    import io
+    import logging
+    from sqlalchemy import func, select
+    from app.database.db_connection import Base, SessionLocal, engine
+    from app.database.models import KoboSubmission
+    from app.webhook import webhook_endpoint
+
+    engine.echo = False
+    logging.disable(logging.INFO)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    for offset, mode in enumerate(("sync", "coalesce", "queue")):
+        payloads = [make_record(offset * args.requests + i) for i in range(1, args.requests + 1)]
+        webhook_endpoint.WEBHOOK_MODE = mode
+        if mode == "queue":
+            webhook_endpoint.start_ingest_workers()
+
+        # The endpoint prints every delivery; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies, elapsed = asyncio.run(post_all(webhook_endpoint.app, payloads, args.concurrency))
+            if mode == "queue":
+                webhook_endpoint.stop_ingest_workers()
+
+        db = SessionLocal()
+        stored = db.scalar(select(func.count()).select_from(KoboSubmission).where(KoboSubmission._id.in_([p["_id"] for p in payloads])))
+        db.close()
+
+        print(
+            f"{mode:<8} {len(latencies)} requests in {elapsed:6.2f}s "
+            f"({len(latencies) / elapsed:7.0f} req/s)  "
+            f"p50 {percentile(latencies, 0.50) * 1000:8.1f}ms  p99 {percentile(latencies, 0.99) * 1000:8.1f}ms  "
+            f"stored {stored}"
+        )
+
+
+if __name__ == "__main__":
+    main()
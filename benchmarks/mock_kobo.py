@@ -0,0 +1,57 @@
+# benchmarks/mock_kobo.py
+"""
+A local stand-in for the KoboToolbox data API used by the benchmarks.
+
+Serves ``/api/v2/assets/<uid>/data/`` with ``start``/``limit`` (or ``page_size``)
+pagination, a ``next`` link and ``count``, sleeping ``latency`` seconds per page.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+def make_handler(records, latency):
+    class KoboHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            limit = int(params.get("limit") or params.get("page_size") or 100)
+            start = int(params.get("start", 0))
+            time.sleep(latency)
+
+            page = records[start:start + limit]
+            next_url = None
+            if start + limit < len(records):
+                query = dict(params, start=start + limit, limit=limit)
+                query.pop("page_size", None)
+                next_url = f"http://{self.headers['Host']}{url.path}?{urlencode(query)}"
+
+            body = json.dumps({"count": len(records), "next": next_url, "results": page}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return KoboHandler
+
+
+def serve(records, latency=0.05):
+    """
+    Starts the mock API in a background thread.
+
+    Returns:
+        tuple: The server (call ``shutdown()`` when done) and its data URL.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(records, latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/v2/assets/bench/data/"
@@ -0,0 +1,53 @@
+# migrations/env.py
+
+from alembic import context
+
+from app.database.db_connection import DATABASE_URL, Base, build_engine
+from app.database.form_tables import FORM_TABLE_PREFIX
+import app.database.models  # noqa: F401  (registers the tables on Base.metadata)
+
+config = context.config
+target_metadata = Base.metadata
+
+
+def include_name(name, type_, parent_names):
+    # Tables generated from form definitions are managed by form_tables, not by migrations
+    return not (type_ == "table" and name.startswith(FORM_TABLE_PREFIX))
+
+
+def run_migrations_offline():
+    """
+    Emits the migration SQL to stdout instead of running it (``alembic upgrade head --sql``).
+    """
+    context.configure(url=DATABASE_URL, target_metadata=target_metadata, literal_binds=True,
+                      include_schemas=True, include_name=include_name)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        # SQLite cannot ALTER columns in place; rebuild the table instead
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # Callers (tests) may hand over an open connection
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        run_migrations(connection)
+        return
+    with build_engine(DATABASE_URL).connect() as connection:
+        run_migrations(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
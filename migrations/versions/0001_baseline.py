@@ -0,0 +1,111 @@
+"""Baseline: the tables as created by app/database/create_tables.py
+
+Databases created before migrations were introduced already have these
+tables; mark them with ``alembic stamp 0001`` and then ``alembic upgrade head``.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def schema():
+    # SQLite has no schemas; the app maps 'public' away for it as well
+    return None if op.get_bind().dialect.name == 'sqlite' else 'public'
+
+
+def upgrade() -> None:
+    s = schema()
+    parent = 'kobo_submissions.id' if s is None else 'public.kobo_submissions.id'
+
+    op.create_table(
+        'kobo_submissions',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('_id', sa.Integer(), nullable=False, unique=True),
+        sa.Column('form_uuid', sa.Uuid(), nullable=False),
+        sa.Column('instance_id', sa.Uuid(), nullable=False),
+        sa.Column('submission_time', sa.DateTime(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('survey_date', sa.Date(), nullable=False),
+        sa.Column('_geolocation', sa.JSON()),
+        sa.Column('_status', sa.String(50)),
+        sa.Column('_tags', sa.JSON()),
+        sa.Column('_notes', sa.JSON()),
+        sa.Column('_validation_status', sa.JSON()),
+        sa.Column('_submitted_by', sa.String(100)),
+        sa.Column('version', sa.String(50)),
+        schema=s,
+    )
+    op.create_table(
+        'clients',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('unique_id', sa.String(50), nullable=False, unique=True),
+        sa.Column('client_name', sa.String(100), nullable=False),
+        sa.Column('client_id_manifest', sa.String(50)),
+        sa.Column('location', sa.String(100)),
+        sa.Column('client_phone', sa.String(20)),
+        sa.Column('alt_phone', sa.String(20)),
+        sa.Column('phone_type', sa.String(50)),
+        sa.Column('gender', sa.String(10)),
+        sa.Column('age', sa.Integer()),
+        sa.Column('nationality', sa.String(50)),
+        sa.Column('strata', sa.String(100)),
+        sa.Column('disability', sa.Boolean()),
+        sa.Column('education', sa.String(100)),
+        sa.Column('client_status', sa.String(50)),
+        sa.Column('sole_income_earner', sa.Boolean()),
+        sa.Column('responsible_people', sa.Integer()),
+        sa.Column('submission_id', sa.Integer(), sa.ForeignKey(parent), nullable=False),
+        schema=s,
+    )
+    op.create_table(
+        'business_info',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('country_name', sa.String(100)),
+        sa.Column('region_name', sa.String(100)),
+        sa.Column('bda_name', sa.String(100)),
+        sa.Column('cohort', sa.String(50)),
+        sa.Column('program', sa.String(50)),
+        sa.Column('biz_status', sa.String(50)),
+        sa.Column('biz_operating', sa.Boolean()),
+        sa.Column('submission_id', sa.Integer(), sa.ForeignKey(parent), nullable=False),
+        schema=s,
+    )
+    op.create_table(
+        'survey_metadata',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('form_uuid', sa.Uuid(), nullable=False),
+        sa.Column('instance_id', sa.Uuid(), nullable=False),
+        sa.Column('form_version', sa.String(50)),
+        sa.Column('submission_id', sa.Integer(), sa.ForeignKey(parent), nullable=False),
+        schema=s,
+    )
+    op.create_table(
+        'sync_state',
+        sa.Column('form_uid', sa.String(100), primary_key=True),
+        sa.Column('last_submission_time', sa.DateTime()),
+        sa.Column('last_id', sa.Integer()),
+        sa.Column('resume_offset', sa.Integer()),
+        sa.Column('resume_query', sa.Text()),
+        sa.Column('updated_at', sa.DateTime()),
+        schema=s,
+    )
+
+
+def downgrade() -> None:
+    s = schema()
+    for table in ('sync_state', 'survey_metadata', 'business_info', 'clients', 'kobo_submissions'):
+        op.drop_table(table, schema=s)
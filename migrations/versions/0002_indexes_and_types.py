@@ -0,0 +1,93 @@
+"""Indexes for the ingest and query paths, BIGINT _id, JSONB, unique instance_id
+
+- B-tree indexes on the child tables' submission_id (joins, eager loads and
+  the child deletes of update-mode ingest), on (submission_time, id) for
+  keyset pagination and time ranges, and on survey_date and form_uuid.
+- Kobo submission ids are 64-bit; _id (and sync_state.last_id) become BIGINT.
+- On PostgreSQL the JSON columns become JSONB, with a GIN index on _tags.
+- instance_id is unique per Kobo submission; enforce it.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+JSON_COLUMNS = ('_geolocation', '_tags', '_notes', '_validation_status')
+
+# (index name, table, columns)
+INDEXES = (
+    ('ix_kobo_submissions_submission_time_id', 'kobo_submissions', ['submission_time', 'id']),
+    ('ix_kobo_submissions_survey_date', 'kobo_submissions', ['survey_date']),
+    ('ix_kobo_submissions_form_uuid', 'kobo_submissions', ['form_uuid']),
+    ('ix_clients_submission_id', 'clients', ['submission_id']),
+    ('ix_business_info_submission_id', 'business_info', ['submission_id']),
+    ('ix_survey_metadata_submission_id', 'survey_metadata', ['submission_id']),
+)
+
+
+def schema():
+    # SQLite has no schemas; the app maps 'public' away for it as well
+    return None if op.get_bind().dialect.name == 'sqlite' else 'public'
+
+
+def upgrade() -> None:
+    s = schema()
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+
+    table = 'kobo_submissions' if s is None else f'{s}.kobo_submissions'
+    duplicates = op.get_bind().execute(sa.text(
+        f"SELECT instance_id FROM {table} GROUP BY instance_id HAVING count(*) > 1 LIMIT 5"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(f"Duplicate instance_id values must be removed before upgrading: {duplicates}")
+
+    with op.batch_alter_table('kobo_submissions', schema=s) as batch:
+        batch.alter_column('_id', existing_type=sa.Integer(), type_=sa.BigInteger(), existing_nullable=False)
+        if postgresql:
+            for column in JSON_COLUMNS:
+                batch.alter_column(column, existing_type=sa.JSON(), type_=JSONB(),
+                                   postgresql_using=f'{column}::jsonb')
+        batch.create_unique_constraint('kobo_submissions_instance_id_key', ['instance_id'])
+
+    with op.batch_alter_table('sync_state', schema=s) as batch:
+        batch.alter_column('last_id', existing_type=sa.Integer(), type_=sa.BigInteger())
+
+    for name, table_name, columns in INDEXES:
+        op.create_index(name, table_name, columns, schema=s)
+    if postgresql:
+        op.create_index('ix_kobo_submissions_tags', 'kobo_submissions', ['_tags'], schema=s,
+                        postgresql_using='gin')
+
+
+def downgrade() -> None:
+    s = schema()
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+
+    if postgresql:
+        op.drop_index('ix_kobo_submissions_tags', table_name='kobo_submissions', schema=s)
+    for name, table_name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table_name, schema=s)
+
+    with op.batch_alter_table('sync_state', schema=s) as batch:
+        batch.alter_column('last_id', existing_type=sa.BigInteger(), type_=sa.Integer())
+
+    with op.batch_alter_table('kobo_submissions', schema=s) as batch:
+        batch.drop_constraint('kobo_submissions_instance_id_key', type_='unique')
+        if postgresql:
+            for column in JSON_COLUMNS:
+                batch.alter_column(column, existing_type=JSONB(), type_=sa.JSON(),
+                                   postgresql_using=f'{column}::json')
+        batch.alter_column('_id', existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=False)
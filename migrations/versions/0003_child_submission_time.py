@@ -0,0 +1,51 @@
+"""Copy submission_time onto the child tables
+
+The child tables carry their submission's submission_time so that, with
+DB_PARTITION_BY_MONTH, they can be partitioned by the same month as the
+submission. Existing rows are backfilled from kobo_submissions.
+
+Converting an existing unpartitioned database to partitioned tables is not
+done here: create the partitioned tables in a new database with
+create_tables.py and copy the data over.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHILD_TABLES = ('clients', 'business_info', 'survey_metadata')
+
+
+def schema():
+    # SQLite has no schemas; the app maps 'public' away for it as well
+    return None if op.get_bind().dialect.name == 'sqlite' else 'public'
+
+
+def upgrade() -> None:
+    s = schema()
+    prefix = '' if s is None else f'{s}.'
+    for table in CHILD_TABLES:
+        op.add_column(table, sa.Column('submission_time', sa.DateTime()), schema=s)
+        op.execute(
+            f"UPDATE {prefix}{table} SET submission_time = "
+            f"(SELECT submission_time FROM {prefix}kobo_submissions WHERE kobo_submissions.id = {table}.submission_id)"
+        )
+
+
+def downgrade() -> None:
+    s = schema()
+    for table in CHILD_TABLES:
+        with op.batch_alter_table(table, schema=s) as batch:
+            batch.drop_column('submission_time')
@@ -0,0 +1,52 @@
+"""Add the raw_submissions archive
+
+Every ingested payload is kept as received (JSONB on PostgreSQL), keyed by
+the Kobo _id, so the normalized tables can be rebuilt with app/api/replay.py
+instead of downloading everything from Kobo again.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def schema():
+    # SQLite has no schemas; the app maps 'public' away for it as well
+    return None if op.get_bind().dialect.name == 'sqlite' else 'public'
+
+
+def upgrade() -> None:
+    s = schema()
+    op.create_table(
+        'raw_submissions',
+        sa.Column('_id', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('instance_id', sa.String(length=64), nullable=True),
+        sa.Column('form_uid', sa.String(length=100), nullable=True),
+        sa.Column('submission_time', sa.DateTime(), nullable=True),
+        sa.Column('payload', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('_id'),
+        schema=s,
+    )
+    op.create_index('ix_raw_submissions_instance_id', 'raw_submissions', ['instance_id'], schema=s)
+    op.create_index('ix_raw_submissions_form_uid_id', 'raw_submissions', ['form_uid', '_id'], schema=s)
+
+
+def downgrade() -> None:
+    s = schema()
+    op.drop_index('ix_raw_submissions_form_uid_id', table_name='raw_submissions', schema=s)
+    op.drop_index('ix_raw_submissions_instance_id', table_name='raw_submissions', schema=s)
+    op.drop_table('raw_submissions', schema=s)
@@ -0,0 +1,67 @@
+"""Add the daily rollup tables
+
+daily_submission_stats and daily_client_stats hold per-day counts for the
+dashboards and /stats. Ingest batches keep them up to date; fill them for
+existing data with python app/database/stats.py.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def schema():
+    # SQLite has no schemas; the app maps 'public' away for it as well
+    return None if op.get_bind().dialect.name == 'sqlite' else 'public'
+
+
+def upgrade() -> None:
+    s = schema()
+    op.create_table(
+        'daily_submission_stats',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('form_uuid', sa.Uuid(), nullable=False),
+        sa.Column('country_name', sa.String(length=100), nullable=True),
+        sa.Column('region_name', sa.String(length=100), nullable=True),
+        sa.Column('cohort', sa.String(length=50), nullable=True),
+        sa.Column('program', sa.String(length=50), nullable=True),
+        sa.Column('submissions', sa.Integer(), nullable=False),
+        sa.Column('businesses', sa.Integer(), nullable=False),
+        sa.Column('businesses_operating', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        schema=s,
+    )
+    op.create_index('ix_daily_submission_stats_day', 'daily_submission_stats', ['day'], schema=s)
+    op.create_table(
+        'daily_client_stats',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('form_uuid', sa.Uuid(), nullable=False),
+        sa.Column('gender', sa.String(length=10), nullable=True),
+        sa.Column('age_band', sa.String(length=10), nullable=True),
+        sa.Column('clients', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        schema=s,
+    )
+    op.create_index('ix_daily_client_stats_day', 'daily_client_stats', ['day'], schema=s)
+
+
+def downgrade() -> None:
+    s = schema()
+    op.drop_index('ix_daily_client_stats_day', table_name='daily_client_stats', schema=s)
+    op.drop_table('daily_client_stats', schema=s)
+    op.drop_index('ix_daily_submission_stats_day', table_name='daily_submission_stats', schema=s)
+    op.drop_table('daily_submission_stats', schema=s)
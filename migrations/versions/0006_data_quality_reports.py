@@ -0,0 +1,50 @@
+"""Add data_quality_reports
+
+One row per profiling run and form version, with the column profile as JSON
+(see app/database/data_quality.py).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def schema():
+    # SQLite has no schemas; the app maps 'public' away for it as well
+    return None if op.get_bind().dialect.name == 'sqlite' else 'public'
+
+
+def upgrade() -> None:
+    s = schema()
+    op.create_table(
+        'data_quality_reports',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('form_uuid', sa.Uuid(), nullable=False),
+        sa.Column('version', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('submissions', sa.Integer(), nullable=False),
+        sa.Column('report', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        schema=s,
+    )
+    op.create_index('ix_data_quality_reports_form_version', 'data_quality_reports',
+                    ['form_uuid', 'version', 'created_at'], schema=s)
+
+
+def downgrade() -> None:
+    s = schema()
+    op.drop_index('ix_data_quality_reports_form_version', table_name='data_quality_reports', schema=s)
+    op.drop_table('data_quality_reports', schema=s)
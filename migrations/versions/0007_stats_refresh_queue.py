@@ -0,0 +1,42 @@
+"""Add stats_refresh_queue
+
+Ingests append the (form, day) slices of the daily rollups they changed; the
+refresher rebuilds those slices outside the ingest transactions (see
+app/database/stats.py).
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def schema():
+    # SQLite has no schemas; the app maps 'public' away for it as well
+    return None if op.get_bind().dialect.name == 'sqlite' else 'public'
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stats_refresh_queue',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('form_uuid', sa.Uuid(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        schema=schema(),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('stats_refresh_queue', schema=schema())
@@ -0,0 +1,42 @@
+"""Add kobo_submissions.updated_at
+
+The writers set it on every insert and update; incremental exports select
+the submissions changed since their cursor by (updated_at, id). Existing rows
+start from their submission time.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def schema():
+    # SQLite has no schemas; the app maps 'public' away for it as well
+    return None if op.get_bind().dialect.name == 'sqlite' else 'public'
+
+
+def upgrade() -> None:
+    s = schema()
+    prefix = '' if s is None else f'{s}.'
+    op.add_column('kobo_submissions', sa.Column('updated_at', sa.DateTime()), schema=s)
+    op.execute(f"UPDATE {prefix}kobo_submissions SET updated_at = submission_time")
+    op.create_index('ix_kobo_submissions_updated_at_id', 'kobo_submissions', ['updated_at', 'id'], schema=s)
+
+
+def downgrade() -> None:
+    s = schema()
+    op.drop_index('ix_kobo_submissions_updated_at_id', table_name='kobo_submissions', schema=s)
+    with op.batch_alter_table('kobo_submissions', schema=s) as batch:
+        batch.drop_column('updated_at')
@@ -0,0 +1,91 @@
+# tests/conftest.py
+
+import os
+import tempfile
+
+import pytest
+
+# The app builds its engine at import time; fall back to a throwaway SQLite
+# database when no local database is configured.
+os.environ.setdefault(
+    "LOCAL_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'kobo_test.db')}",
+)
+
+
+def make_record(_id):
+    return {
+        "_id": _id,
+        "formhub/uuid": "a7eb959a-da4c-485b-8334-ee761ab1e4a7",
+        "meta/instanceID": f"uuid:5c59e249-b88e-4742-abb6-{_id:012d}",
+        "_submission_time": "2024-08-24T07:45:34",
+        "starttime": "2024-08-24T09:44:06.712+02:00",
+        "endtime": "2024-08-24T09:44:39.156+02:00",
+        "cd_survey_date": "2024-08-24",
+        "_geolocation": [None, None],
+        "_status": "submitted_via_web",
+        "_tags": [],
+        "_notes": [],
+        "_validation_status": {},
+        "_submitted_by": None,
+        "__version__": "vBfco72yRxvHQun3cF8HPK",
+        "sec_a/unique_id": f"SS{_id}",
+        "sec_c/cd_client_name": "Test Client",
+        "sec_c/cd_gender": "Male",
+        "sec_c/cd_age": 30,
+        "sec_c/cd_disability": "No",
+        "sec_c/cd_sole_income_earner": "Yes",
+        "sec_c/cd_howrespble_pple": "3",
+        "sec_a/cd_biz_country_name": "Test Country",
+        "sec_a/cd_biz_region_name": "Test Region",
+        "group_mx5fl16/bd_biz_operating": "yes",
+    }
+
+
+class FlakySession:
+    """Returns the given status codes in turn, then a page of results."""
+
+    def __init__(self, statuses, headers=None):
+        self.statuses = list(statuses)
+        self.headers = headers or {}
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        import requests
+
+        self.calls += 1
+        response = requests.Response()
+        response.status_code = self.statuses.pop(0) if self.statuses else 200
+        response.headers.update(self.headers if response.status_code != 200 else {})
+        response._content = b'{"count": 1, "next": null, "results": [{"_id": 1}]}'
+        return response
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    # A file rather than :memory: so pipeline threads see the same database
+    return f"sqlite:///{tmp_path / 'kobo.db'}"
+
+
+@pytest.fixture
+def engine(database_url):
+    from app.database.db_connection import build_engine
+
+    engine = build_engine(database_url)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    from sqlalchemy.orm import sessionmaker
+    from app.database.db_connection import Base
+
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
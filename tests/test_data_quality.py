@@ -0,0 +1,49 @@
+# tests/test_data_quality.py
+
+import pytest
+from app.api.kobo_client import transform_or_skip, write_items
+from app.database.data_quality import format_report, latest_report, store_reports
+from tests.conftest import make_record
+
+
+def store(db, version, ages):
+    records = []
+    for _id, age in ages.items():
+        record = dict(make_record(_id), __version__=version)
+        record["sec_c/cd_age"] = age
+        records.append(record)
+    write_items(db, [transform_or_skip(record) for record in records])
+
+
+def test_reports_profile_each_form_version(db):
+    ages = {_id: 30 + _id % 5 for _id in range(1, 41)}
+    ages.update({41: None, 42: None, 43: 150})
+    store(db, "v1", ages)
+    store(db, "v2", {101: 25, 102: 26})
+
+    reports = {report.version: report for report in store_reports(db)}
+
+    assert sorted(reports) == ["v1", "v2"]
+    clients = reports["v1"].report["tables"]["clients"]
+    assert clients["rows"] == 43
+    age = clients["columns"]["age"]
+    assert (age["nulls"], age["distinct"], age["min"], age["max"]) == (2, 6, 30, 150)
+    assert sum(bin["count"] for bin in age["histogram"]) == 41
+    assert age["histogram"][-1] == {"low": pytest.approx(138), "high": 150, "count": 1}
+    assert age["outliers"]["examples"] == age["invalid"]["examples"] == [43]
+    gender = clients["columns"]["gender"]
+    assert gender["histogram"] == [{"value": "Male", "count": 43}]
+    assert "histogram" not in clients["columns"]["unique_id"]
+    assert reports["v2"].report["tables"]["kobo_submissions"]["rows"] == 2
+
+    assert latest_report(db, reports["v1"].form_uuid, "v1").id == reports["v1"].id
+    assert "1 invalid" in format_report(reports["v1"].report)
+
+
+def test_single_version_is_profiled_without_filters(db):
+    store(db, "v1", {1: 20, 2: None})
+
+    report, = store_reports(db, version="v1")
+
+    assert report.submissions == 2
+    assert report.report["tables"]["clients"]["columns"]["age"]["null_rate"] == 0.5
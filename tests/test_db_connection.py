@@ -0,0 +1,52 @@
+# tests/test_db_connection.py
+
+import pytest
+from sqlalchemy import exc, text
+from app.database.db_connection import build_engine, engine_options, pool_stats, TimedQueuePool
+
+
+def test_engine_options_for_postgres(monkeypatch):
+    from app.database import db_connection
+
+    monkeypatch.setattr(db_connection, "DB_STATEMENT_TIMEOUT_MS", 5000)
+    options = engine_options("postgresql://user:secret@db/kobo")
+
+    assert options["echo"] is False
+    assert options["poolclass"] is TimedQueuePool
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+    assert engine_options("postgresql://db/kobo", async_driver=True)["connect_args"] == {
+        "server_settings": {"statement_timeout": "5000"}
+    }
+
+
+def test_pool_stats_track_checkouts(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_size=2, max_overflow=0)
+
+    with engine.connect() as first, engine.connect() as second:
+        first.execute(text("SELECT 1"))
+        stats = pool_stats(engine)
+        assert (stats["checked_out"], stats["size"]) == (2, 2)
+
+    stats = pool_stats(engine)
+    assert (stats["checked_out"], stats["idle"], stats["checkouts"]) == (0, 2, 2)
+    engine.dispose()
+
+
+def test_pool_stats_count_only_checkout_timeouts(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_size=1, max_overflow=0,
+                          pool_timeout=0.05)
+    with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    assert pool_stats(engine)["timeouts"] == 1
+
+    def refuse():
+        raise ConnectionRefusedError("database is down")
+
+    engine.pool._creator = refuse
+    engine.pool.dispose()
+    with pytest.raises(ConnectionRefusedError):
+        engine.pool.connect()
+    assert pool_stats(engine)["timeouts"] == 1
+    engine.dispose()
@@ -0,0 +1,93 @@
+# tests/test_export.py
+
+import csv
+import glob
+import os
+import pytest
+from app.api.export import export_tables
+from app.api.kobo_client import transform_or_skip, write_items
+from tests.conftest import make_record
+
+
+def store(db, ids, submission_time="2024-08-24T07:45:34", on_conflict="skip", **fields):
+    records = [dict(make_record(_id), _submission_time=submission_time, **fields) for _id in ids]
+    write_items(db, [transform_or_skip(record) for record in records], on_conflict)
+
+
+def read_csv(output_dir, table):
+    rows = []
+    for path in sorted(glob.glob(os.path.join(output_dir, table, "*", "*", "*.csv"))):
+        with open(path, newline="") as f:
+            rows += list(csv.DictReader(f))
+    return rows
+
+
+def test_export_is_partitioned_and_incremental(db, tmp_path):
+    output_dir = str(tmp_path / "exports")
+    store(db, range(1, 4))
+    store(db, [4], submission_time="2024-09-02T10:00:00")
+
+    first = export_tables(db, output_dir, "csv", chunk_size=2, settle_seconds=0)
+    assert first["rows"] == {"kobo_submissions": 4, "clients": 4, "business_info": 4, "survey_metadata": 4}
+    months = sorted(path.split(os.sep)[-2] for path in first["files"] if path.startswith("kobo_submissions"))
+    assert months == ["month=2024-08", "month=2024-09"]
+
+    assert export_tables(db, output_dir, "csv", settle_seconds=0)["files"] == []
+
+    store(db, [5, 6], submission_time="2024-09-03T10:00:00")
+    second = export_tables(db, output_dir, "csv", settle_seconds=0)
+    assert second["rows"]["kobo_submissions"] == 2
+    assert len([path for path in second["files"] if path.startswith("kobo_submissions")]) == 1
+
+    submissions = read_csv(output_dir, "kobo_submissions")
+    assert sorted(int(row["_id"]) for row in submissions) == [1, 2, 3, 4, 5, 6]
+    assert sorted(row["client_name"] for row in read_csv(output_dir, "clients")) == ["Test Client"] * 6
+    assert not glob.glob(os.path.join(output_dir, "**", "*.tmp"), recursive=True)
+
+
+def test_export_follows_updates_and_waits_for_recent_changes(db, tmp_path):
+    output_dir = str(tmp_path / "exports")
+    store(db, range(1, 4))
+
+    # Too recent: a transaction that started earlier could still commit older changes
+    assert export_tables(db, output_dir, "csv", settle_seconds=3600)["files"] == []
+    assert export_tables(db, output_dir, "csv", settle_seconds=0)["rows"]["kobo_submissions"] == 3
+
+    store(db, [2], on_conflict="update", **{"sec_c/cd_client_name": "Renamed Client"})
+    second = export_tables(db, output_dir, "csv", settle_seconds=0)
+
+    assert second["run"] == 2
+    assert second["rows"] == {"kobo_submissions": 1, "clients": 1, "business_info": 1, "survey_metadata": 1}
+    assert sorted(row["client_name"] for row in read_csv(output_dir, "clients")) == (
+        ["Renamed Client"] + ["Test Client"] * 3)
+
+
+def test_parquet_export_reads_back_as_a_dataset(db, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    output_dir = str(tmp_path / "exports")
+    store(db, range(1, 6))
+
+    export_tables(db, output_dir, "parquet", chunk_size=2, settle_seconds=0)
+
+    table = pq.read_table(os.path.join(output_dir, "kobo_submissions"))
+    assert sorted(table.column("_id").to_pylist()) == [1, 2, 3, 4, 5]
+    assert set(table.column("month").to_pylist()) == {"2024-08"}
+
+
+def test_export_endpoint_writes_and_serves_files(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    from app.api import export
+    from app.webhook.webhook_endpoint import app
+
+    monkeypatch.setattr(export, "EXPORT_DIR", str(tmp_path / "exports"))
+    monkeypatch.setattr(export, "EXPORT_SETTLE_SECONDS", 0)
+    client = TestClient(app)
+    assert client.post("/webhook", json=make_record(960001)).status_code == 200
+
+    response = client.post("/exports", params={"format": "csv"})
+    assert response.status_code == 200
+    path = next(path for path in response.json()["files"] if path.startswith("kobo_submissions"))
+
+    download = client.get(f"/exports/{path}")
+    assert download.status_code == 200 and "960001" in download.text
+    assert client.get("/exports/../export.db").status_code == 404
@@ -0,0 +1,39 @@
+# tests/test_field_mapping.py
+
+import pytest
+from app.utils.field_mapping import transform_record
+from tests.conftest import make_record
+
+
+def test_transform_normalizes_values_for_both_ingest_paths():
+    record = make_record(1)
+    record["group_mx5fl16/bd_biz_operating"] = "Yes"
+    record["sec_c/cd_disability"] = "yes"
+
+    item = transform_record(record)
+
+    assert item["client"]["responsible_people"] == 3
+    assert item["client"]["disability"] is True
+    assert item["business_info"]["biz_operating"] is True
+    # JSON columns keep the payload's structures instead of their str()
+    assert item["submission"]["_geolocation"] == [None, None]
+    assert item["submission"]["_validation_status"] == {}
+
+
+def test_transform_optional_rows_and_defaults():
+    record = make_record(2)
+    del record["sec_a/unique_id"], record["sec_a/cd_biz_country_name"], record["starttime"]
+
+    item = transform_record(record)
+
+    assert item["client"] is None and item["business_info"] is None
+    assert item["submission"]["start_time"] is not None
+
+
+def test_transform_rejects_invalid_records():
+    record = make_record(3)
+    record["formhub/uuid"] = "not-a-uuid"
+    with pytest.raises(ValueError):
+        transform_record(record)
+    with pytest.raises(KeyError):
+        transform_record({"formhub/uuid": "a7eb959a-da4c-485b-8334-ee761ab1e4a7"})
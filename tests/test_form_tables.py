@@ -0,0 +1,178 @@
+# tests/test_form_tables.py
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+from app.database.form_tables import FormSchema, describe_asset, load_form_schema
+
+ASSET = {
+    "uid": "aFormUid123",
+    "deployed_version_id": "v1",
+    "content": {
+        "survey": [
+            {"type": "start", "name": "starttime"},
+            {"type": "note", "name": "intro"},
+            {"type": "begin_group", "name": "sec_a"},
+            {"type": "text", "name": "unique_id"},
+            {"type": "integer", "name": "age"},
+            {"type": "end_group"},
+            {"type": "begin_group", "name": "sec_b"},
+            {"type": "text", "name": "age"},
+            {"type": "select_multiple", "name": "crops", "select_from_list_name": "crops"},
+            {"type": "begin_repeat", "name": "household"},
+            {"type": "text", "name": "member_name"},
+            {"type": "decimal", "name": "income"},
+            {"type": "begin_repeat", "name": "visits"},
+            {"type": "date", "name": "visit_date"},
+            {"type": "end_repeat"},
+            {"type": "end_repeat"},
+            {"type": "end_group"},
+        ]
+    },
+}
+
+
+def make_record(_id, members=2):
+    return {
+        "_id": _id,
+        "_submission_time": "2024-08-24T07:45:34",
+        "__version__": "v1",
+        "_tags": ["flagged"],
+        "_xform_id_string": "aFormUid123",
+        "starttime": "2024-08-24T09:44:06.712+02:00",
+        "sec_a/unique_id": f"SS{_id}",
+        "sec_a/age": "31",
+        "sec_b/age": "thirty",
+        "sec_b/crops": "maize beans",
+        "sec_b/new_question": "added after the schema",
+        "sec_b/household": [
+            {
+                "sec_b/household/member_name": f"Member {index}",
+                "sec_b/household/income": "12.5",
+                "sec_b/household/visits": [{"sec_b/household/visits/visit_date": "2024-08-0%d" % (index + 1)}],
+            }
+            for index in range(members)
+        ],
+    }
+
+
+@pytest.fixture
+def form():
+    return FormSchema(describe_asset(ASSET))
+
+
+@pytest.fixture
+def db(engine, form):
+    form.create_tables(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def count(db, table):
+    return db.scalar(select(func.count()).select_from(table))
+
+
+def test_describe_asset_maps_groups_repeats_and_types():
+    table = describe_asset(ASSET)["table"]
+
+    assert table["name"] == "kobo_form_aformuid123"
+    assert table["columns"] == [
+        ["starttime", "starttime", "datetime"],
+        ["unique_id", "sec_a/unique_id", "text"],
+        ["age", "sec_a/age", "integer"],
+        # The second 'age' is prefixed with its group
+        ["sec_b__age", "sec_b/age", "text"],
+        ["crops", "sec_b/crops", "text"],
+    ]
+    household, = table["children"]
+    assert household["name"] == "kobo_form_aformuid123__household"
+    assert household["path"] == "sec_b/household"
+    assert household["children"][0]["columns"] == [["visit_date", "sec_b/household/visits/visit_date", "date"]]
+
+
+def test_describe_asset_rejects_unbalanced_groups():
+    with pytest.raises(ValueError):
+        describe_asset({"uid": "x", "content": {"survey": [{"type": "begin_group", "name": "g"}]}})
+
+
+def test_transform_keeps_unmapped_fields(form):
+    item = form.transform(make_record(1))
+
+    assert item["submission"]["age"] == 31
+    assert item["submission"]["_unmapped"] == {"sec_b/new_question": "added after the schema"}
+    entries = item["repeats"]["kobo_form_aformuid123__household"]
+    assert [entry["row"]["income"] for entry in entries] == [12.5, 12.5]
+    assert entries[0]["repeats"]["kobo_form_aformuid123__visits"][0]["row"]["visit_date"].day == 1
+
+
+def test_write_batch_links_repeats_and_replaces_them_on_update(db, form):
+    tables = form.tables
+    households = tables["kobo_form_aformuid123__household"]
+    visits = tables["kobo_form_aformuid123__visits"]
+
+    assert form.write_batch(db, [form.transform(make_record(1)), form.transform(make_record(2))]) == 2
+    assert None not in db.scalars(select(tables["kobo_form_aformuid123"].c.updated_at)).all()
+    assert count(db, households) == 4
+    assert count(db, visits) == 4
+    # Skipping an already stored submission leaves its rows alone
+    assert form.write_batch(db, [form.transform(make_record(1, members=1))]) == 0
+    assert count(db, households) == 4
+
+    assert form.write_batch(db, [form.transform(make_record(1, members=1))], "update") == 1
+    assert count(db, households) == 3
+    assert count(db, visits) == 3
+    parents = db.execute(select(visits.c.parent_id)).scalars().all()
+    assert set(parents) <= set(db.execute(select(households.c.id)).scalars().all())
+
+
+def test_create_tables_adds_columns_of_a_new_version(db, form):
+    asset = dict(ASSET, deployed_version_id="v2")
+    asset["content"] = {"survey": ASSET["content"]["survey"] + [{"type": "integer", "name": "score"}]}
+    newer = FormSchema(describe_asset(asset))
+
+    assert newer.create_tables(db.get_bind()) == ["kobo_form_aformuid123.score"]
+    record = dict(make_record(3), score="7")
+    assert newer.write_batch(db, [newer.transform(record)]) == 1
+    assert db.scalar(select(newer.tables["kobo_form_aformuid123"].c.score)) == 7
+
+
+def test_load_form_schema_is_cached_per_version(tmp_path):
+    fetched = []
+
+    def fetch():
+        fetched.append(1)
+        return ASSET
+
+    schema = load_form_schema("aFormUid123", fetch=fetch, cache_dir=str(tmp_path))
+    assert schema.version == "v1"
+    assert load_form_schema("aFormUid123", "v1", cache_dir=str(tmp_path)) is schema
+    assert len(fetched) == 1
+    assert (tmp_path / "aformuid123-v1.json").exists()
+    with pytest.raises(LookupError):
+        load_form_schema("aFormUid123", "v0", cache_dir=str(tmp_path))
+
+
+def test_load_form_schema_fetches_only_when_the_version_changes(monkeypatch, tmp_path):
+    from app.database import form_tables
+
+    assets = [dict(ASSET, uid="aFormUid456")]
+    fetched = []
+
+    def fetch():
+        fetched.append(assets[-1]["deployed_version_id"])
+        return assets[-1]
+
+    assert load_form_schema("aFormUid456", fetch=fetch, cache_dir=str(tmp_path)).version == "v1"
+    # A restart finds the latest version in the cache
+    monkeypatch.setattr(form_tables, "_loaded_schemas", {})
+    assert load_form_schema("aFormUid456", fetch=fetch, cache_dir=str(tmp_path)).version == "v1"
+    assert fetched == ["v1"]
+
+    # Records of a new version: the asset is fetched once, and its version becomes the latest
+    assets.append(dict(assets[0], deployed_version_id="v2"))
+    assert load_form_schema("aFormUid456", "v2", fetch=fetch, cache_dir=str(tmp_path)).version == "v2"
+    assert load_form_schema("aFormUid456", fetch=fetch, cache_dir=str(tmp_path)).version == "v2"
+    assert fetched == ["v1", "v2"]
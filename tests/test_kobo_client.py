@@ -0,0 +1,311 @@
+# tests/test_kobo_client.py
+
+import os
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+from app.database.db_connection import Base, SessionLocal, build_engine
+from app.database.models import KoboSubmission, Client, BusinessInfo, SurveyMetadata
+from app.api import kobo_client
+from app.api.kobo_client import batched, store_batch_to_db
+from benchmarks.mock_kobo import serve
+from app.api.sync_state import form_uid_from_url, get_sync_state, build_query, advance_sync_state
+from tests.conftest import FlakySession, make_record
+
+
+def count(db, model):
+    return db.scalar(select(func.count()).select_from(model))
+
+
+def test_batched_groups_records():
+    assert [len(batch) for batch in batched(range(7), 3)] == [3, 3, 1]
+
+
+def test_store_batch_writes_all_tables(db):
+    inserted = store_batch_to_db(db, [make_record(i) for i in range(1, 11)])
+
+    assert inserted == 10
+    for model in (KoboSubmission, Client, BusinessInfo, SurveyMetadata):
+        assert count(db, model) == 10
+
+    submission = db.scalars(select(KoboSubmission).where(KoboSubmission._id == 7)).one()
+    assert submission.clients[0].unique_id == "SS7"
+    assert submission.business_infos[0].biz_operating is True
+    assert submission.survey_metadatas[0].form_version == "vBfco72yRxvHQun3cF8HPK"
+
+
+def test_store_batch_skips_duplicates(db):
+    store_batch_to_db(db, [make_record(1), make_record(2)])
+    inserted = store_batch_to_db(db, [make_record(2), make_record(3), make_record(3)])
+
+    assert inserted == 1
+    assert count(db, KoboSubmission) == 3
+    assert count(db, Client) == 3
+
+
+def test_store_batch_update_mode_resyncs_in_place(db):
+    store_batch_to_db(db, [make_record(1), make_record(2)], on_conflict="update")
+
+    changed = make_record(2)
+    changed["_status"] = "approved"
+    changed["sec_c/cd_client_name"] = "Renamed Client"
+    stored = store_batch_to_db(db, [changed, make_record(3)], on_conflict="update")
+
+    assert stored == 2
+    assert count(db, KoboSubmission) == 3
+    assert count(db, Client) == 3
+    assert count(db, SurveyMetadata) == 3
+    submission = db.scalars(select(KoboSubmission).where(KoboSubmission._id == 2)).one()
+    assert submission._status == "approved"
+    assert [c.client_name for c in submission.clients] == ["Renamed Client"]
+
+
+@pytest.mark.parametrize("on_conflict, name", [("skip", "First Name"), ("update", "Second Name")])
+def test_store_batch_writes_a_repeated_client_once(db, on_conflict, name):
+    first, second = make_record(11), make_record(12)
+    for record, client_name in ((first, "First Name"), (second, "Second Name")):
+        record["sec_a/unique_id"] = "SS-shared"
+        record["sec_c/cd_client_name"] = client_name
+
+    assert store_batch_to_db(db, [first, second], on_conflict=on_conflict) == 2
+
+    assert [client.client_name for client in db.scalars(select(Client))] == [name]
+
+
+def test_store_batch_replay_is_idempotent(db):
+    records = [make_record(i) for i in range(1, 6)]
+    for on_conflict in ("skip", "update", "skip"):
+        store_batch_to_db(db, records, on_conflict=on_conflict)
+
+    for model in (KoboSubmission, Client, BusinessInfo, SurveyMetadata):
+        assert count(db, model) == 5
+
+
+def test_form_uid_from_url():
+    url = "https://kf.kobotoolbox.org/api/v2/assets/aBc123XyZ/data/?format=json"
+    assert form_uid_from_url(url) == "aBc123XyZ"
+
+
+def test_sync_state_advances_and_builds_query(db):
+    assert build_query(get_sync_state(db, "form")) is None
+
+    newer = make_record(9)
+    newer["_submission_time"] = "2024-08-25T10:00:00"
+    advance_sync_state(db, "form", [make_record(3), newer, make_record(4)])
+    # An older batch never moves the cursor backwards
+    advance_sync_state(db, "form", [make_record(5)])
+
+    state = get_sync_state(db, "form")
+    assert (state.last_submission_time.isoformat(), state.last_id) == ("2024-08-25T10:00:00", 9)
+    assert '"$gt": "2024-08-25T10:00:00"' in build_query(state)
+
+
+def test_parallel_fetch_matches_serial_order(monkeypatch):
+    server, url = serve([make_record(i) for i in range(1, 251)], latency=0)
+    monkeypatch.setattr(kobo_client, "KOBO_API_URL", url)
+    try:
+        serial = [r["_id"] for r in kobo_client.fetch_data_from_kobo(page_size=20)]
+        parallel = [r["_id"] for r in kobo_client.fetch_data_from_kobo_parallel(page_size=20, max_workers=4)]
+    finally:
+        server.shutdown()
+
+    assert serial == parallel == list(range(1, 251))
+
+
+def test_pipeline_writes_every_batch(db):
+    from app.api.kobo_client import transform_or_skip, write_items
+    from app.api.pipeline import Pipeline
+
+    pipeline = Pipeline(transform_or_skip, lambda records, items: write_items(db, items),
+                        batch_size=7, queue_size=5, report_interval=0)
+    stats = pipeline.run(make_record(i) for i in range(1, 51))
+
+    assert (stats.fetch.count, stats.transform.count, stats.write.count) == (50, 50, 50)
+    assert count(db, KoboSubmission) == 50
+
+
+def test_pipeline_stops_on_writer_error():
+    from app.api.pipeline import Pipeline
+
+    def fail(records, items):
+        raise RuntimeError("database is down")
+
+    pipeline = Pipeline(lambda record: record, fail, batch_size=10, queue_size=5, report_interval=0)
+    with pytest.raises(RuntimeError, match="database is down"):
+        # An endless source: only the error can end the run
+        pipeline.run(make_record(i) for i in iter(int, 1))
+
+
+def test_fetch_retries_and_honors_retry_after(monkeypatch):
+    delays = []
+    monkeypatch.setattr(kobo_client.time, "sleep", delays.append)
+    monkeypatch.setattr(kobo_client, "KOBO_API_URL", "https://kobo.example/api/v2/assets/form/data/")
+    session = FlakySession([429, 502], headers={"Retry-After": "7"})
+
+    records = list(kobo_client.fetch_data_from_kobo(session=session))
+
+    assert records == [{"_id": 1}]
+    assert session.calls == 3
+    assert delays == [7.0, 7.0]
+
+
+def test_fetch_raises_instead_of_truncating(monkeypatch):
+    import requests
+
+    monkeypatch.setattr(kobo_client.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(kobo_client, "KOBO_API_URL", "https://kobo.example/api/v2/assets/form/data/")
+    session = FlakySession([502] * 10)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        list(kobo_client.fetch_data_from_kobo(session=session))
+    assert session.calls == kobo_client.FETCH_RETRIES + 1
+
+
+def test_checkpoint_resumes_same_query_only(db):
+    from app.api.sync_state import resume_offset, clear_checkpoint
+
+    advance_sync_state(db, "form", [make_record(1)], query=None, offset=500)
+
+    state = get_sync_state(db, "form")
+    assert resume_offset(state, None) == 500
+    assert resume_offset(state, build_query(state)) == 0
+
+    clear_checkpoint(db, "form")
+    assert resume_offset(get_sync_state(db, "form"), None) == 0
+
+
+def test_child_rows_carry_submission_time(db):
+    store_batch_to_db(db, [make_record(61)])
+
+    submission = db.query(KoboSubmission).filter(KoboSubmission._id == 61).one()
+    assert db.query(BusinessInfo).filter(BusinessInfo.submission_id == submission.id).one().submission_time \
+        == submission.submission_time
+
+
+def test_copy_value_formats_for_copy_text():
+    import datetime
+    from app.database.bulk_loader import copy_value
+
+    assert copy_value(None) == "\\N"
+    assert copy_value(True) == "t"
+    assert copy_value("a\tb\nc\\d") == "a\\tb\\nc\\\\d"
+    assert copy_value([None, None], is_json=True) == "[null, null]"
+    assert copy_value("[]", is_json=True) == '"[]"'
+    aware = datetime.datetime(2024, 8, 24, 9, 44, 6, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+    assert copy_value(aware) == "2024-08-24T07:44:06"
+
+
+def test_copy_batch_falls_back_to_batched_inserts_on_sqlite(db):
+    from app.database.bulk_loader import copy_batch
+
+    items = [kobo_client.transform_record(make_record(_id)) for _id in (71, 72, 72)]
+    assert copy_batch(db, items) == 2
+    for model in (KoboSubmission, Client, BusinessInfo, SurveyMetadata):
+        assert count(db, model) == 2
+
+
+@pytest.mark.skipif(not os.getenv("LOCAL_DATABASE_URL_TEST", "").startswith("postgres"),
+                    reason="COPY needs PostgreSQL (set LOCAL_DATABASE_URL_TEST)")
+@pytest.mark.parametrize("on_conflict", ["skip", "update"])
+def test_copy_batch_stages_a_repeated_id_once(on_conflict):
+    from sqlalchemy import delete
+    from app.database.bulk_loader import copy_batch
+
+    engine = build_engine(os.environ["LOCAL_DATABASE_URL_TEST"])
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    ids = (960071, 960072)
+    try:
+        items = [kobo_client.transform_record(make_record(_id)) for _id in (ids[0], ids[1], ids[1])]
+        assert copy_batch(session, items, on_conflict) == 2
+
+        submission_ids = select(KoboSubmission.id).where(KoboSubmission._id.in_(ids))
+        for model in (Client, BusinessInfo, SurveyMetadata):
+            assert session.scalar(select(func.count()).select_from(model)
+                                  .where(model.submission_id.in_(submission_ids))) == 2
+    finally:
+        session.rollback()
+        submission_ids = select(KoboSubmission.id).where(KoboSubmission._id.in_(ids))
+        for model in (Client, BusinessInfo, SurveyMetadata):
+            session.execute(delete(model).where(model.submission_id.in_(submission_ids)))
+        session.execute(delete(KoboSubmission).where(KoboSubmission._id.in_(ids)))
+        session.commit()
+        session.close()
+        engine.dispose()
+
+
+def test_cursor_stays_before_a_record_that_failed_to_store(monkeypatch):
+    from app.database.writer import write_batch
+
+    def failing_write(db, items, on_conflict="skip"):
+        if any(item["submission"]["_id"] == 995006 for item in items):
+            raise ValueError("bad record")
+        return write_batch(db, items, on_conflict)
+
+    monkeypatch.setattr(kobo_client, "write_batch", failing_write)
+    server, url = serve([make_record(_id) for _id in range(995001, 995011)], latency=0)
+    url = url.replace("/bench/", "/cursorFail/")
+    try:
+        assert kobo_client.process_and_store_data(batch_size=4, url=url, max_workers=1, pipelined=False) == (10, 9)
+        db = SessionLocal()
+        try:
+            # 995006 failed in the second batch: the cursor stays on 995005 for the rest of the run
+            assert get_sync_state(db, "cursorFail").last_id == 995005
+        finally:
+            db.close()
+
+        monkeypatch.setattr(kobo_client, "write_batch", write_batch)
+        kobo_client.process_and_store_data(batch_size=4, url=url, max_workers=1, pipelined=False)
+    finally:
+        server.shutdown()
+
+    db = SessionLocal()
+    try:
+        assert db.scalars(select(KoboSubmission).where(KoboSubmission._id == 995006)).first() is not None
+        assert get_sync_state(db, "cursorFail").last_id == 995010
+    finally:
+        db.close()
+
+
+def test_crash_after_a_failed_record_resumes_before_it(monkeypatch):
+    from app.database.writer import write_batch
+
+    def failing_write(db, items, on_conflict="skip"):
+        if any(item["submission"]["_id"] == 996001 for item in items):
+            raise ValueError("bad record")
+        return write_batch(db, items, on_conflict)
+
+    fetch = kobo_client.fetch_data_from_kobo
+
+    def crashing_fetch(**kwargs):
+        for index, record in enumerate(fetch(**kwargs)):
+            if index == 9:
+                raise RuntimeError("killed")
+            yield record
+
+    monkeypatch.setattr(kobo_client, "write_batch", failing_write)
+    monkeypatch.setattr(kobo_client, "fetch_data_from_kobo", crashing_fetch)
+    server, url = serve([make_record(_id) for _id in range(996001, 996011)], latency=0)
+    url = url.replace("/bench/", "/cursorCrash/")
+    try:
+        with pytest.raises(RuntimeError, match="killed"):
+            kobo_client.process_and_store_data(batch_size=4, url=url, max_workers=1, pipelined=False)
+        db = SessionLocal()
+        try:
+            # A later batch was written, but the checkpoint stayed on the failed record
+            assert get_sync_state(db, "cursorCrash").resume_offset == 0
+        finally:
+            db.close()
+
+        monkeypatch.setattr(kobo_client, "write_batch", write_batch)
+        monkeypatch.setattr(kobo_client, "fetch_data_from_kobo", fetch)
+        assert kobo_client.process_and_store_data(batch_size=4, url=url, max_workers=1, pipelined=False)[0] == 10
+    finally:
+        server.shutdown()
+
+    db = SessionLocal()
+    try:
+        assert db.scalars(select(KoboSubmission).where(KoboSubmission._id == 996001)).first() is not None
+        assert get_sync_state(db, "cursorCrash").last_id == 996010
+    finally:
+        db.close()
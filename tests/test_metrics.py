@@ -0,0 +1,88 @@
+# tests/test_metrics.py
+
+import pytest
+from fastapi.testclient import TestClient
+from app.api import kobo_client
+from app.api.kobo_client import store_batch_to_db
+from app.database import writer
+from app.utils.metrics import Registry
+from app.webhook.webhook_endpoint import app
+from tests.conftest import FlakySession, make_record
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry(enabled=True)
+    requests = registry.counter("requests_total", "Requests", ("path",))
+    depth = registry.gauge("queue_depth", "Queue depth")
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+
+    requests.inc(path='/a"b')
+    requests.inc(2, path='/a"b')
+    depth.set(4)
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{path="/a\\"b"} 3' in lines
+    assert "queue_depth 4" in lines
+    # Buckets are cumulative and include their upper bound
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_count 4" in lines
+    assert latency.snapshot() == (4, 3.65)
+
+
+def test_registry_rejects_conflicting_metrics_and_skips_updates_when_disabled():
+    registry = Registry(enabled=True)
+    counter = registry.counter("events_total", "Events", ("kind",))
+
+    assert registry.counter("events_total", "Events", ("kind",)) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("events_total", "Events")
+    with pytest.raises(ValueError):
+        counter.inc(other="label")
+
+    registry.enabled = False
+    counter.inc(kind="a")
+    assert counter.value(kind="a") == 0
+
+
+def test_writer_records_batch_sizes_and_insert_timings(db):
+    batches, items = writer.WRITE_BATCH_SIZE.snapshot(writer='insert')
+    inserts, _ = writer.INSERT_SECONDS.snapshot(table='clients')
+
+    store_batch_to_db(db, [make_record(i) for i in range(1, 26)])
+
+    assert writer.WRITE_BATCH_SIZE.snapshot(writer='insert') == (batches + 1, items + 25)
+    assert writer.INSERT_SECONDS.snapshot(table='clients')[0] == inserts + 1
+
+
+def test_fetch_counts_retries_and_request_latency(monkeypatch):
+    monkeypatch.setattr(kobo_client.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(kobo_client, "KOBO_API_URL", "https://kobo.example/api/v2/assets/form/data/")
+    retries = kobo_client.FETCH_RETRY_COUNT.value(reason=502)
+    requests, _ = kobo_client.FETCH_SECONDS.snapshot(status=200)
+
+    list(kobo_client.fetch_data_from_kobo(session=FlakySession([502, 502])))
+
+    assert kobo_client.FETCH_RETRY_COUNT.value(reason=502) == retries + 2
+    assert kobo_client.FETCH_SECONDS.snapshot(status=200)[0] == requests + 1
+    assert kobo_client.metrics_summary().startswith("[metrics] records")
+
+
+def test_metrics_endpoint_exposes_request_latency_by_route():
+    client = TestClient(app)
+    assert client.post("/webhook", json=make_record(991001)).status_code == 200
+    client.get("/exports/missing.csv")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="POST",route="/webhook",status="200"}' in body
+    assert 'route="/exports/{path:path}",status="404"' in body
+    assert 'kobo_db_insert_seconds_count{table="kobo_submissions"}' in body
+    assert 'kobo_db_pool_connections{engine="sync",state="checked_out"}' in body
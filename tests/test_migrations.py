@@ -0,0 +1,41 @@
+# tests/test_migrations.py
+
+import os
+from sqlalchemy import BigInteger, inspect
+
+from alembic import command
+from alembic.config import Config
+
+from app.database.db_connection import build_engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(engine, *args):
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        getattr(command, args[0])(config, *args[1:])
+
+
+def test_migrations_upgrade_and_downgrade(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+
+    run(engine, "upgrade", "head")
+    inspector = inspect(engine)
+    submission_indexes = {index["name"] for index in inspector.get_indexes("kobo_submissions")}
+    assert {"ix_kobo_submissions_submission_time_id", "ix_kobo_submissions_form_uuid",
+            "ix_kobo_submissions_survey_date", "ix_kobo_submissions_updated_at_id"} <= submission_indexes
+    for table in ("clients", "business_info", "survey_metadata"):
+        assert [index["column_names"] for index in inspector.get_indexes(table)] == [["submission_id"]]
+        assert "submission_time" in {column["name"] for column in inspector.get_columns(table)}
+    columns = {column["name"]: column for column in inspector.get_columns("kobo_submissions")}
+    assert isinstance(columns["_id"]["type"], BigInteger)
+    assert ["instance_id"] in [c["column_names"] for c in inspector.get_unique_constraints("kobo_submissions")]
+    assert {"_id", "instance_id", "payload"} <= {column["name"] for column in inspector.get_columns("raw_submissions")}
+    assert {"day", "region_name", "businesses_operating"} <= {column["name"] for column in inspector.get_columns("daily_submission_stats")}
+    assert {"form_uuid", "version", "report"} <= {column["name"] for column in inspector.get_columns("data_quality_reports")}
+    assert {"form_uuid", "day"} <= {column["name"] for column in inspector.get_columns("stats_refresh_queue")}
+
+    run(engine, "downgrade", "base")
+    assert inspect(engine).get_table_names() == ["alembic_version"]
@@ -0,0 +1,21 @@
+# tests/test_partitions.py
+
+import datetime
+from app.database.partitions import partition_months, partition_ddl, add_months
+
+
+def test_partition_months_cover_start_to_months_ahead():
+    months = partition_months(start="2024-11", months_ahead=2, today=datetime.date(2025, 1, 15))
+
+    assert months == [datetime.date(2024, 11, 1), datetime.date(2024, 12, 1), datetime.date(2025, 1, 1),
+                      datetime.date(2025, 2, 1), datetime.date(2025, 3, 1)]
+    assert partition_months(None, 0, today=datetime.date(2025, 1, 15)) == [datetime.date(2025, 1, 1)]
+    assert add_months(datetime.date(2024, 12, 1), 1) == datetime.date(2025, 1, 1)
+
+
+def test_partition_ddl():
+    assert partition_ddl("clients", datetime.date(2024, 12, 1)) == (
+        "CREATE TABLE IF NOT EXISTS public.clients_2024_12 PARTITION OF public.clients "
+        "FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')"
+    )
+    assert partition_ddl("clients", None).endswith("PARTITION OF public.clients DEFAULT")
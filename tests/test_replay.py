@@ -0,0 +1,47 @@
+# tests/test_replay.py
+
+import pytest
+from sqlalchemy import func, select
+from app.database.models import KoboSubmission, Client, RawSubmission
+from app.database.raw_archive import archive_records, raw_id_ranges
+from app.api.replay import replay
+from tests.conftest import make_record
+
+
+@pytest.fixture
+def database(database_url, db):
+    return database_url, db
+
+
+def count(db, model):
+    return db.scalar(select(func.count()).select_from(model))
+
+
+def test_archive_keeps_latest_payload_per_id(database):
+    _, db = database
+    edited = dict(make_record(1), **{"sec_c/cd_client_name": "Edited"})
+
+    assert archive_records(db, [make_record(1), make_record(2), edited], "form") == 2
+    assert archive_records(db, [{"no": "id"}]) == 0
+
+    assert count(db, RawSubmission) == 2
+    raw = db.get(RawSubmission, 1)
+    assert raw.payload["sec_c/cd_client_name"] == "Edited"
+    assert raw.form_uid == "form"
+    assert list(raw_id_ranges(db, 1)) == [(1, 1), (2, 2)]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_replay_rebuilds_tables_from_archive(database, workers):
+    url, db = database
+    invalid = dict(make_record(6), **{"formhub/uuid": "not-a-uuid"})
+    archive_records(db, [make_record(_id) for _id in range(1, 6)] + [invalid], "form")
+
+    assert replay(url, batch_size=2, workers=workers) == (6, 5)
+    assert count(db, KoboSubmission) == 5
+    assert count(db, Client) == 5
+
+    # Replaying again rewrites the same submissions instead of adding rows
+    assert replay(url, batch_size=4, workers=workers, after_id=2) == (4, 3)
+    assert count(db, KoboSubmission) == 5
+    assert count(db, Client) == 5
@@ -0,0 +1,78 @@
+# tests/test_response_cache.py
+
+import time
+from fastapi.testclient import TestClient
+from app.database.ingest_events import ALL_FORMS
+from app.utils.response_cache import ResponseCache
+from app.webhook import webhook_endpoint
+from app.webhook.webhook_endpoint import app
+from tests.conftest import make_record
+
+FORM_A = "a1eb959a-da4c-485b-8334-ee761ab1e4a7"
+FORM_B = "b2eb959a-da4c-485b-8334-ee761ab1e4a7"
+
+
+def put(cache, key, form_uuid=None):
+    return cache.put(key, 200, [], key.encode(), form_uuid, cache.generation(form_uuid))
+
+
+def test_cache_evicts_least_recently_used_and_expires():
+    cache = ResponseCache(max_entries=2, ttl=0.05)
+    put(cache, "one")
+    put(cache, "two")
+    cache.get("one")
+    put(cache, "three")
+
+    assert cache.get("two") is None
+    assert cache.get("one").body == b"one"
+    time.sleep(0.06)
+    assert cache.get("one") is None
+    assert (cache.counters["evictions"], cache.counters["expirations"]) == (1, 1)
+
+
+def test_cache_invalidates_per_form():
+    cache = ResponseCache(max_entries=10, ttl=60)
+    put(cache, "a", FORM_A)
+    put(cache, "b", FORM_B)
+    put(cache, "all")
+
+    cache.invalidate({FORM_A})
+    assert [cache.get(key) is not None for key in ("a", "b", "all")] == [False, True, False]
+
+    # A response computed before an ingest of its form is not stored
+    generation = cache.generation(FORM_B)
+    cache.invalidate({FORM_B})
+    cache.put("b", 200, [], b"stale", FORM_B, generation)
+    assert cache.get("b") is None
+
+    put(cache, "a", FORM_A)
+    cache.invalidate({ALL_FORMS})
+    assert cache.stats()["entries"] == 0
+
+
+def test_submissions_are_cached_until_the_form_ingests():
+    webhook_endpoint.response_cache.clear()
+    client = TestClient(app)
+    record = dict(make_record(980001), **{"formhub/uuid": FORM_A})
+    assert client.post("/webhook", json=record).status_code == 200
+    params = {"form_uuid": FORM_A}
+
+    first = client.get("/submissions", params=params)
+    second = client.get("/submissions", params=params)
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+    assert first.json() == second.json() and first.headers["ETag"] == second.headers["ETag"]
+
+    not_modified = client.get("/submissions", params=params, headers={"If-None-Match": first.headers["ETag"]})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+
+    # Another form's ingest keeps the entry; this form's drops it
+    assert client.post("/webhook", json=dict(make_record(980002), **{"formhub/uuid": FORM_B})).status_code == 200
+    assert client.get("/submissions", params=params).headers["X-Cache"] == "HIT"
+    assert client.post("/webhook", json=dict(make_record(980003), **{"formhub/uuid": FORM_A})).status_code == 200
+    fresh = client.get("/submissions", params=params, headers={"If-None-Match": first.headers["ETag"]})
+    assert fresh.status_code == 200 and fresh.headers["X-Cache"] == "MISS"
+    assert [row["id"] for row in fresh.json()][-1] > first.json()[-1]["id"]
+
+    assert client.get("/submissions", params={"format": "ndjson", **params}).headers.get("X-Cache") is None
+    stats = client.get("/cache/stats").json()
+    assert stats["hits"] >= 2 and stats["not_modified"] == 1 and stats["invalidations"] >= 1
@@ -0,0 +1,76 @@
+# tests/test_scheduler.py
+
+import time
+import threading
+import pytest
+from app.api.rate_limit import TokenBucket
+from app.api.scheduler import Scheduler, data_url, read_forms
+from app.api.sync_state import get_sync_state
+from app.database.db_connection import SessionLocal
+from benchmarks.mock_kobo import serve
+from tests.conftest import make_record
+
+
+def test_data_url_accepts_uids_and_urls():
+    assert data_url("aUid", "https://kf.example.org/") == "https://kf.example.org/api/v2/assets/aUid/data/"
+    url = "https://kf.example.org/api/v2/assets/other/data/"
+    assert data_url(url) == url
+
+
+def test_read_forms_merges_list_and_file(tmp_path):
+    forms_file = tmp_path / "forms.txt"
+    forms_file.write_text("aUid2  # second form\n\n# retired\naUid3\n")
+
+    assert read_forms("aUid1, ", str(forms_file)) == ["aUid1", "aUid2", "aUid3"]
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, burst=5)
+    started = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+
+    # 5 calls from the burst, then 10 at 50/s
+    assert time.monotonic() - started >= 0.18
+
+
+def test_scheduler_limits_concurrency_and_backs_off_failing_forms():
+    active, peak = [], []
+    lock = threading.Lock()
+
+    def sync(url, session, max_workers, **options):
+        with lock:
+            active.append(url)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.remove(url)
+        if "broken" in url:
+            raise RuntimeError("Kobo returned 500")
+        return 10, 4
+
+    forms = [data_url(form, "https://kf.example.org") for form in ("form1", "form2", "form3", "broken")]
+    metrics = Scheduler(forms, interval=60, max_forms=2, sync=sync, on_conflict="skip").run_once()
+
+    assert max(peak) == 2
+    assert (metrics["form1"].runs, metrics["form1"].records, metrics["form1"].stored) == (1, 10, 4)
+    assert metrics["broken"].consecutive_failures == 1
+    assert metrics["broken"].last_error == "Kobo returned 500"
+    # The failing form waits two intervals, the others one
+    assert metrics["broken"].next_run - metrics["form1"].next_run == pytest.approx(60, abs=1)
+
+
+def test_scheduler_keeps_a_cursor_per_form():
+    server, url = serve([make_record(_id) for _id in range(940001, 940011)], latency=0)
+    forms = [url.replace("/bench/", f"/{form}/") for form in ("schedA", "schedB")]
+    try:
+        metrics = Scheduler(forms, max_forms=2, rate_limit=0, pipelined=False).run_once()
+    finally:
+        server.shutdown()
+
+    assert [metrics[form].records for form in ("schedA", "schedB")] == [10, 10]
+    db = SessionLocal()
+    try:
+        assert get_sync_state(db, "schedA").last_id == get_sync_state(db, "schedB").last_id == 940010
+    finally:
+        db.close()
@@ -0,0 +1,99 @@
+# tests/test_stats.py
+
+import datetime
+from uuid import UUID
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.api.kobo_client import transform_or_skip, write_items
+from app.database.db_connection import SessionLocal
+from app.database.models import DailyClientStats, DailySubmissionStats, StatsRefreshQueue
+from app.database.stats import refresh_all, refresh_pending, stats_row, stats_statement
+from app.webhook.webhook_endpoint import app
+from tests.conftest import make_record
+
+
+def record(_id, day="2024-08-24", region="North", operating="yes", age=30, **fields):
+    return dict(make_record(_id), **{
+        "_submission_time": f"{day}T07:45:34",
+        "sec_a/cd_biz_region_name": region,
+        "group_mx5fl16/bd_biz_operating": operating,
+        "sec_c/cd_age": age,
+    }, **fields)
+
+
+def store(db, records, on_conflict="update"):
+    write_items(db, [transform_or_skip(r) for r in records], on_conflict)
+    refresh_pending(db)
+
+
+def stats(db, *by):
+    return [stats_row(row) for row in db.execute(stats_statement(list(by))).all()]
+
+
+def test_rollups_follow_inserts_and_updates(db):
+    store(db, [record(1), record(2, operating="no"), record(3, region="South", age=17),
+               record(4, day="2024-08-25", region="South")])
+
+    assert stats(db, "region_name") == [
+        {"region_name": "North", "submissions": 2, "businesses": 2, "businesses_operating": 1, "operating_rate": 0.5},
+        {"region_name": "South", "submissions": 2, "businesses": 2, "businesses_operating": 2, "operating_rate": 1.0},
+    ]
+    assert [(row["day"], row["submissions"]) for row in stats(db, "day")] == [
+        (datetime.date(2024, 8, 24), 3), (datetime.date(2024, 8, 25), 1)]
+
+    # An edited submission moves to another region and day; a retry changes nothing
+    store(db, [record(1, day="2024-08-25", region="South")])
+    store(db, [record(2, operating="no")], on_conflict="skip")
+
+    assert [(row["region_name"], row["submissions"]) for row in stats(db, "region_name")] == [("North", 1), ("South", 3)]
+    assert [(row["day"], row["submissions"]) for row in stats(db, "day")] == [
+        (datetime.date(2024, 8, 24), 2), (datetime.date(2024, 8, 25), 2)]
+    assert [(row["age_band"], row["clients"]) for row in stats(db, "age_band")] == [("25-34", 3), ("under 18", 1)]
+
+
+def test_ingests_queue_slices_and_refresh_rebuilds_only_those(db):
+    other_form = "c7eb959a-da4c-485b-8334-ee761ab1e4a7"
+    store(db, [record(1), record(2, **{"formhub/uuid": other_form})])
+    # Mark the other form's slice, which the next batch does not touch
+    db.execute(DailySubmissionStats.__table__.update()
+               .where(DailySubmissionStats.form_uuid == UUID(other_form)).values(cohort="untouched"))
+    db.commit()
+
+    write_items(db, [transform_or_skip(record(3)), transform_or_skip(record(4, day="2024-08-25"))])
+    # Nothing is rebuilt in the ingest transaction
+    assert [row["submissions"] for row in stats(db)] == [2]
+    assert len(db.scalars(select(StatsRefreshQueue)).all()) == 2
+
+    assert refresh_pending(db) == 2
+    assert db.scalars(select(StatsRefreshQueue)).all() == []
+    assert [row["submissions"] for row in stats(db)] == [4]
+    assert stats(db, "cohort")[-1]["cohort"] == "untouched"
+
+
+def test_refresh_all_matches_incremental_rollups(db):
+    store(db, [record(_id, day=f"2024-08-{20 + _id % 3}", region=("North", "South")[_id % 2]) for _id in range(1, 10)])
+    incremental = stats(db, "day", "region_name"), stats(db, "gender", "age_band")
+
+    refresh_all(db)
+
+    assert (stats(db, "day", "region_name"), stats(db, "gender", "age_band")) == incremental
+    assert len(db.scalars(select(DailyClientStats)).all()) == 3
+
+
+def test_stats_endpoint_groups_and_validates():
+    client = TestClient(app)
+    form_uuid = "b7eb959a-da4c-485b-8334-ee761ab1e4a7"
+    for _id in (970001, 970002):
+        payload = record(_id, day="2030-01-02", **{"formhub/uuid": form_uuid})
+        assert client.post("/webhook", json=payload).status_code == 200
+    session = SessionLocal()
+    try:
+        refresh_pending(session)
+    finally:
+        session.close()
+
+    response = client.get("/stats", params={"by": "gender", "form_uuid": form_uuid, "since": "2030-01-01"})
+    assert response.status_code == 200
+    assert response.json() == [{"gender": "Male", "clients": 2}]
+
+    assert client.get("/stats", params={"by": "gender,region_name"}).status_code == 400
@@ -0,0 +1,246 @@
+# tests/test_webhook.py
+
+import time
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.database.db_connection import Base, SessionLocal, engine
+from app.database.models import KoboSubmission, RawSubmission
+from app.webhook import webhook_endpoint
+from app.webhook.webhook_endpoint import app
+from tests.conftest import make_record
+
+Base.metadata.create_all(bind=engine)
+
+client = TestClient(app)
+
+
+def stored(_id):
+    db = SessionLocal()
+    try:
+        return db.scalars(select(KoboSubmission).where(KoboSubmission._id == _id)).first()
+    finally:
+        db.close()
+
+
+def test_webhook_retry_is_idempotent():
+    payload = make_record(910001)
+
+    for _ in range(2):
+        response = client.post("/webhook", json=payload)
+        assert response.status_code == 200
+
+    assert stored(910001) is not None
+
+
+def test_webhook_rejects_payload_without_id():
+    response = client.post("/webhook", json={"formhub/uuid": "a7eb959a-da4c-485b-8334-ee761ab1e4a7"})
+    assert response.status_code == 422
+
+
+def test_webhook_archives_payloads_the_mapping_rejects():
+    payload = dict(make_record(910002), **{"formhub/uuid": "not-a-uuid"})
+
+    response = client.post("/webhook", json=payload)
+
+    assert response.status_code == 422
+    assert stored(910002) is None
+    db = SessionLocal()
+    try:
+        assert db.get(RawSubmission, 910002).payload == payload
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("spool", [False, True])
+def test_webhook_queue_mode_acknowledges_then_stores(monkeypatch, tmp_path, spool):
+    monkeypatch.setattr(webhook_endpoint, "WEBHOOK_MODE", "queue")
+    monkeypatch.setattr(webhook_endpoint, "WEBHOOK_SPOOL_PATH", str(tmp_path / "spool.db") if spool else None)
+    _id = 920001 + spool
+
+    with TestClient(app) as queued_client:
+        response = queued_client.post("/webhook", json=make_record(_id))
+        assert response.status_code == 202
+
+        deadline = time.monotonic() + 5
+        while stored(_id) is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    assert stored(_id) is not None
+
+
+def test_ingest_worker_survives_a_full_queue_on_retry(monkeypatch):
+    from app.utils.field_mapping import transform_record
+    from app.webhook import ingest_queue
+    from app.webhook.ingest_queue import IngestWorkers, MemoryQueue
+
+    queue = MemoryQueue(maxsize=1)
+    write_batch = ingest_queue.write_batch
+
+    def write_or_fail(db, items, on_conflict):
+        if items[0]["submission"]["_id"] == 921001:
+            # Another delivery takes the only slot before the failed one is retried
+            queue.put(make_record(921002))
+            raise ValueError("database unavailable")
+        return write_batch(db, items, on_conflict)
+
+    monkeypatch.setattr(ingest_queue, "write_batch", write_or_fail)
+    dropped = ingest_queue.DROPPED.value(reason="queue_full")
+    workers = IngestWorkers(queue, transform_record, workers=1, batch_size=1)
+    queue.put(make_record(921001))
+    workers.start()
+    try:
+        deadline = time.monotonic() + 5
+        while stored(921002) is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert workers._threads[0].is_alive()
+    finally:
+        workers.stop()
+
+    assert stored(921002) is not None and stored(921001) is None
+    assert ingest_queue.DROPPED.value(reason="queue_full") == dropped + 1
+
+
+def test_coalescer_reports_errors_per_submission():
+    import asyncio
+    from app.webhook.coalescer import Coalescer
+    from app.utils.field_mapping import transform_record
+
+    good = [transform_record(make_record(_id)) for _id in (930001, 930002)]
+    bad = transform_record(make_record(930003))
+    bad["client"]["client_name"] = None  # violates NOT NULL
+
+    async def submit_all():
+        coalescer = Coalescer(max_batch=10, max_delay_ms=50)
+        return await asyncio.gather(*(coalescer.submit(item) for item in good + [bad]), return_exceptions=True)
+
+    results = asyncio.run(submit_all())
+
+    assert results[:2] == [None, None]
+    assert isinstance(results[2], Exception)
+    assert stored(930001) is not None and stored(930003) is None
+
+
+def test_coalescer_close_finishes_waiting_submissions():
+    import asyncio
+    from app.webhook.coalescer import Coalescer
+    from app.utils.field_mapping import transform_record
+
+    async def submit_then_close():
+        coalescer = Coalescer(max_batch=10, max_delay_ms=60000)
+        submission = asyncio.ensure_future(coalescer.submit(transform_record(make_record(931001))))
+        await asyncio.sleep(0)
+        await coalescer.close()
+        assert not coalescer._tasks
+        return await submission
+
+    assert asyncio.run(submit_then_close()) is None
+    assert stored(931001) is not None
+
+
+def test_webhook_coalesce_mode_saves_before_answering(monkeypatch):
+    monkeypatch.setattr(webhook_endpoint, "WEBHOOK_MODE", "coalesce")
+
+    response = client.post("/webhook", json=make_record(940001))
+
+    assert response.status_code == 200
+    assert stored(940001) is not None
+
+
+def test_submissions_keyset_pagination():
+    version = "pagination-test"
+    for _id in range(990001, 990006):
+        record = make_record(_id)
+        record["__version__"] = version
+        assert client.post("/webhook", json=record).status_code == 200
+
+    seen, after = [], None
+    while True:
+        params = {"limit": 2, "version": version}
+        if after:
+            params["after"] = after
+        response = client.get("/submissions", params=params)
+        assert response.status_code == 200
+        seen += [row["id"] for row in response.json()]
+        after = response.headers.get("X-Next-Cursor")
+        if not after:
+            break
+
+    assert len(seen) == 5 and seen == sorted(seen)
+
+    streamed = client.get("/submissions", params={"format": "ndjson", "version": version, "order_by": "submission_time"})
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    assert len(streamed.text.splitlines()) == 5
+
+
+def test_submissions_rejects_bad_cursor():
+    response = client.get("/submissions", params={"order_by": "submission_time", "after": "nope"})
+    assert response.status_code == 400
+
+
+def test_full_submissions_query_count_is_constant():
+    from sqlalchemy import event
+    from app.database.async_db_connection import get_async_engine
+
+    version = "full-view-test"
+    for _id in range(940001, 940013):
+        record = make_record(_id)
+        record["__version__"] = version
+        assert client.post("/webhook", json=record).status_code == 200
+
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    sync_engine = get_async_engine().sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count)
+    try:
+        counts = {}
+        for limit in (2, 12):
+            statements.clear()
+            response = client.get("/submissions/full", params={"limit": limit, "version": version})
+            assert response.status_code == 200
+            rows = response.json()
+            assert len(rows) == limit
+            assert all(len(row["clients"]) == 1 and len(row["survey_metadatas"]) == 1 for row in rows)
+            counts[limit] = len(statements)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count)
+
+    # One query for the page plus one per child relationship, whatever the page size
+    assert counts[2] == counts[12] == 4
+
+    streamed = client.get("/submissions/full", params={"format": "ndjson", "version": version})
+    assert len(streamed.text.splitlines()) == 12
+
+
+@pytest.mark.parametrize("path", ["/submissions", "/submissions/full"])
+def test_row_serializer_matches_pydantic(monkeypatch, path):
+    monkeypatch.setattr(webhook_endpoint.response_cache, "max_entries", 0)
+    version = "serializer-test"
+    for _id in range(950001, 950004):
+        record = make_record(_id)
+        record["__version__"] = version
+        assert client.post("/webhook", json=record).status_code == 200
+
+    responses = {}
+    for serializer in ("pydantic", "rows"):
+        monkeypatch.setattr(webhook_endpoint, "API_SERIALIZER", serializer)
+        responses[serializer] = client.get(path, params={"version": version, "limit": 2})
+
+    assert responses["rows"].json() == responses["pydantic"].json()
+    assert responses["rows"].headers["X-Next-Cursor"] == responses["pydantic"].headers["X-Next-Cursor"]
+
+
+def test_fast_json_falls_back_to_stdlib(monkeypatch):
+    import datetime
+    import uuid
+    from app.utils import fast_json
+
+    value = {"at": datetime.datetime(2024, 8, 24, 7, 45, 34), "id": uuid.UUID(int=1), "name": "Zoë"}
+    encoded = fast_json.dumps(value)
+    monkeypatch.setattr(fast_json, "orjson", None)
+
+    assert fast_json.dumps(value) == encoded
+    assert fast_json.loads(encoded) == {"at": "2024-08-24T07:45:34", "id": str(uuid.UUID(int=1)), "name": "Zoë"}